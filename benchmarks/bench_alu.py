@@ -0,0 +1,69 @@
+"""ALU微基准 - 对比旧版comp字典与ALU函数表在TEST.asm上的每秒周期数"""
+
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src import assemble_file, HackCPU
+
+
+class DictComputeCPU(HackCPU):
+    """使用旧版实现的CPU：每条C指令都构建完整的comp字典"""
+
+    def _compute(self, comp: int, a_bit: int) -> int:
+        am_value = self.ram[self.A % len(self.ram)] if a_bit else self.A
+        comp_map = {
+            0b101010: 0,
+            0b111111: 1,
+            0b111010: -1,
+            0b001100: self.D,
+            0b110000: am_value,
+            0b001101: ~self.D,
+            0b110001: ~am_value,
+            0b001111: -self.D,
+            0b110011: -am_value,
+            0b011111: self.D + 1,
+            0b110111: am_value + 1,
+            0b001110: self.D - 1,
+            0b110010: am_value - 1,
+            0b000010: self.D + am_value,
+            0b010011: self.D - am_value,
+            0b000111: am_value - self.D,
+            0b000000: self.D & am_value,
+            0b010101: self.D | am_value,
+        }
+        return self._to_signed_16bit(comp_map.get(comp, 0))
+
+
+def measure(cpu_class, machine_code, cycles: int) -> float:
+    """运行指定周期数，返回每秒周期数"""
+    cpu = cpu_class(machine_code)
+    cpu.set_ram(0, 1)     # X = 1
+    cpu.set_ram(1, 1000)  # Y = 1000，保证循环足够长
+    step = cpu.step
+    start = time.perf_counter()
+    for _ in range(cycles):
+        step()
+    return cycles / (time.perf_counter() - start)
+
+
+def main(cycles: int = 200000) -> int:
+    """运行基准并打印结果"""
+    test_file = Path(__file__).parent.parent / "tests" / "test_programs" / "TEST.asm"
+    machine_code, _ = assemble_file(test_file)
+
+    old_rate = measure(DictComputeCPU, machine_code, cycles)
+    new_rate = measure(HackCPU, machine_code, cycles)
+
+    print(f"TEST.asm, {cycles} cycles")
+    print(f"  comp字典:  {old_rate:12,.0f} cycles/s")
+    print(f"  ALU函数表: {new_rate:12,.0f} cycles/s")
+    print(f"  加速比:    {new_rate / old_rate:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000))
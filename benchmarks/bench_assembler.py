@@ -0,0 +1,72 @@
+"""汇编器基准 - 对比两遍扫描与单遍回填在大输入上的耗时和峰值内存"""
+
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.assembler import assemble_file
+
+
+def generate_program(blocks: int) -> str:
+    """生成大程序：每个块含前向跳转、向后跳转和块内变量"""
+    lines = []
+    for i in range(blocks):
+        lines += [
+            f"// block {i}",
+            f"@count{i % 500}",
+            "D=M",
+            f"@SKIP{i}",
+            "D;JEQ",
+            f"(BACK{i})",
+            f"@count{i % 500}",
+            "M=M-1",
+            "D=M",
+            f"@BACK{i}",
+            "D;JGT",
+            f"(SKIP{i})",
+            f"@R{i % 16}",
+            "M=D",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def measure(path: Path, single: bool, repeat: int = 3) -> tuple:
+    """返回(最短耗时秒, 峰值内存字节)，内存单独测量以免tracemalloc影响计时"""
+    elapsed = min(_timed(path, single) for _ in range(repeat))
+    tracemalloc.start()
+    assemble_file(path, single=single)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def _timed(path: Path, single: bool) -> float:
+    start = time.perf_counter()
+    assemble_file(path, single=single)
+    return time.perf_counter() - start
+
+
+def main(blocks: int = 20000) -> int:
+    """运行基准并打印结果"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "big.asm"
+        path.write_text(generate_program(blocks), encoding="utf-8")
+        assert assemble_file(path) == assemble_file(path, single=True)
+
+        two_time, two_peak = measure(path, single=False)
+        one_time, one_peak = measure(path, single=True)
+
+    print(f"{blocks} blocks, {blocks * 11} instructions")
+    print(f"  两遍扫描: {two_time * 1000:8.1f} ms, 峰值内存 {two_peak / 1e6:6.1f} MB")
+    print(f"  单遍回填: {one_time * 1000:8.1f} ms, 峰值内存 {one_peak / 1e6:6.1f} MB")
+    print(f"  加速比:   {two_time / one_time:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
@@ -0,0 +1,82 @@
+"""Excel视图初始化基准 - 32K条指令的程序，对比旧版（读取并清空已有文件）、新建可编辑工作簿和只写流式XML生成"""
+
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from openpyxl import load_workbook
+from openpyxl.styles import Font, PatternFill
+from src import ExcelView
+
+
+def legacy_initialize(path: Path, source_lines, ram_size: int):
+    """旧版initialize：读取已有工作簿，delete_rows清空后逐行append"""
+    wb = load_workbook(path)
+    ws = wb.active
+    ws.delete_rows(1, ws.max_row)
+    ws.title = "HACK Debugger"
+    ws.append(["ROM_ADDR", "ASM", "A", "D", "PC", "RAM_ADDR", "VALUE"])
+    for cell in ws[1]:
+        cell.font = Font(bold=True)
+        cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+    for idx in range(max(len(source_lines), ram_size)):
+        rom_addr = idx if idx < len(source_lines) else ""
+        asm = source_lines[idx] if idx < len(source_lines) else ""
+        ram_addr = idx if idx < ram_size else ""
+        ws.append([rom_addr, asm, "", "", "", ram_addr, 0])
+    wb.save(path)
+    wb.close()
+
+
+def fresh_initialize(path: Path, source_lines, ram_size: int):
+    """新建可编辑工作簿（调试器使用的路径）"""
+    view = ExcelView(path, background=False)
+    view.initialize(source_lines, ram_size=ram_size)
+    view.close()
+
+
+def write_only_initialize(path: Path, source_lines, ram_size: int):
+    """直接流式生成xlsx（asm --excel使用的路径）"""
+    view = ExcelView(path, background=False)
+    view.initialize(source_lines, ram_size=ram_size, write_only=True)
+    view.close()
+
+
+def measure(func, path: Path, source_lines, ram_size: int) -> tuple:
+    """返回(耗时秒, 峰值内存字节)，内存单独测量以免tracemalloc影响计时"""
+    start = time.perf_counter()
+    func(path, source_lines, ram_size)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func(path, source_lines, ram_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(instructions: int = 32768, ram_size: int = 64) -> int:
+    """运行基准并打印结果"""
+    pattern = ["@i", "D=M", "@LOOP", "D;JGT", "M=D+1", "0;JMP"]
+    source_lines = [pattern[i % len(pattern)] for i in range(instructions)]
+
+    print(f"{instructions} instructions, {ram_size} RAM rows")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "view.xlsx"
+        write_only_initialize(path, source_lines, ram_size)  # 旧版需要已有文件
+        for name, func in [
+            ("旧版（读取+清空）", legacy_initialize),
+            ("新建工作簿", fresh_initialize),
+            ("只写流式", write_only_initialize),
+        ]:
+            elapsed, peak = measure(func, path, source_lines, ram_size)
+            print(f"  {name:<10} {elapsed:7.2f} s, 峰值内存 {peak / 1e6:7.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 32768))
@@ -0,0 +1,65 @@
+"""run()基准 - 对比逐条检查断点的循环与按代码段执行，以及调试器r命令与直接运行"""
+
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src import assemble_cached, HackCPU, JitCPU, Debugger
+
+
+def make_cpu(cpu_class, machine_code):
+    """创建CPU并设置TEST.asm的输入"""
+    cpu = cpu_class(machine_code, detect_terminal_loops=False)
+    cpu.set_ram(0, 1)
+    cpu.set_ram(1, 30000)  # 保证循环足够长
+    return cpu
+
+
+def best_of(function, repeat: int = 5) -> float:
+    """多次运行取最短用时"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(cycles: int = 500000) -> int:
+    """运行基准并打印结果"""
+    test_file = Path(__file__).parent.parent / "tests" / "test_programs" / "TEST.asm"
+    result = assemble_cached(test_file)
+    machine_code = result.machine_code
+    breakpoint_address = result.symbols["STOP"]  # 运行期间不会到达
+
+    def per_instruction():
+        # halt回调强制使用逐条检查停止地址的循环
+        make_cpu(HackCPU, machine_code).run(cycles, {breakpoint_address}, halt=lambda cpu: False)
+
+    def stretches():
+        make_cpu(HackCPU, machine_code).run(cycles, {breakpoint_address})
+
+    def debugger_run(cpu_class):
+        def run():
+            debugger = Debugger(make_cpu(cpu_class, machine_code), result.source_lines)
+            debugger.add_breakpoint(breakpoint_address)
+            debugger.run_until_breakpoint(cycles)
+        return run
+
+    rows = [
+        ("逐条检查 + halt回调", best_of(per_instruction)),
+        ("按代码段执行", best_of(stretches)),
+        ("调试器r（解释器）", best_of(debugger_run(HackCPU))),
+        ("调试器r（JIT）", best_of(debugger_run(JitCPU))),
+    ]
+    print(f"TEST.asm, {cycles} cycles, 断点 STOP={breakpoint_address}")
+    for name, elapsed in rows:
+        print(f"  {name:<16} {elapsed * 1000:8.1f} ms  {cycles / elapsed:12,.0f} cycles/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500000))
@@ -0,0 +1,365 @@
+"""基准测试套件 - 汇编器、CPU引擎、调试器和Excel视图的性能数据，输出JSON并可与基线比较
+
+用法：
+    python benchmarks/suite.py                          运行全部基准，结果写入output/benchmarks.json
+    python benchmarks/suite.py --quick --only cpu       缩小规模，只运行CPU基准
+    python benchmarks/suite.py --update-baseline        运行并保存为基线（benchmarks/baseline.json）
+    python benchmarks/suite.py --compare                运行并与基线比较，有退化时返回1（没有基线时只运行）
+    python benchmarks/suite.py --compare old.json --threshold 0.2
+
+每项结果为一个数值，带单位和“越大越好/越小越好”的方向。比较时相对基线变差超过
+阈值（默认10%）的项目记为退化。基线与机器相关，应在同一台机器上生成和比较。
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+# 添加项目根目录到路径
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src import assemble_text, HackCPU, JitCPU, Debugger, ExcelView
+from benchmarks.bench_assembler import generate_program
+
+PROGRAMS = ROOT / "tests" / "test_programs"
+DEFAULT_OUTPUT = ROOT / "output" / "benchmarks.json"
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+RESULT_VERSION = 1
+
+# 合成负载：都是死循环，由max_steps控制长度
+SYNTHETIC_PROGRAMS = {
+    # 紧凑的计数循环，几乎只有寄存器运算和跳转
+    "tight_loop": """
+(LOOP)
+@i
+M=M+1
+@LOOP
+0;JMP
+""",
+    # 通过指针循环填充屏幕区域，每条指令都访问RAM
+    "memory_fill": """
+(RESET)
+@SCREEN
+D=A
+@ptr
+M=D
+(LOOP)
+@ptr
+A=M
+M=!M
+@ptr
+MD=M+1
+@KBD
+D=D-A
+@LOOP
+D;JLT
+@RESET
+0;JMP
+""",
+}
+
+
+@dataclass
+class BenchResult:
+    """一项基准结果"""
+    name: str
+    value: float
+    unit: str
+    higher_is_better: bool = True
+
+
+@dataclass
+class Comparison:
+    """一项结果与基线的比较"""
+    name: str
+    baseline: Optional[float]
+    current: Optional[float]
+    change: Optional[float]  # 相对变化，正数表示变好
+    status: str  # "ok" / "regression" / "improved" / "new" / "missing"
+
+
+def best_of(function: Callable[[], object], repeat: int) -> float:
+    """多次运行取最短用时"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_assembler(quick: bool, repeat: int) -> List[BenchResult]:
+    """汇编吞吐量（行/秒）：TEST.asm和多MB的生成程序，两遍扫描与单遍回填"""
+    inputs = {
+        "TEST": (PROGRAMS / "TEST.asm").read_text(encoding="utf-8"),
+        "large": generate_program(2000 if quick else 40000),  # 完整规模约4MB
+    }
+    results = []
+    for name, text in inputs.items():
+        lines = text.count("\n") + 1
+        for mode, single in (("two_pass", False), ("single_pass", True)):
+            elapsed = best_of(lambda: assemble_text(text, single=single), repeat)
+            results.append(BenchResult(f"assembler.{name}.{mode}", lines / elapsed, "lines/s"))
+    return results
+
+
+def _cpu_workloads() -> Dict[str, tuple]:
+    """CPU基准的程序：名称 -> (机器码, 初始RAM)"""
+    workloads = {}
+    for name, ram in (("counter", {}), ("TEST", {0: 1, 1: 30000})):
+        text = (PROGRAMS / f"{name}.asm").read_text(encoding="utf-8")
+        workloads[name] = (assemble_text(text).machine_code, ram)
+    for name, text in SYNTHETIC_PROGRAMS.items():
+        workloads[name] = (assemble_text(text).machine_code, {})
+    return workloads
+
+
+def _measure_cycles(cpu_class, machine_code, ram: Dict[int, int], cycles: int, mode: str, repeat: int) -> float:
+    """返回每秒周期数；程序提前停机时复位后继续，保证每次都执行cycles条指令"""
+    cpu = cpu_class(machine_code)
+
+    def load():
+        cpu.reset()
+        for address, value in ram.items():
+            cpu.set_ram(address, value)
+
+    def run():
+        load()
+        executed = 0
+        if mode == "step":
+            step = cpu.step
+            while executed < cycles:
+                if step():
+                    executed += 1
+                else:
+                    load()
+        else:
+            while executed < cycles:
+                _, steps = cpu.run(cycles - executed)
+                executed += steps
+                if cpu.halted:
+                    load()
+
+    return cycles / best_of(run, repeat)
+
+
+def bench_cpu(quick: bool, repeat: int) -> List[BenchResult]:
+    """CPU每秒周期数：逐条step()、解释器run()和JIT run()"""
+    cycles = 50000 if quick else 500000
+    engines = (("step", HackCPU, "step"), ("run", HackCPU, "run"), ("jit", JitCPU, "run"))
+    results = []
+    for name, (machine_code, ram) in _cpu_workloads().items():
+        for engine, cpu_class, mode in engines:
+            rate = _measure_cycles(cpu_class, machine_code, ram, cycles, mode, repeat)
+            results.append(BenchResult(f"cpu.{name}.{engine}", rate, "cycles/s"))
+    return results
+
+
+def bench_debugger(quick: bool, repeat: int) -> List[BenchResult]:
+    """Debugger.run_until_breakpoint和逐条单步相对直接step()循环的开销"""
+    cycles = 50000 if quick else 300000
+    text = (PROGRAMS / "TEST.asm").read_text(encoding="utf-8")
+    result = assemble_text(text)
+    breakpoint_address = result.symbols["STOP"]  # 运行期间不会到达
+
+    def make_cpu():
+        cpu = HackCPU(result.machine_code, detect_terminal_loops=False)
+        cpu.set_ram(0, 1)
+        cpu.set_ram(1, 30000)  # 保证循环足够长
+        return cpu
+
+    def raw_step():
+        step = make_cpu().step
+        for _ in range(cycles):
+            step()
+
+    def debugger_step():
+        debugger = Debugger(make_cpu(), result.source_lines)
+        for _ in range(cycles):
+            debugger.step()
+
+    def debugger_run():
+        debugger = Debugger(make_cpu(), result.source_lines)
+        debugger.add_breakpoint(breakpoint_address)
+        debugger.run_until_breakpoint(cycles)
+
+    raw = cycles / best_of(raw_step, repeat)
+    stepped = cycles / best_of(debugger_step, repeat)
+    run = cycles / best_of(debugger_run, repeat)
+    return [
+        BenchResult("debugger.raw_step", raw, "cycles/s"),
+        BenchResult("debugger.step", stepped, "cycles/s"),
+        BenchResult("debugger.run_until_breakpoint", run, "cycles/s"),
+        # 与机器速度无关的比值
+        BenchResult("debugger.step_vs_raw", stepped / raw, "x"),
+        BenchResult("debugger.run_vs_raw", run / raw, "x"),
+    ]
+
+
+def bench_excel(quick: bool, repeat: int) -> List[BenchResult]:
+    """ExcelView.initialize（可编辑/只写流式）和update（同步渲染并保存）的延迟随ROM大小的变化"""
+    sizes = (512, 2048) if quick else (1024, 8192, 32768)
+    pattern = ["@i", "D=M", "@2", "D;JGT", "M=D+1", "@0", "0;JMP"]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "view.xlsx"
+        for size in sizes:
+            source_lines = [pattern[i % len(pattern)] for i in range(size)]
+            cpu = HackCPU(assemble_text("\n".join(source_lines)).machine_code)
+            debugger = Debugger(cpu, source_lines)
+            view = ExcelView(path, background=False)
+
+            def initialize_write_only():
+                view.initialize(source_lines, write_only=True)
+
+            def update():
+                debugger.step()
+                view.update(cpu, debugger)
+
+            write_only = best_of(initialize_write_only, repeat)
+            editable = best_of(lambda: view.initialize(source_lines), repeat)
+            updated = best_of(update, repeat)
+            view.close()
+            results += [
+                BenchResult(f"excel.{size}.initialize", editable * 1000, "ms", higher_is_better=False),
+                BenchResult(f"excel.{size}.initialize_write_only", write_only * 1000, "ms", higher_is_better=False),
+                BenchResult(f"excel.{size}.update", updated * 1000, "ms", higher_is_better=False),
+            ]
+    return results
+
+
+BENCHMARKS: Dict[str, Callable[[bool, int], List[BenchResult]]] = {
+    "assembler": bench_assembler,
+    "cpu": bench_cpu,
+    "debugger": bench_debugger,
+    "excel": bench_excel,
+}
+
+
+def run_suite(only: Optional[List[str]] = None, quick: bool = False, repeat: int = 3) -> Dict[str, object]:
+    """运行基准，返回可写入JSON的结果"""
+    results: Dict[str, dict] = {}
+    for group, function in BENCHMARKS.items():
+        if only and group not in only:
+            continue
+        print(f"[{group}]")
+        for result in function(quick, repeat):
+            print(f"  {result.name:<40} {result.value:>16,.2f} {result.unit}")
+            entry = asdict(result)
+            del entry["name"]
+            results[result.name] = entry
+    return {
+        "version": RESULT_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": quick,
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, object], baseline: Dict[str, object], threshold: float = 0.1) -> List[Comparison]:
+    """
+    与基线比较
+
+    Args:
+        current, baseline: run_suite的结果
+        threshold: 相对变差超过该比例记为退化，变好超过该比例记为改进
+    """
+    now: Dict[str, dict] = current["results"]
+    old: Dict[str, dict] = baseline["results"]
+    comparisons = []
+    for name in sorted(set(now) | set(old)):
+        if name not in old:
+            comparisons.append(Comparison(name, None, now[name]["value"], None, "new"))
+            continue
+        if name not in now:
+            comparisons.append(Comparison(name, old[name]["value"], None, None, "missing"))
+            continue
+        before, after = old[name]["value"], now[name]["value"]
+        if before == 0:
+            change = 0.0
+        elif now[name].get("higher_is_better", True):
+            change = after / before - 1
+        else:
+            change = before / after - 1 if after else 0.0
+        if change < -threshold:
+            status = "regression"
+        elif change > threshold:
+            status = "improved"
+        else:
+            status = "ok"
+        comparisons.append(Comparison(name, before, after, change, status))
+    return comparisons
+
+
+def format_comparison(comparisons: List[Comparison], threshold: float) -> str:
+    """格式化比较结果"""
+    marks = {"ok": "", "regression": "退化", "improved": "改进", "new": "新增", "missing": "缺失"}
+    lines = [f"与基线比较（阈值 {threshold:.0%}）:"]
+    for item in comparisons:
+        before = f"{item.baseline:,.2f}" if item.baseline is not None else "-"
+        after = f"{item.current:,.2f}" if item.current is not None else "-"
+        change = f"{item.change:+.1%}" if item.change is not None else ""
+        lines.append(f"  {item.name:<40} {before:>16} {after:>16} {change:>8}  {marks[item.status]}")
+    regressions = sum(item.status == "regression" for item in comparisons)
+    lines.append(f"{regressions} 项退化" if regressions else "没有退化")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="HACK工具链基准测试套件")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="只运行指定的基准组")
+    parser.add_argument("--quick", action="store_true", help="缩小规模，快速运行")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数，取最短用时")
+    parser.add_argument("-o", "--output", type=Path, default=DEFAULT_OUTPUT, help="结果JSON文件")
+    parser.add_argument("--compare", nargs="?", type=Path, const=DEFAULT_BASELINE,
+                        help="与基线JSON比较（默认benchmarks/baseline.json），有退化时返回1")
+    parser.add_argument("--threshold", type=float, default=0.1, help="退化阈值（相对变化，默认0.1）")
+    parser.add_argument("--update-baseline", action="store_true", help="将结果同时保存为基线")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        if args.compare.exists():
+            baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        elif not args.update_baseline:
+            # 基线与机器相关，不随仓库提供；没有基线时只运行并保存结果
+            print(f"基线文件不存在: {args.compare}，本次只运行不比较。")
+            print("可先运行 python benchmarks/suite.py --update-baseline 在本机生成基线。\n")
+
+    current = run_suite(args.only, args.quick, args.repeat)
+    text = json.dumps(current, ensure_ascii=False, indent=2)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(text, encoding="utf-8")
+    print(f"\n结果已保存: {args.output}")
+    if args.update_baseline:
+        DEFAULT_BASELINE.write_text(text, encoding="utf-8")
+        print(f"基线已更新: {DEFAULT_BASELINE}")
+
+    if baseline is None:
+        return 0
+    if baseline.get("quick") != current["quick"]:
+        print("警告：基线与本次运行的规模（--quick）不同，结果不可直接比较")
+    if args.only:
+        # 只比较本次运行的组
+        baseline = dict(baseline, results={
+            name: entry for name, entry in baseline["results"].items() if name.split(".")[0] in args.only
+        })
+    comparisons = compare(current, baseline, args.threshold)
+    print()
+    print(format_comparison(comparisons, args.threshold))
+    return 1 if any(item.status == "regression" for item in comparisons) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,26 +2,121 @@
 
 from __future__ import annotations
 import argparse
+import glob
+import json
 import pathlib
 import sys
+import time
 
 # 添加src目录到路径
 sys.path.insert(0, str(pathlib.Path(__file__).parent / "src"))
 
 from src import (
-    assemble_file,
+    assemble_cached,
+    assemble_stream,
     save_hack_file,
     HackCPU,
+    JitCPU,
     Debugger,
-    ExcelView,
     get_config,
-    reload_config
+    reload_config,
+    run_matrix_file,
+    expand_sources,
+    build_many,
+    format_summary,
+    create_view,
+    VIEW_KINDS,
+    WATCH_KINDS,
+    WATCH_WRITE,
+    TraceRecorder,
+    TraceReader,
+    Profiler,
+    find_labels
 )
+from src.matrix import parse_address
+
+
+def cmd_assemble_stream(args):
+    """流式汇编：逐行读写，支持标准输入/输出（"-"）"""
+    source = args.source
+    from_stdin = str(source) == "-"
+    if not from_stdin and not source.exists():
+        print(f"错误：源文件不存在: {source}", file=sys.stderr)
+        return 1
+    if args.excel:
+        print("错误：流式汇编不保留源码，不能生成Excel视图", file=sys.stderr)
+        return 1
+    
+    # 确定输出位置：未指定-o时，标准输入对应标准输出，文件对应输出目录
+    if args.output:
+        destination = args.output
+    elif from_stdin:
+        destination = pathlib.Path("-")
+    else:
+        output_dir = pathlib.Path(args.output_dir or get_config().paths.output)
+        output_dir.mkdir(exist_ok=True)
+        destination = output_dir / source.with_suffix(".hack").name
+    to_stdout = str(destination) == "-"
+    
+    try:
+        src = sys.stdin if from_stdin else open(source, "r", encoding="utf-8")
+        dst = sys.stdout if to_stdout else open(destination, "w", encoding="utf-8")
+        try:
+            count = assemble_stream(src, dst)
+        finally:
+            if not from_stdin:
+                src.close()
+            if to_stdout:
+                dst.flush()
+            else:
+                dst.close()
+    except Exception as e:
+        print(f"汇编错误: {e}", file=sys.stderr)
+        return 1
+    
+    # 输出到标准输出时，提示信息写到标准错误，避免混入机器码
+    log = sys.stderr if to_stdout else sys.stdout
+    if not to_stdout:
+        print(f"已生成机器码: {destination}", file=log)
+    print(f"汇编完成，共 {count} 条指令", file=log)
+    return 0
+
+
+def cmd_assemble_batch(args):
+    """批量汇编：多个文件/目录/通配符，用进程池并行"""
+    sources = expand_sources(args.source)
+    if not sources:
+        print("错误：没有找到.asm源文件")
+        return 1
+    if args.output or args.excel or args.stream:
+        print("错误：批量汇编不支持 -o、--excel 和 --stream")
+        return 1
+    
+    print(f"正在汇编 {len(sources)} 个文件...")
+    start = time.perf_counter()
+    results = build_many(
+        sources,
+        output_dir=args.output_dir,
+        binary=args.binary,
+        workers=args.jobs,
+        fail_fast=args.fail_fast,
+        use_cache=False if args.no_cache else None,
+    )
+    print(format_summary(results, time.perf_counter() - start))
+    
+    if len(results) < len(sources):
+        print(f"遇到错误，已跳过其余 {len(sources) - len(results)} 个文件")
+    return 0 if all(result.ok for result in results) and len(results) == len(sources) else 1
 
 
 def cmd_assemble(args):
     """汇编命令：将.asm文件编译为.hack机器码"""
-    source = args.source
+    if len(args.source) > 1 or pathlib.Path(args.source[0]).is_dir() or glob.has_magic(args.source[0]):
+        return cmd_assemble_batch(args)
+    
+    args.source = source = pathlib.Path(args.source[0])
+    if args.stream or str(source) == "-" or str(args.output) == "-":
+        return cmd_assemble_stream(args)
     if not source.exists():
         print(f"错误：源文件不存在: {source}")
         return 1
@@ -31,7 +126,12 @@ def cmd_assemble(args):
     
     try:
         print(f"正在汇编 {source}...")
-        machine_code, source_lines = assemble_file(source)
+        result = assemble_cached(
+            source,
+            use_cache=False if args.no_cache else None,
+            single=args.single_pass,
+        )
+        machine_code, source_lines = result.machine_code, result.source_lines
         
         # 确定输出目录
         if args.output_dir:
@@ -45,8 +145,9 @@ def cmd_assemble(args):
             if args.output:
                 destination = args.output
             else:
-                destination = output_dir / source.with_suffix(".hack").name
-            save_hack_file(machine_code, destination)
+                suffix = ".hackb" if args.binary else ".hack"
+                destination = output_dir / source.with_suffix(suffix).name
+            save_hack_file(machine_code, destination, binary=args.binary or None)
             print(f"已生成机器码: {destination}")
         
         # 保存Excel视图
@@ -57,8 +158,9 @@ def cmd_assemble(args):
             else:
                 excel_path = output_dir / source.with_suffix(".xlsx").name
             
+            from src import ExcelView  # 依赖openpyxl，只在生成Excel时导入
             view = ExcelView(excel_path)
-            view.initialize(source_lines, ram_size=args.ram_view)
+            view.initialize(source_lines, ram_size=args.ram_view, write_only=True)
             view.close()
             print(f"已生成Excel视图: {excel_path}")
         
@@ -85,12 +187,16 @@ def cmd_debug(args):
     try:
         # 汇编程序
         print(f"正在加载程序 {source}...")
-        machine_code, source_lines = assemble_file(source)
+        result = assemble_cached(source, use_cache=False if args.no_cache else None)
+        machine_code, source_lines = result.machine_code, result.source_lines
         print(f"已加载 {len(machine_code)} 条指令")
         
         # 初始化CPU和调试器
-        cpu = HackCPU(machine_code)
-        debugger = Debugger(cpu, source_lines)
+        engine = args.engine or config.debugger.engine
+        cpu_class = JitCPU if engine == "jit" else HackCPU
+        cpu = cpu_class(machine_code)
+        history = Debugger.create_history(cpu) if args.history or config.debugger.history else None
+        debugger = Debugger(cpu, source_lines, history=history, symbols=result.symbols)
         
         # 确定输出目录
         if args.output_dir:
@@ -99,18 +205,25 @@ def cmd_debug(args):
             output_dir = pathlib.Path(config.paths.output)
         output_dir.mkdir(exist_ok=True)
         
-        # 初始化Excel视图
-        if args.excel:
-            excel_path = args.excel
+        # 初始化视图
+        view_kind = args.view or config.debugger.view
+        default_view_file = output_dir / config.debugger.default_excel_file
+        if view_kind == "excel":
+            view_path = args.view_file or args.excel or default_view_file
+        elif view_kind == "html":
+            view_path = args.view_file or default_view_file.with_suffix(".html")
+        elif view_kind == "jsonl":
+            view_path = args.view_file or default_view_file.with_suffix(".jsonl")
         else:
-            excel_path = output_dir / config.debugger.default_excel_file
+            view_path = None
         
-        view = ExcelView(excel_path)
+        view = create_view(view_kind, view_path)
         view.initialize(source_lines, ram_size=args.ram_view)
         
         # 初始更新
         view.update(cpu, debugger, ram_view_size=args.ram_view)
-        print(f"Excel视图已创建: {excel_path}")
+        if view_path is not None:
+            print(f"视图已创建: {view_path}")
         
         # 交互式调试循环
         print("\n=== HACK调试器 ===")
@@ -118,7 +231,8 @@ def cmd_debug(args):
         
         while True:
             try:
-                cmd = input(f"\n[PC={cpu.PC}] > ").strip().lower()
+                line = input(f"\n[PC={cpu.PC} #{debugger.cycle}] > ").strip()
+                cmd = line.lower()
                 
                 if not cmd:
                     continue
@@ -149,25 +263,33 @@ def cmd_debug(args):
                         print(f"在断点处停止 (PC={state.PC})")
                     elif reason == "halted":
                         print("程序已结束")
+                    elif reason == "terminal_loop":
+                        print(f"程序已结束（到达终止循环 PC={state.PC}）")
+                    elif reason == "watchpoint":
+                        print(debugger.watch_hit.describe())
                     elif reason == "max_steps":
                         print("达到最大步数限制")
+                    elif reason == "stopped":
+                        print("运行已停止")
                     
                     print(f"寄存器: A={state.A}, D={state.D}, PC={state.PC}")
                 
                 elif cmd.startswith("b "):
+                    target, _, condition = line[2:].partition(" if ")
                     try:
-                        addr = int(cmd.split()[1])
-                        if debugger.add_breakpoint(addr):
-                            print(f"在地址 {addr} 设置断点")
+                        addr = debugger.resolve_address(target)
+                        if debugger.add_breakpoint(addr, condition.strip() or None):
+                            print(f"在地址 {addr} 设置断点" + (f"，条件: {condition.strip()}" if condition.strip() else ""))
                             view.update(cpu, debugger, ram_view_size=args.ram_view)
                         else:
                             print(f"无效的地址: {addr}")
-                    except (ValueError, IndexError):
-                        print("用法: b <地址>")
+                    except ValueError as e:
+                        print(f"错误: {e}")
+                        print("用法: b <地址|标签> [if <条件>]")
                 
                 elif cmd.startswith("d "):
                     try:
-                        addr = int(cmd.split()[1])
+                        addr = debugger.resolve_address(line.split()[1])
                         if debugger.remove_breakpoint(addr):
                             print(f"已删除地址 {addr} 的断点")
                             view.update(cpu, debugger, ram_view_size=args.ram_view)
@@ -183,10 +305,84 @@ def cmd_debug(args):
                 
                 elif cmd == "bl":
                     if debugger.breakpoints:
-                        print("断点: " + ", ".join(str(bp) for bp in sorted(debugger.breakpoints)))
+                        print("断点: " + ", ".join(
+                            f"{bp} if {debugger.condition_text[bp]}" if bp in debugger.condition_text else str(bp)
+                            for bp in sorted(debugger.breakpoints)
+                        ))
                     else:
                         print("无断点")
                 
+                elif cmd.startswith("w "):
+                    spec, _, condition = line[2:].partition(" if ")
+                    try:
+                        parts = spec.split()
+                        kind = WATCH_KINDS[parts[1].lower()] if len(parts) > 1 else WATCH_WRITE
+                        start, _, end = parts[0].partition("-")
+                        start = debugger.resolve_address(start)
+                        end = debugger.resolve_address(end) if end else None
+                        watch = debugger.add_watch(start, end, kind, condition.strip() or None)
+                        print(f"设置观察点 {watch.describe()}")
+                    except (ValueError, IndexError, KeyError) as e:
+                        print(f"错误: {e}")
+                        print("用法: w <地址>[-<结束地址>] [read|write|change|access] [if <条件>]")
+                
+                elif cmd.startswith("wd "):
+                    try:
+                        number = int(cmd.split()[1])
+                        if debugger.remove_watch(number):
+                            print(f"已删除观察点 #{number}")
+                        else:
+                            print(f"没有观察点 #{number}")
+                    except (ValueError, IndexError):
+                        print("用法: wd <编号>")
+                
+                elif cmd == "wl":
+                    if len(debugger.watches):
+                        for watch in debugger.watches:
+                            print(watch.describe())
+                    else:
+                        print("无观察点")
+                
+                elif debugger.history is None and (
+                    cmd in ["back", "rs", "rc", "reverse-continue"] or cmd.startswith(("back ", "rs ", "goto "))
+                ):
+                    print("未启用执行历史：请使用 debug --history，或在config.json中设置 debugger.history")
+                
+                elif cmd in ["back", "rs"] or cmd.startswith(("back ", "rs ")):
+                    try:
+                        parts = cmd.split()
+                        count = int(parts[1]) if len(parts) > 1 else 1
+                    except ValueError:
+                        print("用法: back [步数]")
+                        continue
+                    state = debugger.back(count)
+                    view.update(cpu, debugger, ram_view_size=args.ram_view)
+                    print(f"后退到第 {debugger.cycle} 条指令: {debugger.get_current_line() or '(无)'}")
+                    print(f"寄存器: A={state.A}, D={state.D}, PC={state.PC}")
+                
+                elif cmd in ["rc", "reverse-continue"]:
+                    reason, state = debugger.reverse_continue()
+                    view.update(cpu, debugger, ram_view_size=args.ram_view)
+                    if reason == "breakpoint":
+                        print(f"反向运行到断点 (PC={state.PC}，第 {debugger.cycle} 条指令)")
+                    else:
+                        print("已回到起点")
+                    print(f"寄存器: A={state.A}, D={state.D}, PC={state.PC}")
+                
+                elif cmd.startswith("goto "):
+                    try:
+                        target = int(cmd.split()[1])
+                        reason, state = debugger.goto_cycle(target)
+                    except (ValueError, IndexError):
+                        print("用法: goto <指令周期>")
+                        continue
+                    view.update(cpu, debugger, ram_view_size=args.ram_view)
+                    if reason in ("halted", "terminal_loop"):
+                        print(f"程序在第 {debugger.cycle} 条指令结束")
+                    else:
+                        print(f"已到达第 {debugger.cycle} 条指令")
+                    print(f"寄存器: A={state.A}, D={state.D}, PC={state.PC}")
+                
                 elif cmd == "reset":
                     debugger.reset()
                     view.update(cpu, debugger, ram_view_size=args.ram_view)
@@ -250,16 +446,172 @@ def cmd_debug(args):
         return 1
 
 
+def cmd_run_matrix(args):
+    """测试矩阵命令：用多进程并行运行一组输入/期望结果"""
+    source = args.source
+    if not source.exists():
+        print(f"错误：源文件不存在: {source}")
+        return 1
+    if not args.cases.exists():
+        print(f"错误：用例文件不存在: {args.cases}")
+        return 1
+    
+    try:
+        report = run_matrix_file(source, args.cases, workers=args.workers, engine=args.engine)
+    except Exception as e:
+        print(f"测试矩阵错误: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    
+    for case in report["cases"]:
+        status = "PASS" if case["passed"] else "FAIL"
+        detail = case["error"] or f"{case['reason']}, {case['cycles']} cycles"
+        print(f"  [{status}] {case['name']} ({detail})")
+        if not case["passed"] and not case["error"]:
+            print(f"         实际: {case['actual']}")
+    print(f"\n总计: {report['total']}  通过: {report['passed']}  失败: {report['failed']}  "
+          f"用时: {report['elapsed_seconds']:.3f}s")
+    
+    if args.report:
+        args.report.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"报告已保存: {args.report}")
+    
+    return 0 if report["failed"] == 0 else 1
+
+
+def parse_ram_settings(items):
+    """解析 --set ADDR=VALUE 参数，返回 {地址: 值}，出错时打印错误并返回None"""
+    try:
+        initial_ram = {}
+        for item in items or []:
+            key, _, value = item.partition("=")
+            initial_ram[parse_address(key.strip())] = int(value, 0)
+    except ValueError as e:
+        print(f"错误：无效的--set参数: {e}")
+        return None
+    return initial_ram
+
+
+def cmd_trace(args):
+    """轨迹命令：运行程序并记录每条指令的执行轨迹"""
+    source = args.source
+    if not source.exists():
+        print(f"错误：源文件不存在: {source}")
+        return 1
+    
+    config = get_config()
+    initial_ram = parse_ram_settings(args.set)
+    if initial_ram is None:
+        return 1
+    
+    output = args.output or pathlib.Path(config.paths.output) / source.with_suffix(".htrace").name
+    output.parent.mkdir(parents=True, exist_ok=True)
+    
+    try:
+        result = assemble_cached(source, use_cache=False if args.no_cache else None)
+        cpu_class = JitCPU if args.engine == "jit" else HackCPU
+        cpu = cpu_class(result.machine_code)
+        for address, value in initial_ram.items():
+            cpu.set_ram(address, value)
+        
+        if args.ring:
+            recorder = TraceRecorder(capacity=args.ring)
+        else:
+            recorder = TraceRecorder(spill_path=output)
+        cpu.tracer = recorder
+        start = time.perf_counter()
+        with recorder:
+            reason, steps = cpu.run(max_steps=args.max_steps)
+        elapsed = time.perf_counter() - start
+        cpu.tracer = None
+        if args.ring:
+            recorder.save(output)
+    except Exception as e:
+        print(f"轨迹记录错误: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    
+    reader = TraceReader(output)
+    count = len(reader)
+    size = output.stat().st_size
+    print(f"停止原因: {reason}，执行 {steps} 条指令，用时 {elapsed:.3f}s")
+    print(f"轨迹已保存: {output}（{count} 条记录，{size} 字节，{size / max(count, 1):.2f} 字节/条）")
+    
+    if args.tail:
+        tail = recorder.records()[-args.tail:] if args.ring else list(reader)[-args.tail:]
+        print(f"\n最后 {len(tail)} 条记录:")
+        print(f"  {'PC':>6} {'A':>7} {'D':>7}  写入")
+        for record in tail:
+            write = f"M[{record.addr}]={record.value}" if record.addr >= 0 else ""
+            print(f"  {record.pc:>6} {record.A:>7} {record.D:>7}  {write}")
+    return 0
+
+
+def cmd_profile(args):
+    """剖析命令：运行程序并按指令、标签和循环统计执行周期"""
+    source = args.source
+    if not source.exists():
+        print(f"错误：源文件不存在: {source}")
+        return 1
+    
+    initial_ram = parse_ram_settings(args.set)
+    if initial_ram is None:
+        return 1
+    
+    try:
+        result = assemble_cached(source, use_cache=False if args.no_cache else None)
+        with open(source, "r", encoding="utf-8") as f:
+            labels = find_labels(f)
+        cpu_class = JitCPU if args.engine == "jit" else HackCPU
+        cpu = cpu_class(result.machine_code)
+        for address, value in initial_ram.items():
+            cpu.set_ram(address, value)
+        
+        profiler = Profiler(result.machine_code)
+        cpu.profiler = profiler
+        start = time.perf_counter()
+        reason, steps = cpu.run(max_steps=args.max_steps)
+        elapsed = time.perf_counter() - start
+        cpu.profiler = None
+        report = profiler.report(result.source_lines, labels)
+    except Exception as e:
+        print(f"剖析错误: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    
+    print(f"停止原因: {reason}，执行 {steps} 条指令，用时 {elapsed:.3f}s\n")
+    print(report.format_text(args.top))
+    if args.json:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        args.json.write_text(report.to_json(), encoding="utf-8")
+        print(f"\nJSON报告已保存: {args.json}")
+    if args.collapsed:
+        args.collapsed.parent.mkdir(parents=True, exist_ok=True)
+        args.collapsed.write_text(report.collapsed(), encoding="utf-8")
+        print(f"collapsed stacks已保存: {args.collapsed}")
+    return 0
+
+
 def print_help():
     """打印帮助信息"""
     help_text = """
 命令列表:
   s, step       - 单步执行一条指令
   r, run        - 运行直到断点或结束
-  b <地址>      - 在指定地址设置断点
+  back [n], rs  - 后退一条（或n条）指令
+  rc            - 反向运行到上一次到达断点的位置
+  goto <n>      - 跳转到第n条指令执行后的状态（可向前或向后）
+                  （back/rc/goto需要用 --history 启动或在config.json中启用debugger.history）
+  b <地址> [if <条件>] - 设置断点（地址可以是标签），条件如 D<0、M==5、RAM[SP]!=0
   d <地址>      - 删除指定地址的断点
   bc            - 清除所有断点
   bl            - 列出所有断点
+  w <地址>[-<结束>] [read|write|change|access] [if <条件>] - 设置RAM观察点（默认write）
+  wd <编号>     - 删除观察点
+  wl            - 列出所有观察点
   reg           - 查看寄存器值
   m <地址> [数量] - 查看内存（默认1个单元）
   set <地址> <值> - 设置内存值
@@ -287,12 +639,18 @@ def main():
     
     # 汇编命令
     asm_parser = subparsers.add_parser("asm", help="汇编.asm文件")
-    asm_parser.add_argument("source", type=pathlib.Path, help=".asm源文件")
-    asm_parser.add_argument("-o", "--output", type=pathlib.Path, help="输出.hack文件")
+    asm_parser.add_argument("source", nargs="+", help=".asm源文件、目录或通配符（\"-\"表示标准输入）")
+    asm_parser.add_argument("-o", "--output", type=pathlib.Path, help="输出.hack文件（\"-\"表示标准输出）")
     asm_parser.add_argument("--output-dir", type=pathlib.Path, help="输出目录（默认使用config.json中的设置）")
     asm_parser.add_argument("--excel", type=pathlib.Path, help="输出Excel视图")
     asm_parser.add_argument("--ram-view", type=int, default=64, help="Excel中显示的RAM行数")
     asm_parser.add_argument("--no-hack", action="store_true", help="不生成.hack文件")
+    asm_parser.add_argument("--no-cache", action="store_true", help="不使用汇编缓存")
+    asm_parser.add_argument("--binary", action="store_true", help="生成打包二进制ROM（.hackb）")
+    asm_parser.add_argument("--single-pass", action="store_true", help="单遍汇编（前向引用回填）")
+    asm_parser.add_argument("--stream", action="store_true", help="流式汇编（内存占用与程序长度无关）")
+    asm_parser.add_argument("-j", "--jobs", type=int, help="批量汇编的进程数（默认为CPU核数）")
+    asm_parser.add_argument("--fail-fast", action="store_true", help="批量汇编遇到第一个错误即停止")
     
     # 调试命令
     debug_parser = subparsers.add_parser("debug", help="调试.asm程序")
@@ -300,6 +658,41 @@ def main():
     debug_parser.add_argument("--output-dir", type=pathlib.Path, help="输出目录（默认使用config.json中的设置）")
     debug_parser.add_argument("--excel", type=pathlib.Path, help="Excel视图文件")
     debug_parser.add_argument("--ram-view", type=int, default=64, help="Excel中显示的RAM行数")
+    debug_parser.add_argument("--engine", choices=["interp", "jit"], help="执行引擎（默认使用config.json中的设置）")
+    debug_parser.add_argument("--no-cache", action="store_true", help="不使用汇编缓存")
+    debug_parser.add_argument("--view", choices=VIEW_KINDS, help="调试视图（默认使用config.json中的设置）")
+    debug_parser.add_argument("--history", action="store_true", help="记录执行历史，启用back/rc/goto（默认使用config.json中的设置）")
+    debug_parser.add_argument("--view-file", type=pathlib.Path, help="视图输出文件（excel/html/jsonl，jsonl可用\"-\"表示标准输出）")
+    
+    # 测试矩阵命令
+    matrix_parser = subparsers.add_parser("run-matrix", help="并行运行测试矩阵")
+    matrix_parser.add_argument("source", type=pathlib.Path, help=".asm源文件")
+    matrix_parser.add_argument("--cases", type=pathlib.Path, required=True, help="用例JSON文件")
+    matrix_parser.add_argument("--report", type=pathlib.Path, help="输出JSON报告")
+    matrix_parser.add_argument("--workers", type=int, help="进程数（默认为CPU核数）")
+    matrix_parser.add_argument("--engine", choices=["interp", "jit"], default="interp", help="执行引擎")
+    
+    # 轨迹命令
+    trace_parser = subparsers.add_parser("trace", help="运行程序并记录执行轨迹")
+    trace_parser.add_argument("source", type=pathlib.Path, help=".asm源文件")
+    trace_parser.add_argument("-o", "--output", type=pathlib.Path, help="轨迹文件（默认为输出目录下的<源文件名>.htrace）")
+    trace_parser.add_argument("--ring", type=int, help="环形缓冲模式：只保留最近N条记录（默认不限长度，溢写到文件）")
+    trace_parser.add_argument("--set", action="append", metavar="ADDR=VALUE", help="运行前设置RAM，例如 --set R0=5（可重复）")
+    trace_parser.add_argument("--max-steps", type=int, default=1000000, help="最大执行指令数")
+    trace_parser.add_argument("--engine", choices=["interp", "jit"], default="interp", help="执行引擎")
+    trace_parser.add_argument("--tail", type=int, default=10, help="打印最后N条记录")
+    trace_parser.add_argument("--no-cache", action="store_true", help="不使用汇编缓存")
+    
+    # 剖析命令
+    profile_parser = subparsers.add_parser("profile", help="运行程序并统计各指令、标签和循环的执行周期")
+    profile_parser.add_argument("source", type=pathlib.Path, help=".asm源文件")
+    profile_parser.add_argument("--set", action="append", metavar="ADDR=VALUE", help="运行前设置RAM，例如 --set R0=5（可重复）")
+    profile_parser.add_argument("--max-steps", type=int, default=1000000, help="最大执行指令数")
+    profile_parser.add_argument("--engine", choices=["interp", "jit"], default="interp", help="执行引擎（剖析时JIT回退到解释器）")
+    profile_parser.add_argument("--top", type=int, default=10, help="报告中列出的条目数")
+    profile_parser.add_argument("--json", type=pathlib.Path, help="输出JSON报告")
+    profile_parser.add_argument("--collapsed", type=pathlib.Path, help="输出collapsed stacks（可用flamegraph.pl生成火焰图）")
+    profile_parser.add_argument("--no-cache", action="store_true", help="不使用汇编缓存")
     
     # 配置命令
     config_parser = subparsers.add_parser("config", help="显示或重载配置")
@@ -315,6 +708,12 @@ def main():
         return cmd_assemble(args)
     elif args.command == "debug":
         return cmd_debug(args)
+    elif args.command == "run-matrix":
+        return cmd_run_matrix(args)
+    elif args.command == "trace":
+        return cmd_trace(args)
+    elif args.command == "profile":
+        return cmd_profile(args)
     elif args.command == "config":
         if args.reload:
             reload_config()
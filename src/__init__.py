@@ -2,24 +2,83 @@
 
 from .assembler import (
     assemble_file,
+    assemble_text,
+    single_pass,
+    assemble_stream,
+    assemble_file_streaming,
     save_hack_file,
+    load_hack_file,
+    CInstructionCache,
+    AssemblyResult,
     COMP_TABLE,
     JUMP_TABLE,
     PREDEFINED
 )
+from .cache import AssemblyCache, assemble_cached
 from .cpu import HackCPU, CPUState
+from .jit import JitCPU
+from .trace import TraceRecorder, TraceReader, TraceRecord
+from .profiler import Profiler, ProfileReport, InstructionStat, LabelStat, LoopStat, find_labels
 from .debugger import Debugger
-from .excel_view import ExcelView
+from .history import ExecutionHistory, Checkpoint
+from .watch import WatchSet, Watchpoint, WatchHit, compile_condition, WATCH_READ, WATCH_WRITE, WATCH_CHANGE, WATCH_KINDS
+from .views import BaseView, TerminalView, JsonLinesView, HtmlView, create_view, VIEW_KINDS
+from .build import BuildResult, expand_sources, build_many, format_summary
+from .matrix import MatrixCase, CaseResult, load_cases, run_matrix, run_matrix_file
 from .config import Config, get_config, reload_config
 
 __version__ = "2.0.0"
 __all__ = [
     "assemble_file",
+    "assemble_text",
+    "single_pass",
+    "assemble_stream",
+    "assemble_file_streaming",
     "save_hack_file",
+    "load_hack_file",
+    "CInstructionCache",
+    "AssemblyResult",
+    "AssemblyCache",
+    "assemble_cached",
     "HackCPU",
     "CPUState",
+    "JitCPU",
+    "TraceRecorder",
+    "TraceReader",
+    "TraceRecord",
+    "Profiler",
+    "ProfileReport",
+    "InstructionStat",
+    "LabelStat",
+    "LoopStat",
+    "find_labels",
     "Debugger",
+    "ExecutionHistory",
+    "Checkpoint",
+    "WatchSet",
+    "Watchpoint",
+    "WatchHit",
+    "compile_condition",
+    "WATCH_READ",
+    "WATCH_WRITE",
+    "WATCH_CHANGE",
+    "WATCH_KINDS",
     "ExcelView",
+    "BaseView",
+    "TerminalView",
+    "JsonLinesView",
+    "HtmlView",
+    "create_view",
+    "VIEW_KINDS",
+    "BuildResult",
+    "expand_sources",
+    "build_many",
+    "format_summary",
+    "MatrixCase",
+    "CaseResult",
+    "load_cases",
+    "run_matrix",
+    "run_matrix_file",
     "Config",
     "get_config",
     "reload_config",
@@ -27,3 +86,11 @@ __all__ = [
     "JUMP_TABLE",
     "PREDEFINED"
 ]
+
+
+def __getattr__(name: str):
+    """ExcelView依赖openpyxl，首次访问时才导入，其余功能不需要安装openpyxl"""
+    if name == "ExcelView":
+        from .excel_view import ExcelView
+        return ExcelView
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,8 +1,15 @@
 """HACK汇编器模块 - 负责将.asm源文件翻译为机器码"""
 
 from __future__ import annotations
-from typing import Dict, List, Iterable
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Iterable, Iterator, Optional, Sequence, TextIO, Union
+import mmap
 import pathlib
+import struct
+import sys
+import tempfile
 
 
 # HACK指令集规范中的comp字段编码表
@@ -55,6 +62,16 @@ JUMP_TABLE: Dict[str, str] = {
     "JMP": "111",
 }
 
+# 汇编器版本：编码规则变化时递增，使磁盘上的汇编缓存失效
+ASSEMBLER_VERSION = "2"
+
+# 打包二进制ROM格式（.hackb）：12字节文件头 + 小端无符号16位指令字
+# 文件头：魔数(6) 版本(1) 保留(1) 指令条数(u32)
+HACKB_SUFFIX = ".hackb"
+HACKB_MAGIC = b"HACKB\x00"
+HACKB_VERSION = 1
+HACKB_HEADER = struct.Struct("<6sBxI")
+
 # 预定义符号表
 PREDEFINED: Dict[str, int] = {
     "SP": 0,
@@ -110,6 +127,72 @@ def parse_c_instruction(instruction: str) -> str:
     return "111" + comp_bits + dest_bits + jump_bits
 
 
+@dataclass
+class AssemblyResult:
+    """一次汇编的完整结果"""
+    machine_code: List[str]  # 机器码（16位二进制字符串）
+    source_lines: List[str]  # 每条机器码对应的汇编源码
+    symbols: Dict[str, int] = field(default_factory=dict)  # 用户符号表（标签和变量，不含预定义符号）
+
+
+class CInstructionCache:
+    """
+    C指令编码缓存（有界LRU）
+    
+    程序中反复出现的C指令（D=M、M=D、0;JMP等）只需解析一次。
+    以去除空白后的指令文本为键，多个文件共用同一个缓存即可跨文件复用。
+    """
+    
+    def __init__(self, maxsize: int = 1024):
+        """
+        Args:
+            maxsize: 最多缓存的不同指令数，超出时淘汰最久未使用的条目
+        """
+        if maxsize < 1:
+            raise ValueError(f"缓存大小必须为正数: {maxsize}")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+    
+    def encode(self, instruction: str) -> str:
+        """返回C指令的16位机器码，命中时不再解析"""
+        # 以去除空白后的文本为键（"D = M"、"D=M "与"D=M"共用一个条目）
+        key = "".join(instruction.split())
+        entries = self._entries
+        binary = entries.get(key)
+        if binary is not None:
+            self.hits += 1
+            entries.move_to_end(key)
+            return binary
+        
+        self.misses += 1
+        binary = parse_c_instruction(key)  # 无效指令直接抛出，不会进入缓存
+        entries[key] = binary
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+        return binary
+    
+    def clear(self):
+        """清空缓存和计数器"""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    @property
+    def hit_rate(self) -> float:
+        """命中率（尚无查询时为0）"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+# 模块默认缓存：同一进程内汇编的所有文件共用
+DEFAULT_C_CACHE = CInstructionCache()
+
+
 def first_pass(lines: Iterable[str]) -> Dict[str, int]:
     """第一遍扫描：收集标签定义，返回符号表"""
     symbols = dict(PREDEFINED)
@@ -123,12 +206,25 @@ def first_pass(lines: Iterable[str]) -> Dict[str, int]:
     return symbols
 
 
-def second_pass(
-    lines: Iterable[str], symbols: Dict[str, int]
-) -> tuple[List[str], List[str]]:
-    """第二遍扫描：生成机器码，并保留对应的汇编源码"""
-    rom_binary: List[str] = []
-    rom_source: List[str] = []
+def iter_clean_lines(lines: Iterable[str]) -> Iterator[str]:
+    """逐行净化，跳过空行和纯注释行"""
+    for line in lines:
+        cleaned = clean_line(line)
+        if cleaned:
+            yield cleaned
+
+
+def iter_second_pass(
+    lines: Iterable[str],
+    symbols: Dict[str, int],
+    cache: Optional[CInstructionCache] = None,
+) -> Iterator[tuple[str, str]]:
+    """
+    第二遍扫描（生成器）：逐条产出(机器码, 汇编源码)，遇到新变量时写入symbols
+    
+    C指令通过cache编码，默认使用模块级的DEFAULT_C_CACHE。
+    """
+    encode = (DEFAULT_C_CACHE if cache is None else cache).encode
     next_variable = 16
 
     for line in lines:
@@ -143,34 +239,268 @@ def second_pass(
                     symbols[symbol] = next_variable
                     next_variable += 1
                 address = symbols[symbol]
-            rom_binary.append(f"0{address:015b}")
+            yield f"0{address:015b}", line
         else:
-            rom_binary.append(parse_c_instruction(line))
+            yield encode(line), line
+
+
+def second_pass(
+    lines: Iterable[str],
+    symbols: Dict[str, int],
+    cache: Optional[CInstructionCache] = None,
+) -> tuple[List[str], List[str]]:
+    """第二遍扫描：生成机器码，并保留对应的汇编源码"""
+    rom_binary: List[str] = []
+    rom_source: List[str] = []
+
+    for binary, line in iter_second_pass(lines, symbols, cache):
+        rom_binary.append(binary)
         rom_source.append(line)
 
     return rom_binary, rom_source
 
 
-def assemble_file(source: pathlib.Path) -> tuple[List[str], List[str]]:
+def single_pass(
+    lines: Iterable[str],
+    cache: Optional[CInstructionCache] = None,
+) -> AssemblyResult:
+    """
+    单遍汇编：边读边生成机器码，前向引用记入回填表
+    
+    引用尚未定义的符号时先占位，并记录在回填表中；标签定义时回填所有引用，
+    扫描结束后仍未定义的符号按首次引用的顺序从16开始分配为变量，
+    与两遍扫描的语义一致（在任何位置定义过的符号都是标签，其余为变量）。
+    
+    两遍扫描中重复定义的标签以最后一次为准，单遍扫描无法据此修正已生成的
+    代码，因此重复定义标签或用标签覆盖预定义符号时直接报错。
+    
+    Args:
+        lines: 净化后的源码行（可以是惰性迭代器，只读一遍）
+        cache: C指令编码缓存（默认为DEFAULT_C_CACHE）
+        
+    Returns:
+        AssemblyResult
+    """
+    encode = (DEFAULT_C_CACHE if cache is None else cache).encode
+    rom_binary: List[Optional[str]] = []
+    rom_source: List[str] = []
+    labels: Dict[str, int] = {}
+    fixups: Dict[str, List[int]] = {}  # 未解析符号 -> 引用它的指令地址（按首次引用排序）
+
+    for line in lines:
+        if line.startswith("(") and line.endswith(")"):
+            label = line[1:-1]
+            if label in labels or label in PREDEFINED:
+                raise ValueError(f"单遍汇编不支持重复定义的符号: {label}")
+            address = labels[label] = len(rom_binary)
+            word = f"0{address:015b}"
+            for index in fixups.pop(label, ()):
+                rom_binary[index] = word
+            continue
+        
+        rom_source.append(line)
+        if line.startswith("@"):
+            symbol = line[1:]
+            if symbol.isdigit():
+                rom_binary.append(f"0{int(symbol):015b}")
+                continue
+            address = labels.get(symbol)
+            if address is None:
+                address = PREDEFINED.get(symbol)
+            if address is not None:
+                rom_binary.append(f"0{address:015b}")
+            else:
+                fixups.setdefault(symbol, []).append(len(rom_binary))
+                rom_binary.append(None)
+        else:
+            rom_binary.append(encode(line))
+
+    # 剩余的都是变量
+    symbols = dict(labels)
+    for address, (symbol, indices) in enumerate(fixups.items(), start=16):
+        symbols[symbol] = address
+        word = f"0{address:015b}"
+        for index in indices:
+            rom_binary[index] = word
+
+    return AssemblyResult(rom_binary, rom_source, symbols)
+
+
+def assemble_text(
+    text: str,
+    cache: Optional[CInstructionCache] = None,
+    single: bool = False,
+) -> AssemblyResult:
+    """
+    汇编一段.asm源码文本
+    
+    Args:
+        text: 源码文本
+        cache: C指令编码缓存（默认为进程内共享的DEFAULT_C_CACHE）
+        single: 使用单遍汇编（见single_pass）
+        
+    Returns:
+        AssemblyResult（机器码、源码映射和符号表）
+    """
+    if single:
+        return single_pass(iter_clean_lines(text.splitlines()), cache)
+    lines = list(iter_clean_lines(text.splitlines()))
+
+    symbols = first_pass(lines)
+    machine_code, machine_source = second_pass(lines, symbols, cache)
+    user_symbols = {
+        name: address for name, address in symbols.items()
+        if PREDEFINED.get(name) != address
+    }
+
+    return AssemblyResult(machine_code, machine_source, user_symbols)
+
+
+def assemble_file(
+    source: pathlib.Path,
+    cache: Optional[CInstructionCache] = None,
+    single: bool = False,
+) -> tuple[List[str], List[str]]:
     """
     汇编一个.asm文件，返回(机器码列表, 源码列表)
     
     Args:
         source: .asm源文件路径
+        cache: C指令编码缓存（默认为进程内共享的DEFAULT_C_CACHE）
+        single: 使用单遍汇编，逐行读取文件而不先读入全部源码
         
     Returns:
         (rom_binary, rom_source): 机器码和源码的对应列表
     """
-    raw_lines = source.read_text(encoding="utf-8").splitlines()
-    lines = [clean_line(line) for line in raw_lines]
-    lines = [line for line in lines if line]
+    if single:
+        with open(source, "r", encoding="utf-8") as f:
+            result = single_pass(iter_clean_lines(f), cache)
+        return result.machine_code, result.source_lines
+    result = assemble_text(source.read_text(encoding="utf-8"), cache)
+    return result.machine_code, result.source_lines
 
-    symbols = first_pass(lines)
-    machine_code, machine_source = second_pass(lines, symbols)
 
-    return machine_code, machine_source
+def pack_rom(machine_code: Sequence[Union[str, int]]) -> bytes:
+    """将机器码打包为.hackb格式的字节串"""
+    words = array("H", (int(word, 2) if isinstance(word, str) else word for word in machine_code))
+    if sys.byteorder != "little":
+        words.byteswap()
+    return HACKB_HEADER.pack(HACKB_MAGIC, HACKB_VERSION, len(words)) + words.tobytes()
+
+
+def save_hack_file(
+    machine_code: Sequence[Union[str, int]],
+    destination: pathlib.Path,
+    binary: Optional[bool] = None,
+) -> None:
+    """
+    将机器码保存为.hack文本文件或.hackb打包二进制文件
+    
+    Args:
+        machine_code: 机器码列表
+        destination: 输出路径
+        binary: 是否写打包二进制格式，默认按后缀判断（.hackb为二进制）
+    """
+    destination = pathlib.Path(destination)
+    if binary is None:
+        binary = destination.suffix == HACKB_SUFFIX
+    if binary:
+        destination.write_bytes(pack_rom(machine_code))
+    else:
+        destination.write_text("\n".join(machine_code) + "\n", encoding="utf-8")
+
+
+def load_hack_file(source: pathlib.Path) -> Sequence[Union[str, int]]:
+    """
+    加载ROM文件，可直接传给HackCPU
+    
+    .hackb文件以内存映射方式打开，返回无符号16位整数的memoryview，
+    不逐字解析（大端主机上退化为读入并字节交换的array）；
+    其他文件按.hack文本格式读取，返回二进制字符串列表。
+    
+    Args:
+        source: .hack或.hackb文件路径
+        
+    Returns:
+        机器码序列
+    """
+    source = pathlib.Path(source)
+    with open(source, "rb") as f:
+        magic = f.read(len(HACKB_MAGIC))
+        if magic != HACKB_MAGIC:
+            return [line.strip() for line in source.read_text(encoding="utf-8").splitlines() if line.strip()]
+        
+        f.seek(0)
+        header = f.read(HACKB_HEADER.size)
+        if len(header) < HACKB_HEADER.size:
+            raise ValueError(f"ROM文件头不完整: {source}")
+        _, version, count = HACKB_HEADER.unpack(header)
+        if version != HACKB_VERSION:
+            raise ValueError(f"不支持的ROM格式版本: {version}")
+        end = HACKB_HEADER.size + count * 2
+        if source.stat().st_size < end:
+            raise ValueError(f"ROM文件被截断: {source}")
+        if count == 0:
+            return []
+        
+        if sys.byteorder != "little":
+            words = array("H")
+            words.frombytes(f.read(count * 2))
+            words.byteswap()
+            return words
+        
+        # 映射在返回的视图被释放前保持打开
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mapped)[HACKB_HEADER.size:end].cast("H")
+
+
+def assemble_stream(
+    source: TextIO, destination: TextIO, cache: Optional[CInstructionCache] = None
+) -> int:
+    """
+    流式汇编：逐行读取源码，逐条写出机器码
+    
+    内存中只保留符号表，峰值内存与程序长度无关。
+    可寻址的输入直接读两遍；管道等不可回退的输入在第一遍时
+    将净化后的行暂存到临时文件。
+    
+    Args:
+        source: .asm文本流（可以是sys.stdin）
+        destination: .hack文本流（可以是sys.stdout）
+        cache: C指令编码缓存（默认为DEFAULT_C_CACHE）
+        
+    Returns:
+        生成的指令条数
+    """
+    count = 0
+    if source.seekable():
+        start = source.tell()
+        symbols = first_pass(iter_clean_lines(source))
+        source.seek(start)
+        for binary, _ in iter_second_pass(iter_clean_lines(source), symbols, cache):
+            destination.write(binary + "\n")
+            count += 1
+        return count
+
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as spool:
+        def spooled_lines() -> Iterator[str]:
+            for line in iter_clean_lines(source):
+                spool.write(line + "\n")
+                yield line
+
+        symbols = first_pass(spooled_lines())
+        spool.seek(0)
+        for binary, _ in iter_second_pass((line.rstrip("\n") for line in spool), symbols, cache):
+            destination.write(binary + "\n")
+            count += 1
+    return count
 
 
-def save_hack_file(machine_code: List[str], destination: pathlib.Path) -> None:
-    """将机器码保存为.hack文件"""
-    destination.write_text("\n".join(machine_code) + "\n", encoding="utf-8")
+def assemble_file_streaming(
+    source: pathlib.Path,
+    destination: pathlib.Path,
+    cache: Optional[CInstructionCache] = None,
+) -> int:
+    """流式汇编一个.asm文件到.hack文件，返回指令条数"""
+    with open(source, "r", encoding="utf-8") as src, open(destination, "w", encoding="utf-8") as dst:
+        return assemble_stream(src, dst, cache)
@@ -0,0 +1,262 @@
+"""批量锁步模拟 - 用NumPy同时推进N个运行同一ROM的CPU实例
+
+需要安装numpy（可选依赖）。典型用途是对同一程序做输入空间扫描，
+例如TEST.asm在所有(X, Y)组合下的结果。
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Union
+import numpy as np
+from .cpu import (
+    Rom,
+    decode_rom,
+    find_terminal_loops,
+    find_leaders,
+    KIND_A,
+    ALU_ZX,
+    ALU_NX,
+    ALU_ZY,
+    ALU_NY,
+    ALU_F,
+    ALU_NO,
+    DEST_A,
+    DEST_D,
+    DEST_M,
+    JUMP_LT,
+    JUMP_EQ,
+    JUMP_GT,
+)
+
+
+# 每个实例的停止状态
+LANE_RUNNING = 0  # 仍在运行（结束时表示达到步数上限）
+LANE_HALTED = 1  # PC超出ROM范围
+LANE_TERMINAL = 2  # 到达终止循环
+
+LANE_REASONS = {
+    LANE_RUNNING: "max_steps",
+    LANE_HALTED: "halted",
+    LANE_TERMINAL: "terminal_loop",
+}
+
+
+@dataclass
+class BatchResult:
+    """批量运行结果，数组第0维为实例编号"""
+    ram: np.ndarray  # (N, ram_size) int16，最终RAM
+    cycles: np.ndarray  # (N,) 每个实例实际执行的指令数
+    A: np.ndarray  # (N,) 最终A寄存器
+    D: np.ndarray  # (N,) 最终D寄存器
+    PC: np.ndarray  # (N,) 最终PC
+    status: np.ndarray  # (N,) LANE_*状态码
+    
+    @property
+    def reasons(self) -> List[str]:
+        """每个实例的停止原因（与HackCPU.run()的原因字符串一致）"""
+        return [LANE_REASONS[int(code)] for code in self.status]
+
+
+def alu_vector(x: np.ndarray, y: np.ndarray, comp: int) -> np.ndarray:
+    """按位ALU的向量版本，x/y为int64数组，返回16位有符号结果"""
+    if comp & ALU_ZX:
+        x = np.zeros_like(x)
+    if comp & ALU_NX:
+        x = ~x
+    if comp & ALU_ZY:
+        y = np.zeros_like(y)
+    if comp & ALU_NY:
+        y = ~y
+    out = x + y if comp & ALU_F else x & y
+    if comp & ALU_NO:
+        out = ~out
+    return ((out + 0x8000) & 0xFFFF) - 0x8000
+
+
+class BatchCPU:
+    """N个CPU实例的锁步模拟器"""
+    
+    def __init__(
+        self,
+        rom: Rom,
+        count: int,
+        ram_size: int = 24577,
+        detect_terminal_loops: bool = True,
+    ):
+        """
+        初始化批量模拟器
+        
+        Args:
+            rom: 机器码指令列表（assemble_file的输出或load_hack_file的整数视图）
+            count: 实例数量N
+            ram_size: 每个实例的RAM大小
+            detect_terminal_loops: 是否把终止循环视为停机（与HackCPU一致）
+        """
+        self.rom = rom
+        self._decoded = decode_rom(rom)
+        self.terminal_loops = find_terminal_loops(self._decoded) if detect_terminal_loops else set()
+        self._leaders = find_leaders(self._decoded)
+        self._block_lengths: Dict[int, int] = {}
+        self.count = count
+        self.ram_size = ram_size
+        self.ram = np.zeros((count, ram_size), dtype=np.int16)
+        self.A = np.zeros(count, dtype=np.int64)
+        self.D = np.zeros(count, dtype=np.int64)
+        self.PC = np.zeros(count, dtype=np.int64)
+        self.cycles = np.zeros(count, dtype=np.int64)
+        self.status = np.zeros(count, dtype=np.int8)
+    
+    def set_ram(self, address: int, values: Union[int, Sequence[int], np.ndarray]):
+        """
+        设置所有实例的RAM[address]
+        
+        Args:
+            address: RAM地址
+            values: 标量（所有实例相同）或长度为N的序列
+        """
+        values = np.asarray(values, dtype=np.int64)
+        self.ram[:, address] = ((values + 0x8000) & 0xFFFF) - 0x8000
+    
+    def _block_length(self, start: int) -> int:
+        """从start开始的基本块长度（到跳转指令为止，或在下一个块起点/终止循环之前结束）"""
+        length = self._block_lengths.get(start)
+        if length is None:
+            decoded = self._decoded
+            size = len(decoded)
+            pc = start
+            while True:
+                jump = decoded[pc][5] if decoded[pc][0] != KIND_A else 0
+                pc += 1
+                if jump or pc >= size or pc in self._leaders or pc in self.terminal_loops:
+                    break
+            length = self._block_lengths[start] = pc - start
+        return length
+        
+    def _execute(self, group: np.ndarray, pc: int):
+        """让一组PC相同的实例执行一条指令"""
+        kind, value, comp, a_bit, dest, jump = self._decoded[pc]
+        A, D, PC, ram = self.A, self.D, self.PC, self.ram
+        self.cycles[group] += 1
+        if kind == KIND_A:
+            A[group] = value
+            PC[group] = pc + 1
+            return
+            
+        a_values = A[group]
+        y = ram[group, a_values % self.ram_size].astype(np.int64) if a_bit else a_values
+        v = alu_vector(D[group], y, comp)
+        if dest & DEST_A:
+            A[group] = v
+            a_values = v
+        if dest & DEST_D:
+            D[group] = v
+        if dest & DEST_M:
+            # 与解释器一致：M的地址取写入dest A之后的A
+            ram[group, a_values % self.ram_size] = v
+            
+        if jump:
+            taken = np.zeros(group.size, dtype=bool)
+            if jump & JUMP_LT:
+                taken |= v < 0
+            if jump & JUMP_EQ:
+                taken |= v == 0
+            if jump & JUMP_GT:
+                taken |= v > 0
+            PC[group] = np.where(taken, a_values, pc + 1)
+        else:
+            PC[group] = pc + 1
+            
+    def run(self, max_steps: int = 100000) -> BatchResult:
+        """
+        锁步运行所有实例
+        
+        每一轮按当前PC对仍在运行的实例分组，每组用向量运算执行一个完整的基本块
+        （块内没有分支，组内实例保持同步），下一轮再按新的PC重新分组。
+        
+        Args:
+            max_steps: 每个实例的最大执行指令数
+            
+        Returns:
+            BatchResult
+        """
+        size = len(self._decoded)
+        status = self.status
+        cycles = self.cycles
+        
+        while True:
+            lanes = np.flatnonzero((status == LANE_RUNNING) & (cycles < max_steps))
+            if lanes.size == 0:
+                break
+                
+            # 按PC分组
+            pcs = self.PC[lanes]
+            order = np.argsort(pcs, kind="stable")
+            lanes = lanes[order]
+            pcs = pcs[order]
+            bounds = np.flatnonzero(np.diff(pcs)) + 1
+            starts = np.concatenate(([0], bounds))
+            stops = np.concatenate((bounds, [lanes.size]))
+            
+            for begin, end in zip(starts, stops):
+                group = lanes[begin:end]
+                pc = int(pcs[begin])
+                if pc < 0 or pc >= size:
+                    status[group] = LANE_HALTED
+                    continue
+                if pc in self.terminal_loops:
+                    status[group] = LANE_TERMINAL
+                    continue
+                    
+                length = self._block_length(pc)
+                remaining = max_steps - cycles[group]
+                for offset in range(length):
+                    if remaining.min() <= offset:
+                        # 步数预算不足的实例停在块内
+                        keep = remaining > offset
+                        group = group[keep]
+                        remaining = remaining[keep]
+                        if group.size == 0:
+                            break
+                    self._execute(group, pc + offset)
+                    
+        return BatchResult(
+            ram=self.ram,
+            cycles=cycles,
+            A=self.A,
+            D=self.D,
+            PC=self.PC,
+            status=status,
+        )
+
+
+def sweep(
+    rom: Rom,
+    inputs: Dict[int, Sequence[int]],
+    max_steps: int = 100000,
+    ram_size: int = 24577,
+) -> BatchResult:
+    """
+    对同一ROM做输入空间扫描
+
+    Args:
+        rom: 机器码指令列表
+        inputs: RAM地址 -> 每个实例的初始值序列（各序列长度相同）
+        max_steps: 每个实例的最大执行指令数
+        ram_size: 每个实例的RAM大小
+
+    Returns:
+        BatchResult，第i个实例对应各输入序列的第i个值
+
+    Example:
+        xs, ys = np.meshgrid(range(-10, 11), range(-10, 11))
+        result = sweep(rom, {0: xs.ravel(), 1: ys.ravel()})
+        sums = result.ram[:, 2]
+    """
+    lengths = {len(values) for values in inputs.values()}
+    if len(lengths) > 1:
+        raise ValueError(f"输入序列长度不一致: {sorted(lengths)}")
+    count = lengths.pop() if lengths else 1
+    batch = BatchCPU(rom, count, ram_size=ram_size)
+    for address, values in inputs.items():
+        batch.set_ram(address, values)
+    return batch.run(max_steps)
@@ -0,0 +1,172 @@
+"""批量汇编 - 将多个文件、目录或通配符展开后用进程池并行汇编"""
+
+from __future__ import annotations
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence
+import glob
+import os
+import time
+from .assembler import HACKB_SUFFIX, save_hack_file
+from .cache import assemble_cached
+
+
+@dataclass
+class BuildResult:
+    """单个文件的汇编结果"""
+    source: Path
+    destination: Path
+    instructions: int = 0
+    elapsed: float = 0.0  # 秒
+    error: Optional[str] = None
+    
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def expand_sources(patterns: Iterable[str]) -> List[Path]:
+    """
+    展开源文件参数
+    
+    目录递归查找其中的.asm文件，含通配符的参数用glob展开（支持**），
+    其他参数按文件路径处理。结果去重并保持参数顺序。
+    """
+    sources: List[Path] = []
+    seen = set()
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            matches = sorted(path.rglob("*.asm"))
+        elif glob.has_magic(pattern):
+            matches = sorted(Path(p) for p in glob.glob(pattern, recursive=True) if Path(p).is_file())
+        else:
+            matches = [path]
+        for match in matches:
+            key = match.resolve()
+            if key not in seen:
+                seen.add(key)
+                sources.append(match)
+    return sources
+
+
+def plan_outputs(
+    sources: Sequence[Path],
+    output_dir: Optional[Path] = None,
+    binary: bool = False,
+) -> List[Path]:
+    """
+    确定每个源文件的输出路径
+    
+    未指定output_dir时输出到源文件旁边；否则在output_dir下保留
+    各源文件相对于公共父目录的路径，避免不同目录中的同名文件互相覆盖。
+    """
+    suffix = HACKB_SUFFIX if binary else ".hack"
+    if output_dir is None:
+        return [source.with_suffix(suffix) for source in sources]
+    
+    parents = [str(source.resolve().parent) for source in sources]
+    base = Path(os.path.commonpath(parents)) if parents else Path()
+    return [
+        Path(output_dir) / source.resolve().relative_to(base).with_suffix(suffix)
+        for source in sources
+    ]
+
+
+def assemble_one(source: Path, destination: Path, use_cache: Optional[bool] = None) -> BuildResult:
+    """汇编单个文件并写出结果，错误记录在BuildResult中而不是抛出"""
+    start = time.perf_counter()
+    try:
+        machine_code = assemble_cached(source, use_cache=use_cache).machine_code
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        save_hack_file(machine_code, destination)
+        return BuildResult(source, destination, len(machine_code), time.perf_counter() - start)
+    except Exception as e:
+        return BuildResult(source, destination, 0, time.perf_counter() - start, error=str(e) or type(e).__name__)
+
+
+def _assemble_chunk(
+    jobs: List[tuple[Path, Path]],
+    use_cache: Optional[bool],
+    fail_fast: bool,
+) -> List[BuildResult]:
+    """工作进程：顺序汇编一批文件（fail_fast时遇到错误即停止）"""
+    results = []
+    for source, destination in jobs:
+        result = assemble_one(source, destination, use_cache)
+        results.append(result)
+        if fail_fast and not result.ok:
+            break
+    return results
+
+
+def build_many(
+    sources: Sequence[Path],
+    output_dir: Optional[Path] = None,
+    binary: bool = False,
+    workers: Optional[int] = None,
+    fail_fast: bool = False,
+    use_cache: Optional[bool] = None,
+) -> List[BuildResult]:
+    """
+    并行汇编多个文件
+    
+    Args:
+        sources: 源文件列表（通常来自expand_sources）
+        output_dir: 输出目录，None表示输出到源文件旁边
+        binary: 是否输出.hackb打包格式
+        workers: 进程数，默认为CPU核数；1表示在当前进程中顺序执行
+        fail_fast: 遇到第一个错误后停止提交剩余文件
+        use_cache: 是否使用磁盘汇编缓存（默认取配置）
+        
+    Returns:
+        已完成文件的结果，按sources顺序排列（fail_fast时可能少于sources）
+    """
+    jobs = list(zip(sources, plan_outputs(sources, output_dir, binary)))
+    if not jobs:
+        return []
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs)))
+    
+    if workers == 1:
+        return _assemble_chunk(jobs, use_cache, fail_fast)
+    
+    # 小文件很多时逐个提交的进程间通信开销占主导，按批分发
+    chunksize = max(1, min(64, len(jobs) // (workers * 8)))
+    chunks = [jobs[i:i + chunksize] for i in range(0, len(jobs), chunksize)]
+    results: List[BuildResult] = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(_assemble_chunk, chunk, use_cache, fail_fast) for chunk in chunks}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results.extend(future.result())
+            if fail_fast and any(not result.ok for result in results):
+                # 取消尚未开始的批次，已在运行的批次会在完成后被丢弃
+                for future in pending:
+                    future.cancel()
+                break
+    
+    order = {source: index for index, (source, _) in enumerate(jobs)}
+    results.sort(key=lambda result: order[result.source])
+    return results
+
+
+def format_summary(results: Sequence[BuildResult], elapsed: float) -> str:
+    """生成汇总表：每个文件的指令数、耗时和错误"""
+    width = max([len(str(result.source)) for result in results] + [4])
+    lines = [f"{'文件':<{width - 2}}  {'指令数':>5}  {'耗时(ms)':>8}  状态"]
+    for result in results:
+        status = "OK" if result.ok else f"错误: {result.error}"
+        lines.append(
+            f"{str(result.source):<{width}}  {result.instructions:>8}  "
+            f"{result.elapsed * 1000:>10.2f}  {status}"
+        )
+    failed = sum(1 for result in results if not result.ok)
+    total = sum(result.instructions for result in results)
+    lines.append(
+        f"共 {len(results)} 个文件，失败 {failed} 个，{total} 条指令，用时 {elapsed:.2f}s"
+    )
+    return "\n".join(lines)
@@ -0,0 +1,176 @@
+"""汇编缓存 - 以源码内容哈希为键，将汇编结果保存在磁盘上
+
+源码未变化时直接读取上次的机器码、源码映射和符号表，跳过两遍扫描。
+缓存键包含汇编器版本和assembler.py源码的哈希，修改汇编规则后旧条目自动失效
+（即使忘记递增ASSEMBLER_VERSION）；缓存目录相对于配置文件所在目录；
+总大小超过上限时按最近使用时间淘汰。
+"""
+
+from __future__ import annotations
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Union
+import hashlib
+import json
+import os
+import tempfile
+from . import assembler
+from .assembler import ASSEMBLER_VERSION, AssemblyResult, assemble_text
+
+
+@lru_cache(maxsize=None)
+def assembler_fingerprint() -> str:
+    """汇编器指纹：ASSEMBLER_VERSION + assembler.py源码的SHA-256"""
+    source = Path(assembler.__file__).read_bytes()
+    return f"{ASSEMBLER_VERSION}-{hashlib.sha256(source).hexdigest()[:16]}"
+
+
+class AssemblyCache:
+    """磁盘上的内容寻址汇编缓存"""
+    
+    def __init__(self, directory: Union[str, Path], max_bytes: int = 64 * 1024 * 1024):
+        """
+        初始化缓存
+        
+        Args:
+            directory: 缓存目录（不存在时自动创建）
+            max_bytes: 缓存总大小上限（字节）
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def key(text: str, single: bool = False) -> str:
+        """缓存键：汇编器指纹 + 汇编模式 + 源码内容的SHA-256"""
+        digest = hashlib.sha256()
+        digest.update(assembler_fingerprint().encode("utf-8"))
+        # 单遍汇编拒绝重复定义的标签，两遍汇编接受，两种模式的结果分开缓存
+        digest.update(b"\0single\0" if single else b"\0two\0")
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+    
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+    
+    def get(self, key: str) -> Optional[AssemblyResult]:
+        """读取缓存条目，不存在或已损坏时返回None"""
+        path = self._path(key)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            result = AssemblyResult(
+                machine_code=data["machine_code"],
+                source_lines=data["source_lines"],
+                symbols=data["symbols"],
+            )
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError):
+            # 损坏的条目（例如写入被中断）直接丢弃
+            path.unlink(missing_ok=True)
+            return None
+        
+        try:
+            os.utime(path)  # 更新访问时间，用于LRU淘汰
+        except OSError:
+            pass
+        return result
+    
+    def put(self, key: str, result: AssemblyResult):
+        """写入缓存条目（先写临时文件再原子替换），然后按大小上限淘汰"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": assembler_fingerprint(),
+            "machine_code": result.machine_code,
+            "source_lines": result.source_lines,
+            "symbols": result.symbols,
+        }
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_name, self._path(key))
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        self.evict()
+    
+    def evict(self):
+        """删除最久未使用的条目，直到总大小不超过max_bytes"""
+        entries = []
+        total = 0
+        for path in self.directory.glob("*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+    
+    def clear(self):
+        """删除所有缓存条目"""
+        for path in self.directory.glob("*.json"):
+            path.unlink(missing_ok=True)
+    
+    def assemble(self, source: Path, single: bool = False) -> AssemblyResult:
+        """汇编source，源码未变化时直接返回缓存结果（single: 未命中时使用单遍汇编）"""
+        text = Path(source).read_text(encoding="utf-8")
+        key = self.key(text, single)
+        result = self.get(key)
+        if result is not None:
+            self.hits += 1
+            return result
+        
+        self.misses += 1
+        result = assemble_text(text, single=single)
+        self.put(key, result)
+        return result
+
+
+# 全局缓存实例（按配置创建）
+_cache: Optional[AssemblyCache] = None
+
+
+def get_assembly_cache() -> AssemblyCache:
+    """获取全局汇编缓存（目录和大小上限来自配置）"""
+    global _cache
+    if _cache is None:
+        from .config import get_config
+        config = get_config()
+        _cache = AssemblyCache(
+            config.resolve_path(config.assembler.cache_dir),
+            config.assembler.cache_max_mb * 1024 * 1024,
+        )
+    return _cache
+
+
+def assemble_cached(
+    source: Path,
+    use_cache: Optional[bool] = None,
+    single: bool = False,
+) -> AssemblyResult:
+    """
+    带磁盘缓存的汇编
+    
+    Args:
+        source: .asm源文件路径
+        use_cache: 是否使用缓存，默认取配置中的assembler.use_cache
+        single: 使用单遍汇编（与两遍汇编分开缓存：单遍不接受重复定义的标签）
+        
+    Returns:
+        AssemblyResult
+    """
+    if use_cache is None:
+        from .config import get_config
+        use_cache = get_config().assembler.use_cache
+    if not use_cache:
+        return assemble_text(Path(source).read_text(encoding="utf-8"), single=single)
+    return get_assembly_cache().assemble(source, single=single)
@@ -13,6 +13,9 @@ class AssemblerConfig:
     default_output_dir: str = "output"
     create_hack_file: bool = True
     create_excel_view: bool = False
+    use_cache: bool = True  # 是否使用磁盘汇编缓存
+    cache_dir: str = ".asm_cache"  # 汇编缓存目录
+    cache_max_mb: int = 64  # 汇编缓存大小上限（MB）
 
 
 @dataclass
@@ -22,6 +25,11 @@ class DebuggerConfig:
     ram_view_size: int = 64
     max_steps: int = 100000
     auto_save_excel: bool = True
+    engine: str = "interp"  # 执行引擎: "interp"（逐条解释）或 "jit"（基本块编译）
+    view: str = "excel"  # 调试视图: "excel" / "terminal" / "jsonl" / "html"
+    history: bool = False  # 记录执行历史以支持反向执行（单步有额外开销）
+    checkpoint_interval: int = 10000  # 反向执行的检查点间隔（指令数）
+    history_mb: float = 64  # 检查点内存预算（MB），超出时检查点减半、间隔加倍
 
 
 @dataclass
@@ -32,6 +40,7 @@ class ExcelConfig:
     color_modified_value: str = "90EE90"
     show_headers: bool = True
     auto_adjust_columns: bool = True
+    background_save: bool = True  # 由后台线程合并保存，调试循环不等待磁盘I/O
 
 
 @dataclass
@@ -48,6 +57,11 @@ class Config:
     debugger: DebuggerConfig = field(default_factory=DebuggerConfig)
     excel: ExcelConfig = field(default_factory=ExcelConfig)
     paths: PathsConfig = field(default_factory=PathsConfig)
+    base_dir: Path = field(default=Path(__file__).parent.parent, repr=False)  # 配置文件所在目录，相对路径以此为基准
+    
+    def resolve_path(self, path: str) -> Path:
+        """将配置中的路径解析为绝对路径（相对路径相对于配置文件所在目录，与当前工作目录无关）"""
+        return (self.base_dir / path).resolve()
     
     @classmethod
     def load(cls, config_path: Optional[Path] = None) -> Config:
@@ -65,7 +79,7 @@ class Config:
             
         if not config_path.exists():
             # 返回默认配置
-            return cls()
+            return cls(base_dir=config_path.parent)
             
         try:
             with open(config_path, "r", encoding="utf-8") as f:
@@ -75,11 +89,12 @@ class Config:
                 assembler=AssemblerConfig(**data.get("assembler", {})),
                 debugger=DebuggerConfig(**data.get("debugger", {})),
                 excel=ExcelConfig(**data.get("excel", {})),
-                paths=PathsConfig(**data.get("paths", {}))
+                paths=PathsConfig(**data.get("paths", {})),
+                base_dir=config_path.parent,
             )
         except Exception as e:
             print(f"警告: 加载配置文件失败 ({e})，使用默认配置")
-            return cls()
+            return cls(base_dir=config_path.parent)
     
     def save(self, config_path: Optional[Path] = None) -> None:
         """
@@ -1,8 +1,11 @@
 """HACK CPU模拟器 - 模拟HACK计算机的CPU执行"""
 
 from __future__ import annotations
-from typing import List, Optional, Set
+from array import array
+from collections import defaultdict
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple, Union
 from dataclasses import dataclass
+from .watch import WATCH_READ, WATCH_WRITE, WATCH_CHANGE, Condition, WatchHit, WatchSet
 
 
 @dataclass
@@ -11,40 +14,458 @@ class CPUState:
     A: int = 0  # A寄存器
     D: int = 0  # D寄存器
     PC: int = 0  # 程序计数器
-    last_modified: Set[str] = None  # 最近修改的寄存器/内存地址
+    last_modified: Set[str] = None  # 最近修改的寄存器/内存地址（仅full模式）
+    modified: int = 0  # 最近修改的寄存器标志（MOD_*位组合）
+    modified_addr: int = -1  # 最近写入的RAM地址，-1表示未写入
     
     def __post_init__(self):
         if self.last_modified is None:
             self.last_modified = set()
 
 
+# RAM后端
+RAM_ARRAY = "array"  # array('h')，标准库
+RAM_NUMPY = "numpy"  # numpy int16数组（可选依赖）
+RAM_BACKENDS = (RAM_ARRAY, RAM_NUMPY)
+
+# 内存映射区域
+SCREEN_ADDR = 16384  # 屏幕起始地址
+SCREEN_WORDS = 8192  # 屏幕字数（256行 x 32字）
+KBD_ADDR = 24576  # 键盘地址
+
+
+def allocate_ram(size: int, backend: str = RAM_ARRAY):
+    """
+    分配16位有符号RAM缓冲区
+
+    Args:
+        size: 字数
+        backend: RAM_ARRAY 或 RAM_NUMPY
+
+    Returns:
+        (buffer, cells): buffer为底层缓冲区（array或ndarray），
+        cells为逐字读写用的对象（按下标读写Python int）
+    """
+    if backend == RAM_NUMPY:
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError("RAM后端 'numpy' 需要安装numpy: pip install numpy")
+        buffer = np.zeros(size, dtype=np.int16)
+        # ndarray逐元素访问会产生numpy标量，通过memoryview读写得到Python int
+        return buffer, memoryview(buffer)
+    if backend != RAM_ARRAY:
+        raise ValueError(f"无效的RAM后端: {backend}")
+    buffer = array("h", bytes(2 * size))
+    return buffer, buffer
+
+
+# 修改跟踪模式
+TRACK_OFF = "off"  # 不跟踪（无头运行）
+TRACK_BITMASK = "bitmask"  # 整数标志位 + 最近写入的RAM地址
+TRACK_FULL = "full"  # 额外维护字符串集合last_modified（旧接口）
+TRACK_MODES = (TRACK_OFF, TRACK_BITMASK, TRACK_FULL)
+
+# 修改标志位
+MOD_A = 0b0001
+MOD_D = 0b0010
+MOD_M = 0b0100
+MOD_PC = 0b1000
+
+
+def modified_names(flags: int, addr: int) -> Set[str]:
+    """将修改标志转换为字符串集合，如 {"A", "M[16]"}"""
+    names = set()
+    if flags & MOD_A:
+        names.add("A")
+    if flags & MOD_D:
+        names.add("D")
+    if flags & MOD_M:
+        names.add(f"M[{addr}]")
+    if flags & MOD_PC:
+        names.add("PC")
+    return names
+
+
+# 解码后指令的种类
+KIND_A = 0  # A指令
+KIND_C = 1  # C指令
+KIND_HALT = 2  # 终止循环入口（加载时识别，到达即停机）
+
+# dest掩码位（与机器码中d1 d2 d3的位置一致）
+DEST_A = 0b100
+DEST_D = 0b010
+DEST_M = 0b001
+
+# jump掩码位（j1: <0, j2: =0, j3: >0）
+JUMP_LT = 0b100
+JUMP_EQ = 0b010
+JUMP_GT = 0b001
+
+# 解码后的指令：(种类, A值, comp编号, a位, dest掩码, jump掩码)
+DecodedInstruction = Tuple[int, int, int, int, int, int]
+HALT_INSTRUCTION: DecodedInstruction = (KIND_HALT, 0, 0, 0, 0, 0)
+
+
+# ALU控制位（comp编号中的 zx nx zy ny f no）
+ALU_ZX = 0b100000
+ALU_NX = 0b010000
+ALU_ZY = 0b001000
+ALU_NY = 0b000100
+ALU_F = 0b000010
+ALU_NO = 0b000001
+
+
+def alu(x: int, y: int, comp: int) -> int:
+    """
+    按位模拟HACK ALU
+
+    Args:
+        x: D寄存器的值
+        y: A寄存器或M[A]的值
+        comp: 6位comp编号（zx nx zy ny f no）
+
+    Returns:
+        16位有符号结果
+    """
+    if comp & ALU_ZX:
+        x = 0
+    if comp & ALU_NX:
+        x = ~x
+    if comp & ALU_ZY:
+        y = 0
+    if comp & ALU_NY:
+        y = ~y
+    out = x + y if comp & ALU_F else x & y
+    if comp & ALU_NO:
+        out = ~out
+    return ((out + 0x8000) & 0xFFFF) - 0x8000
+
+
+def _build_alu_table() -> List[Callable[[int, int], int]]:
+    """构建64项的ALU函数表：标准comp使用专用函数，其余使用按位ALU"""
+    table: List[Callable[[int, int], int]] = [
+        (lambda x, y, comp=comp: alu(x, y, comp)) for comp in range(64)
+    ]
+    table[0b101010] = lambda x, y: 0
+    table[0b111111] = lambda x, y: 1
+    table[0b111010] = lambda x, y: -1
+    table[0b001100] = lambda x, y: x
+    table[0b110000] = lambda x, y: y
+    table[0b001101] = lambda x, y: ~x
+    table[0b110001] = lambda x, y: ~y
+    table[0b001111] = lambda x, y: ((0x8000 - x) & 0xFFFF) - 0x8000
+    table[0b110011] = lambda x, y: ((0x8000 - y) & 0xFFFF) - 0x8000
+    table[0b011111] = lambda x, y: ((x + 0x8001) & 0xFFFF) - 0x8000
+    table[0b110111] = lambda x, y: ((y + 0x8001) & 0xFFFF) - 0x8000
+    table[0b001110] = lambda x, y: ((x + 0x7FFF) & 0xFFFF) - 0x8000
+    table[0b110010] = lambda x, y: ((y + 0x7FFF) & 0xFFFF) - 0x8000
+    table[0b000010] = lambda x, y: ((x + y + 0x8000) & 0xFFFF) - 0x8000
+    table[0b010011] = lambda x, y: ((x - y + 0x8000) & 0xFFFF) - 0x8000
+    table[0b000111] = lambda x, y: ((y - x + 0x8000) & 0xFFFF) - 0x8000
+    table[0b000000] = lambda x, y: x & y
+    table[0b010101] = lambda x, y: x | y
+    return table
+
+
+# comp编号（6位） -> ALU函数 (D, A或M) -> 16位有符号结果
+ALU_TABLE = _build_alu_table()
+
+
+# ROM：16位二进制字符串列表（.hack），或无符号16位整数序列（.hackb的内存映射视图）
+Rom = Sequence[Union[str, int]]
+
+
+def decode_instruction(word: Union[str, int]) -> DecodedInstruction:
+    """
+    将一条机器码解码为整数形式
+
+    Args:
+        word: 机器码（16位二进制字符串或无符号16位整数）
+
+    Returns:
+        (kind, value, comp, a_bit, dest, jump)
+        A指令只使用value，C指令只使用comp/a_bit/dest/jump
+    """
+    bits = int(word, 2) if isinstance(word, str) else word
+    if not bits & 0x8000:
+        return (KIND_A, bits, 0, 0, 0, 0)
+    # C指令：111accccccdddjjj
+    return (
+        KIND_C,
+        0,
+        (bits >> 6) & 0b111111,
+        (bits >> 12) & 1,
+        (bits >> 3) & 0b111,
+        bits & 0b111,
+    )
+
+
+def decode_rom(rom: Rom) -> List[DecodedInstruction]:
+    """解码整个ROM，相同的机器码只解码一次"""
+    cache: Dict[Union[str, int], DecodedInstruction] = {}
+    decoded = []
+    for word in rom:
+        entry = cache.get(word)
+        if entry is None:
+            entry = cache[word] = decode_instruction(word)
+        decoded.append(entry)
+    return decoded
+
+
+def _is_terminal_loop(decoded: List[DecodedInstruction], start: int, limit: int = 64) -> bool:
+    """
+    判断从start开始的直线代码是否构成无副作用的死循环
+    
+    条件：不写D和M，A只被常量赋值，最终以必然成立的跳转回到start。
+    """
+    known_a = None
+    pc = start
+    size = len(decoded)
+    while pc < size and pc - start < limit:
+        kind, value, comp, _, dest, jump = decoded[pc]
+        if kind == KIND_A:
+            known_a = value
+        elif kind != KIND_C:
+            return False
+        else:
+            # zx和zy同时置位时结果与寄存器无关
+            constant = (comp & (ALU_ZX | ALU_ZY)) == (ALU_ZX | ALU_ZY)
+            if dest & (DEST_D | DEST_M):
+                return False
+            if dest & DEST_A:
+                if not constant:
+                    return False
+                known_a = alu(0, 0, comp)
+            if jump:
+                if jump != 0b111:
+                    if not constant:
+                        return False
+                    v = alu(0, 0, comp)
+                    if not jump & (JUMP_LT if v < 0 else JUMP_EQ if v == 0 else JUMP_GT):
+                        return False
+                return known_a == start
+        pc += 1
+    return False
+
+
+def find_terminal_loops(decoded: List[DecodedInstruction]) -> Set[int]:
+    """
+    找出所有终止循环的入口地址
+    
+    典型形式为 (END) @END 0;JMP。到达这些地址后程序不会再产生任何可观察的变化。
+    """
+    return {pc for pc in range(len(decoded)) if _is_terminal_loop(decoded, pc)}
+
+
+def find_leaders(decoded: List[DecodedInstruction]) -> Set[int]:
+    """
+    找出基本块的起始地址（JIT编译和批量模拟共用）
+    
+    包括：程序入口、所有落在ROM范围内的A指令常量（标签/跳转目标）、
+    以及每条跳转指令的下一条指令。
+    """
+    size = len(decoded)
+    leaders = {0}
+    for pc, (kind, value, _, _, _, jump) in enumerate(decoded):
+        if kind == KIND_A:
+            if value < size:
+                leaders.add(value)
+        elif jump:
+            leaders.add(pc + 1)
+    return leaders
+
+
+class StretchIndex:
+    """
+    给定停止地址集合时，每个地址开始的直线代码段
+    
+    代码段在跳转指令处（含）、下一个停止地址或终止循环入口之前、或ROM末尾结束，
+    因此段内不可能到达停止地址，执行时只需在段首检查。
+    """
+    
+    def __init__(self, decoded: List[DecodedInstruction], stops: FrozenSet[int]):
+        self.stops = stops
+        self._decoded = decoded
+        size = len(decoded)
+        lengths = [0] * size  # 从该地址开始的段长度，终止循环入口为0
+        for pc in range(size - 1, -1, -1):
+            kind, _, _, _, _, jump = decoded[pc]
+            if kind == KIND_HALT:
+                continue
+            if jump or pc + 1 == size or pc + 1 in stops or not lengths[pc + 1]:
+                lengths[pc] = 1
+            else:
+                lengths[pc] = lengths[pc + 1] + 1
+        self.lengths = lengths
+        self.blocks: Dict[int, Tuple[DecodedInstruction, ...]] = {}  # 段首地址 -> 段内指令，按需生成
+        
+    def block(self, pc: int) -> Tuple[DecodedInstruction, ...]:
+        """从pc开始的代码段（终止循环入口为空）"""
+        block = self.blocks[pc] = tuple(self._decoded[pc:pc + self.lengths[pc]])
+        return block
+
+
 class HackCPU:
     """HACK CPU模拟器"""
     
-    def __init__(self, rom: List[str], ram_size: int = 24577):
+    STRETCH_CACHE_SIZE = 4  # 缓存的停止地址集合数（调试器断点、重放、反向扫描各用一个）
+    
+    def __init__(
+        self,
+        rom: Rom,
+        ram_size: int = 24577,
+        tracking: str = TRACK_OFF,
+        ram_backend: str = RAM_ARRAY,
+        detect_terminal_loops: bool = True,
+    ):
         """
         初始化CPU
         
         Args:
-            rom: 机器码指令列表（16位二进制字符串）
+            rom: 机器码指令列表（16位二进制字符串，或load_hack_file返回的整数视图）
             ram_size: RAM大小（默认24577，包含屏幕和键盘映射）
+            tracking: 修改跟踪模式（TRACK_OFF / TRACK_BITMASK / TRACK_FULL）
+            ram_backend: RAM后端（RAM_ARRAY / RAM_NUMPY），均为连续的16位缓冲区
+            detect_terminal_loops: 加载时识别 (END) @END 0;JMP 这类终止循环，到达即停机
         """
-        self.rom = rom  # ROM（程序存储器）
-        self.ram = [0] * ram_size  # RAM（数据存储器）
+        self.detect_terminal_loops = detect_terminal_loops
+        self.rom = rom  # ROM（程序存储器），赋值时自动预解码
+        self.ram_backend = ram_backend
+        # RAM（数据存储器）：ram_buffer为底层缓冲区，ram用于逐字读写
+        self.ram_buffer, self.ram = allocate_ram(ram_size, ram_backend)
         self.A = 0  # A寄存器
         self.D = 0  # D寄存器
         self.PC = 0  # 程序计数器
         self.halted = False  # 是否停机
-        self.last_modified: Set[str] = set()  # 上次修改的位置
+        self.halt_reason: Optional[str] = None  # 停机原因："halted"（PC越界）或 "terminal_loop"
+        self.modified = 0  # 上一步修改的寄存器标志（MOD_*）
+        self.modified_addr = -1  # 上一步写入的RAM地址
+        self._last_modified: Set[str] = set()  # full模式下的字符串集合
+        self.tracer = None  # 执行轨迹记录器（trace.TraceRecorder），None表示不记录
+        self.watch_hit: Optional[WatchHit] = None  # 上次run()触发的观察点
+        self.profiler = None  # 周期剖析器（profiler.Profiler），None表示不统计
+        self.set_tracking(tracking)
+        
+    @property
+    def rom(self) -> Rom:
+        """ROM（机器码字符串列表或整数序列）"""
+        return self._rom
+        
+    @rom.setter
+    def rom(self, rom: Rom):
+        """替换ROM并重新预解码（原地修改列表后需重新赋值）"""
+        self._rom = rom
+        self._decoded = decode_rom(rom)
+        self.terminal_loops = find_terminal_loops(self._decoded) if self.detect_terminal_loops else set()
+        for pc in self.terminal_loops:
+            self._decoded[pc] = HALT_INSTRUCTION
+        self._stretches: Dict[FrozenSet[int], StretchIndex] = {}
+        
+    @property
+    def last_modified(self) -> Set[str]:
+        """上一步修改的位置（字符串集合，非full模式下按需由标志位生成）"""
+        if self.tracking == TRACK_FULL:
+            return self._last_modified
+        return modified_names(self.modified, self.modified_addr)
+        
+    def prepare_stops(self, stop_at: Iterable[int]) -> StretchIndex:
+        """
+        为停止地址集合建立（或取出缓存的）代码段索引
+        
+        run()遇到新的集合时会自动调用；调试器在断点变化时提前调用，
+        使下一次运行不必等待重建。
+        """
+        stops = frozenset(stop_at)
+        index = self._stretches.get(stops)
+        if index is None:
+            if len(self._stretches) >= self.STRETCH_CACHE_SIZE:
+                del self._stretches[next(iter(self._stretches))]
+            index = self._stretches[stops] = StretchIndex(self._decoded, stops)
+        return index
+        
+    def set_tracking(self, mode: str):
+        """
+        切换修改跟踪模式
+        
+        Args:
+            mode: TRACK_OFF / TRACK_BITMASK / TRACK_FULL
+        """
+        if mode not in TRACK_MODES:
+            raise ValueError(f"无效的跟踪模式: {mode}")
+        self.tracking = mode
+        self._clear_modified()
+        
+    def _clear_modified(self):
+        """清除修改记录"""
+        self.modified = 0
+        self.modified_addr = -1
+        self._last_modified.clear()
+        
+    def _record_modified(self, flags: int, addr: int):
+        """记录一步的修改（仅在跟踪开启时调用）"""
+        self.modified = flags
+        self.modified_addr = addr
+        if self.tracking == TRACK_FULL:
+            self._last_modified = modified_names(flags, addr)
+        
+    def ram_view(self, start: int = 0, count: Optional[int] = None) -> Sequence[int]:
+        """
+        获取RAM区域的零拷贝视图
+        
+        Args:
+            start: 起始地址
+            count: 字数，默认到RAM末尾
+            
+        Returns:
+            numpy后端返回ndarray切片，array后端返回memoryview切片
+        """
+        size = len(self.ram)
+        start = max(0, min(start, size))
+        stop = size if count is None else max(start, min(start + count, size))
+        if self.ram_backend == RAM_NUMPY:
+            return self.ram_buffer[start:stop]
+        return memoryview(self.ram_buffer)[start:stop]
+        
+    def ram_snapshot(self) -> bytes:
+        """RAM全部内容的字节副本（用于检查点）"""
+        return bytes(memoryview(self.ram_buffer).cast("B"))
+        
+    def restore_ram(self, data: bytes):
+        """用ram_snapshot()的结果原地恢复RAM"""
+        memoryview(self.ram_buffer).cast("B")[:] = data
+        
+    def write_target(self) -> int:
+        """下一条指令将写入的RAM地址，不写RAM时为-1"""
+        if self.halted or not 0 <= self.PC < len(self._decoded):
+            return -1
+        kind, _, comp, a_bit, dest, _ = self._decoded[self.PC]
+        if kind != KIND_C or not dest & DEST_M:
+            return -1
+        ram_size = len(self.ram)
+        if dest & DEST_A:
+            # AM=/AMD=：先写A，M的地址取ALU结果
+            y = self.ram[self.A % ram_size] if a_bit else self.A
+            return ALU_TABLE[comp](self.D, y) % ram_size
+        return self.A % ram_size
+        
+    def screen_view(self) -> Sequence[int]:
+        """获取屏幕映射区域（16384-24575）的零拷贝视图"""
+        return self.ram_view(SCREEN_ADDR, SCREEN_WORDS)
         
     def reset(self):
-        """重置CPU到初始状态"""
-        self.ram = [0] * len(self.ram)
+        """重置CPU到初始状态（RAM原地清零）"""
+        if self.ram_backend == RAM_NUMPY:
+            self.ram_buffer.fill(0)
+        else:
+            cells = memoryview(self.ram_buffer).cast("B")
+            cells[:] = bytes(len(cells))
         self.A = 0
         self.D = 0
         self.PC = 0
         self.halted = False
-        self.last_modified.clear()
+        self.halt_reason = None
+        self._clear_modified()
         
     def get_state(self) -> CPUState:
         """获取当前CPU状态快照"""
@@ -52,7 +473,9 @@ class HackCPU:
             A=self.A,
             D=self.D,
             PC=self.PC,
-            last_modified=self.last_modified.copy()
+            last_modified=self._last_modified.copy() if self.tracking == TRACK_FULL else set(),
+            modified=self.modified,
+            modified_addr=self.modified_addr
         )
         
     def step(self) -> bool:
@@ -62,105 +485,414 @@ class HackCPU:
         Returns:
             True表示成功执行，False表示已停机或超出ROM范围
         """
-        self.last_modified.clear()
-        
-        if self.halted or self.PC < 0 or self.PC >= len(self.rom):
-            self.halted = True
+        if self.halted or self.PC < 0 or self.PC >= len(self._decoded):
+            self._halt("halted")
             return False
             
-        instruction = self.rom[self.PC]
+        pc = self.PC
+        kind, value, comp, a_bit, dest, jump = self._decoded[pc]
+        addr = -1
         
-        # A指令：@value，格式为 0vvvvvvvvvvvvvvv
-        if instruction[0] == "0":
-            value = int(instruction, 2)
+        # A指令：@value
+        if kind == KIND_A:
             self.A = value
-            self.last_modified.add("A")
             self.PC += 1
-            return True
-            
-        # C指令：dest=comp;jump，格式为 111accccccdddjjj
-        # 111 + a(1) + cccccc(6) + ddd(3) + jjj(3)
-        a_bit = int(instruction[3])
-        comp_bits = instruction[4:10]
-        dest_bits = instruction[10:13]
-        jump_bits = instruction[13:16]
-        
-        # 计算comp值
-        comp_value = self._compute(comp_bits, a_bit)
-        
-        # 写入dest
-        dest_a, dest_d, dest_m = dest_bits[0] == "1", dest_bits[1] == "1", dest_bits[2] == "1"
-        if dest_a:
-            self.A = comp_value
-            self.last_modified.add("A")
-        if dest_d:
-            self.D = comp_value
-            self.last_modified.add("D")
-        if dest_m:
-            addr = self.A % len(self.ram)
-            self.ram[addr] = comp_value
-            self.last_modified.add(f"M[{addr}]")
-            
-        # 处理jump
-        should_jump = self._should_jump(comp_value, jump_bits)
-        if should_jump:
-            self.PC = self.A
-            self.last_modified.add("PC")
+            flags = MOD_A
+        elif kind == KIND_HALT:
+            # 终止循环入口：继续执行不会再改变任何状态
+            self._halt("terminal_loop")
+            return False
         else:
-            self.PC += 1
+            # C指令：dest=comp;jump
+            comp_value = self._compute(comp, a_bit)
+            flags = 0
             
+            # 写入dest
+            if dest & DEST_A:
+                self.A = comp_value
+                flags |= MOD_A
+            if dest & DEST_D:
+                self.D = comp_value
+                flags |= MOD_D
+            if dest & DEST_M:
+                addr = self.A % len(self.ram)
+                self.ram[addr] = comp_value
+                flags |= MOD_M
+                
+            # 处理jump
+            if jump and self._should_jump(comp_value, jump):
+                self.PC = self.A
+                flags |= MOD_PC
+            else:
+                self.PC += 1
+                
+        if self.tracking != TRACK_OFF:
+            self._record_modified(flags, addr)
+        if self.tracer is not None:
+            self.tracer.record(pc, self.A, self.D, addr, self.ram[addr] if addr >= 0 else 0)
+        if self.profiler is not None:
+            self.profiler.count(pc, bool(flags & MOD_PC))
         return True
         
-    def _compute(self, comp_bits: str, a_bit: int) -> int:
-        """根据comp字段和a位计算结果"""
+    def _halt(self, reason: str):
+        """进入停机状态（首次停机的原因会被保留）"""
+        if not self.halted:
+            self.halted = True
+            self.halt_reason = reason
+        if self.tracking != TRACK_OFF:
+            self._clear_modified()
+            
+    def run(
+        self,
+        max_steps: int = 100000,
+        stop_at: Optional[Iterable[int]] = None,
+        halt: Optional[Callable[[HackCPU], bool]] = None,
+        conditions: Optional[Dict[int, Condition]] = None,
+        watch: Optional[WatchSet] = None,
+    ) -> Tuple[str, int]:
+        """
+        连续执行指令，状态保存在局部变量中以减少逐条调用的开销
+        
+        Args:
+            max_steps: 最大执行指令数
+            stop_at: 停止地址集合，PC到达其中任一地址时（执行前）停止
+            halt: 停止条件，每条指令执行后以CPU为参数调用，返回True时停止
+            conditions: 断点条件（地址 -> watch.compile_condition的结果），
+                到达stop_at中有条件的地址时，条件满足才停止
+            watch: 观察点，访问被监视的RAM时（指令执行后）停止，触发的观察点记录在watch_hit
+            
+        Returns:
+            (停止原因, 实际执行的指令数)
+            停止原因可能是: "breakpoint", "watchpoint", "condition", "halted", "terminal_loop", "max_steps"
+            运行期间不跟踪修改，结束后修改记录为空
+        """
+        self._clear_modified()
+        self.watch_hit = None
+        if self.halted:
+            return self.halt_reason or "halted", 0
+            
+        stops = stop_at if isinstance(stop_at, (set, frozenset)) else frozenset(stop_at or ())
+        if watch:
+            return self._run_watched(max_steps, stops, halt, conditions, watch)
+        if self.tracer is not None:
+            return self._run_traced(max_steps, stops, halt, conditions)
+        steps = 0
+        if halt is None:
+            reason, steps = self._run_stretches(max_steps, stops, conditions)
+            if reason != "max_steps" or steps == max_steps:
+                if reason in ("halted", "terminal_loop"):
+                    self._halt(reason)
+                return reason, steps
+            # 剩余步数不足一整段，逐条执行补齐
+        decoded = self._decoded
+        size = len(decoded)
+        ram = self.ram
+        ram_size = len(ram)
+        alu_table = ALU_TABLE
+        hits, taken = (self.profiler.hits, self.profiler.taken) if self.profiler is not None else (None, None)
+        A, D, pc = self.A, self.D, self.PC
+        reason = "max_steps"
+        
+        while steps < max_steps:
+            if pc in stops and (not conditions or pc not in conditions or conditions[pc](A, D, ram)):
+                reason = "breakpoint"
+                break
+            if pc < 0 or pc >= size:
+                reason = "halted"
+                break
+                
+            kind, value, comp, a_bit, dest, jump = decoded[pc]
+            if hits is not None and kind != KIND_HALT:
+                hits[pc] += 1
+            if kind == KIND_A:
+                A = value
+                pc += 1
+            elif kind == KIND_HALT:
+                reason = "terminal_loop"
+                break
+            else:
+                v = alu_table[comp](D, ram[A % ram_size] if a_bit else A)
+                if dest:
+                    if dest & DEST_A:
+                        A = v
+                    if dest & DEST_D:
+                        D = v
+                    if dest & DEST_M:
+                        ram[A % ram_size] = v
+                if jump and jump & (JUMP_LT if v < 0 else JUMP_EQ if v == 0 else JUMP_GT):
+                    if taken is not None:
+                        taken[pc] += 1
+                    pc = A
+                else:
+                    pc += 1
+            steps += 1
+            
+            if halt is not None:
+                self.A, self.D, self.PC = A, D, pc
+                if halt(self):
+                    reason = "condition"
+                    break
+                    
+        self.A, self.D, self.PC = A, D, pc
+        if reason in ("halted", "terminal_loop"):
+            self._halt(reason)
+        return reason, steps
+        
+    def _run_stretches(
+        self,
+        max_steps: int,
+        stops: FrozenSet[int],
+        conditions: Optional[Dict[int, Condition]],
+    ) -> Tuple[str, int]:
+        """
+        run()的主循环：按代码段整段执行，只在段首检查停止地址和ROM边界
+        
+        剩余步数不足一整段时返回"max_steps"（steps < max_steps），由调用方逐条补齐。
+        """
+        index = self.prepare_stops(stops)
+        blocks = index.blocks
+        size = len(self._decoded)
+        ram = self.ram
+        ram_size = len(ram)
+        alu_table = ALU_TABLE
+        profiler = self.profiler
+        # 剖析时每段只在段首计数一次，结束后按段长度展开；只记录实际执行过的段首，
+        # 调试器分片运行时每片的开销与ROM大小无关
+        entries = defaultdict(int) if profiler is not None else None
+        taken = profiler.taken if profiler is not None else None
+        A, D, pc = self.A, self.D, self.PC
+        steps = 0
+        reason = "max_steps"
+        
+        while steps < max_steps:
+            if pc in stops and (not conditions or pc not in conditions or conditions[pc](A, D, ram)):
+                reason = "breakpoint"
+                break
+            if pc < 0 or pc >= size:
+                reason = "halted"
+                break
+            block = blocks.get(pc)
+            if block is None:
+                block = index.block(pc)
+            length = len(block)
+            if not length:
+                reason = "terminal_loop"
+                break
+            if steps + length > max_steps:
+                break
+            steps += length
+            if entries is not None:
+                entries[pc] += 1
+            pc += length
+            for kind, value, comp, a_bit, dest, jump in block:
+                if kind == KIND_A:
+                    A = value
+                else:
+                    v = alu_table[comp](D, ram[A % ram_size] if a_bit else A)
+                    if dest:
+                        if dest & DEST_A:
+                            A = v
+                        if dest & DEST_D:
+                            D = v
+                        if dest & DEST_M:
+                            ram[A % ram_size] = v
+                    # 只有段内最后一条指令可能跳转
+                    if jump and jump & (JUMP_LT if v < 0 else JUMP_EQ if v == 0 else JUMP_GT):
+                        if taken is not None:
+                            taken[pc - 1] += 1
+                        pc = A
+                        
+        self.A, self.D, self.PC = A, D, pc
+        if entries is not None:
+            profiler.add_stretches(entries, index)
+        return reason, steps
+        
+    def _run_traced(
+        self,
+        max_steps: int,
+        stops: Iterable[int],
+        halt: Optional[Callable[[HackCPU], bool]],
+        conditions: Optional[Dict[int, Condition]],
+    ) -> Tuple[str, int]:
+        """run()的记录轨迹版本：每条指令直接写入记录器的列缓冲区"""
+        tracer = self.tracer
+        capacity = tracer.capacity
+        pcs, As, Ds, addrs, values = tracer.pc, tracer.A, tracer.D, tracer.addr, tracer.value
+        i = tracer.pos
+        decoded = self._decoded
+        size = len(decoded)
+        ram = self.ram
+        ram_size = len(ram)
+        alu_table = ALU_TABLE
+        hits, taken = (self.profiler.hits, self.profiler.taken) if self.profiler is not None else (None, None)
+        A, D, pc = self.A, self.D, self.PC
+        steps = 0
+        reason = "max_steps"
+        
+        while steps < max_steps:
+            if pc in stops and (not conditions or pc not in conditions or conditions[pc](A, D, ram)):
+                reason = "breakpoint"
+                break
+            if pc < 0 or pc >= size:
+                reason = "halted"
+                break
+                
+            kind, value, comp, a_bit, dest, jump = decoded[pc]
+            if hits is not None and kind != KIND_HALT:
+                hits[pc] += 1
+            pcs[i] = pc
+            addr = -1
+            v = 0
+            if kind == KIND_A:
+                A = value
+                pc += 1
+            elif kind == KIND_HALT:
+                reason = "terminal_loop"
+                break
+            else:
+                v = alu_table[comp](D, ram[A % ram_size] if a_bit else A)
+                if dest:
+                    if dest & DEST_A:
+                        A = v
+                    if dest & DEST_D:
+                        D = v
+                    if dest & DEST_M:
+                        addr = A % ram_size
+                        ram[addr] = v
+                if jump and jump & (JUMP_LT if v < 0 else JUMP_EQ if v == 0 else JUMP_GT):
+                    if taken is not None:
+                        taken[pc] += 1
+                    pc = A
+                else:
+                    pc += 1
+            As[i] = A
+            Ds[i] = D
+            addrs[i] = addr
+            values[i] = v if addr >= 0 else 0
+            i += 1
+            if i == capacity:
+                tracer.buffer_full()
+                i = 0
+            steps += 1
+            
+            if halt is not None:
+                self.A, self.D, self.PC = A, D, pc
+                if halt(self):
+                    reason = "condition"
+                    break
+                    
+        tracer.pos = i
+        self.A, self.D, self.PC = A, D, pc
+        if reason in ("halted", "terminal_loop"):
+            self._halt(reason)
+        return reason, steps
+        
+    def _run_watched(
+        self,
+        max_steps: int,
+        stops: Iterable[int],
+        halt: Optional[Callable[[HackCPU], bool]],
+        conditions: Optional[Dict[int, Condition]],
+        watch: WatchSet,
+    ) -> Tuple[str, int]:
+        """run()的观察点版本：每次读写M先查地址掩码，命中后再匹配观察点和条件"""
+        mask = watch.mask
+        record = self.tracer.record if self.tracer is not None else None
+        hits, taken = (self.profiler.hits, self.profiler.taken) if self.profiler is not None else (None, None)
+        decoded = self._decoded
+        size = len(decoded)
+        ram = self.ram
+        ram_size = len(ram)
+        alu_table = ALU_TABLE
+        A, D, pc = self.A, self.D, self.PC
+        steps = 0
+        reason = "max_steps"
+        
+        while steps < max_steps:
+            if pc in stops and (not conditions or pc not in conditions or conditions[pc](A, D, ram)):
+                reason = "breakpoint"
+                break
+            if pc < 0 or pc >= size:
+                reason = "halted"
+                break
+                
+            kind, value, comp, a_bit, dest, jump = decoded[pc]
+            start = pc
+            hit = False
+            addr = -1
+            v = 0
+            if kind == KIND_A:
+                A = value
+                pc += 1
+            elif kind == KIND_HALT:
+                reason = "terminal_loop"
+                break
+            else:
+                if a_bit:
+                    read = A % ram_size
+                    x = ram[read]
+                    v = alu_table[comp](D, x)
+                    if mask[read] & WATCH_READ:
+                        hit = True
+                else:
+                    v = alu_table[comp](D, A)
+                if dest:
+                    if dest & DEST_A:
+                        A = v
+                    if dest & DEST_D:
+                        D = v
+                    if dest & DEST_M:
+                        addr = A % ram_size
+                        old = ram[addr]
+                        ram[addr] = v
+                        if mask[addr] & (WATCH_WRITE | WATCH_CHANGE):
+                            hit = True
+                if jump and jump & (JUMP_LT if v < 0 else JUMP_EQ if v == 0 else JUMP_GT):
+                    if taken is not None:
+                        taken[start] += 1
+                    pc = A
+                else:
+                    pc += 1
+            steps += 1
+            if record is not None:
+                record(start, A, D, addr, v if addr >= 0 else 0)
+            if hits is not None:
+                hits[start] += 1
+                
+            if hit:
+                # 同一条指令既读又写时，先匹配写入
+                if addr >= 0:
+                    self.watch_hit = watch.match(start, addr, WATCH_WRITE, old, v, A, D, ram)
+                if self.watch_hit is None and a_bit:
+                    self.watch_hit = watch.match(start, read, WATCH_READ, x, x, A, D, ram)
+                if self.watch_hit is not None:
+                    reason = "watchpoint"
+                    break
+                    
+            if halt is not None:
+                self.A, self.D, self.PC = A, D, pc
+                if halt(self):
+                    reason = "condition"
+                    break
+                    
+        self.A, self.D, self.PC = A, D, pc
+        if reason in ("halted", "terminal_loop"):
+            self._halt(reason)
+        return reason, steps
+        
+    def _compute(self, comp: int, a_bit: int) -> int:
+        """根据comp编号（6位）和a位计算结果"""
         # a=0时使用A寄存器，a=1时使用M[A]
         am_value = self.ram[self.A % len(self.ram)] if a_bit else self.A
+        return ALU_TABLE[comp](self.D, am_value)
         
-        # comp字段解码（6位）
-        comp_map = {
-            "101010": 0,
-            "111111": 1,
-            "111010": -1,
-            "001100": self.D,
-            "110000": am_value,
-            "001101": ~self.D,
-            "110001": ~am_value,
-            "001111": -self.D,
-            "110011": -am_value,
-            "011111": self.D + 1,
-            "110111": am_value + 1,
-            "001110": self.D - 1,
-            "110010": am_value - 1,
-            "000010": self.D + am_value,
-            "010011": self.D - am_value,
-            "000111": am_value - self.D,
-            "000000": self.D & am_value,
-            "010101": self.D | am_value,
-        }
-        
-        result = comp_map.get(comp_bits, 0)
-        # HACK使用16位有符号整数
-        return self._to_signed_16bit(result)
-        
-    def _should_jump(self, comp_value: int, jump_bits: str) -> bool:
-        """判断是否应该跳转"""
-        if jump_bits == "000":
-            return False
-        if jump_bits == "111":  # JMP
-            return True
-        if jump_bits == "001":  # JGT
-            return comp_value > 0
-        if jump_bits == "010":  # JEQ
-            return comp_value == 0
-        if jump_bits == "011":  # JGE
-            return comp_value >= 0
-        if jump_bits == "100":  # JLT
-            return comp_value < 0
-        if jump_bits == "101":  # JNE
-            return comp_value != 0
-        if jump_bits == "110":  # JLE
-            return comp_value <= 0
-        return False
+    def _should_jump(self, comp_value: int, jump: int) -> bool:
+        """根据jump掩码判断是否应该跳转"""
+        if comp_value < 0:
+            return bool(jump & JUMP_LT)
+        if comp_value == 0:
+            return bool(jump & JUMP_EQ)
+        return bool(jump & JUMP_GT)
         
     def _to_signed_16bit(self, value: int) -> int:
         """将整数转换为16位有符号整数范围"""
@@ -1,51 +1,145 @@
 """HACK调试器 - 支持断点、单步执行、查看状态等调试功能"""
 
 from __future__ import annotations
-from typing import Set, List, Optional
-from .cpu import HackCPU, CPUState
+from typing import Dict, Set, List, Mapping, Optional, Sequence
+from .assembler import PREDEFINED
+from .cpu import HackCPU, CPUState, TRACK_OFF, TRACK_BITMASK
+from .history import ExecutionHistory
+from .watch import WATCH_WRITE, Condition, WatchHit, Watchpoint, WatchSet, compile_condition
+from .config import get_config
 
 
 class Debugger:
     """HACK程序调试器"""
     
-    def __init__(self, cpu: HackCPU, source_lines: List[str]):
+    RUN_CHUNK = 10000  # run_until_breakpoint每段的指令数，段之间响应stop()
+    
+    def __init__(
+        self,
+        cpu: HackCPU,
+        source_lines: List[str],
+        history: Optional[ExecutionHistory] = None,
+        symbols: Optional[Mapping[str, int]] = None,
+    ):
         """
         初始化调试器
         
         Args:
             cpu: CPU模拟器实例
             source_lines: 源代码行列表（与ROM对应）
+            history: 执行历史（反向执行用），None表示不记录历史，单步和运行没有额外开销
+                （可用Debugger.create_history按config.json的检查点间隔和内存预算创建）
+            symbols: 符号表（汇编结果的symbols），用于按标签设置断点和在条件中引用符号
         """
         self.cpu = cpu
         self.source_lines = source_lines
+        if cpu.tracking == TRACK_OFF:
+            # 单步调试需要知道每步修改了什么，使用无分配的位标志跟踪
+            cpu.set_tracking(TRACK_BITMASK)
+        self.symbols: Dict[str, int] = dict(symbols or {})
         self.breakpoints: Set[int] = set()  # 断点集合（ROM地址）
+        self.conditions: Dict[int, Condition] = {}  # 条件断点：地址 -> 编译后的条件
+        self.condition_text: Dict[int, str] = {}  # 条件原文
+        self.watches = WatchSet(len(cpu.ram))
         self.running = False
+        self.history = history
+        self._cycle = 0  # 未记录历史时的已执行指令数
+        
+    @staticmethod
+    def create_history(cpu: HackCPU) -> ExecutionHistory:
+        """按config.json的检查点间隔和内存预算创建执行历史"""
+        config = get_config().debugger
+        return ExecutionHistory(cpu, config.checkpoint_interval, config.history_mb)
+        
+    def _require_history(self) -> ExecutionHistory:
+        if self.history is None:
+            raise RuntimeError("未启用执行历史，无法反向执行")
+        return self.history
         
-    def add_breakpoint(self, address: int) -> bool:
+    def resolve_address(self, text: str) -> int:
+        """解析地址：十进制/十六进制数字或符号（标签、变量、R0/SP等）"""
+        text = text.strip()
+        if text in self.symbols:
+            return self.symbols[text]
+        if text in PREDEFINED:
+            return PREDEFINED[text]
+        try:
+            return int(text, 0)
+        except ValueError:
+            raise ValueError(f"无效的地址或未知符号: {text}")
+        
+    def add_breakpoint(self, address: int, condition: Optional[str] = None) -> bool:
         """
         在指定地址添加断点
         
         Args:
             address: ROM地址
+            condition: 条件表达式（如 "D<0"），到达断点时满足才停止；None表示无条件
             
         Returns:
             成功返回True
+            
+        Raises:
+            ValueError: 条件表达式无效
         """
-        if 0 <= address < len(self.cpu.rom):
-            self.breakpoints.add(address)
-            return True
-        return False
+        if not 0 <= address < len(self.cpu.rom):
+            return False
+        if condition:
+            self.conditions[address] = compile_condition(condition, self.symbols)
+            self.condition_text[address] = condition
+        else:
+            self.conditions.pop(address, None)
+            self.condition_text.pop(address, None)
+        self.breakpoints.add(address)
+        self._breakpoints_changed()
+        return True
         
     def remove_breakpoint(self, address: int) -> bool:
         """移除指定地址的断点"""
         if address in self.breakpoints:
             self.breakpoints.discard(address)
+            self.conditions.pop(address, None)
+            self.condition_text.pop(address, None)
+            self._breakpoints_changed()
             return True
         return False
         
     def clear_breakpoints(self):
         """清除所有断点"""
         self.breakpoints.clear()
+        self.conditions.clear()
+        self.condition_text.clear()
+        self._breakpoints_changed()
+        
+    def _breakpoints_changed(self):
+        """断点集合变化后立即重建代码段索引，运行时不必再等待"""
+        self.cpu.prepare_stops(self.breakpoints)
+        
+    def add_watch(
+        self,
+        start: int,
+        end: Optional[int] = None,
+        kind: int = WATCH_WRITE,
+        condition: Optional[str] = None,
+    ) -> Watchpoint:
+        """
+        添加RAM观察点，run_until_breakpoint在访问被监视的地址后停止
+        
+        Args:
+            start, end: RAM地址范围（含两端）
+            kind: WATCH_READ / WATCH_WRITE / WATCH_CHANGE 的组合
+            condition: 条件表达式，触发时满足才停止
+        """
+        return self.watches.add(start, end, kind, condition, self.symbols)
+        
+    def remove_watch(self, number: int) -> bool:
+        """按编号删除观察点"""
+        return self.watches.remove(number)
+        
+    @property
+    def watch_hit(self) -> Optional[WatchHit]:
+        """上次运行触发的观察点"""
+        return self.cpu.watch_hit
         
     def step(self) -> tuple[bool, CPUState]:
         """
@@ -54,7 +148,14 @@ class Debugger:
         Returns:
             (是否成功, CPU状态)
         """
-        success = self.cpu.step()
+        history = self.history
+        if history is None:
+            success = self.cpu.step()
+            self._cycle += success
+        else:
+            history.before_step()
+            success = self.cpu.step()
+            history.after_step(success)
         state = self.cpu.get_state()
         return success, state
         
@@ -67,39 +168,72 @@ class Debugger:
             
         Returns:
             (停止原因, CPU状态)
-            停止原因可能是: "breakpoint", "halted", "max_steps"
+            停止原因可能是: "breakpoint", "watchpoint", "halted", "terminal_loop", "max_steps",
+            "stopped"（运行期间调用了stop()）
+            为"watchpoint"时触发的观察点见watch_hit
         """
+        # 分段执行，段之间检查stop()
         self.running = True
+        reason = "max_steps"
         steps = 0
-        
-        while self.running and steps < max_steps:
-            # 检查断点
-            if self.cpu.PC in self.breakpoints:
-                self.running = False
-                return "breakpoint", self.cpu.get_state()
-                
-            # 执行一步
-            success = self.cpu.step()
-            steps += 1
-            
-            if not success:
-                self.running = False
-                return "halted", self.cpu.get_state()
-                
-        if steps >= max_steps:
-            self.running = False
-            return "max_steps", self.cpu.get_state()
-            
+        while steps < max_steps:
+            if not self.running:
+                reason = "stopped"
+                break
+            chunk = min(self.RUN_CHUNK, max_steps - steps)
+            if self.history is None:
+                reason, done = self.cpu.run(chunk, self.breakpoints, conditions=self.conditions, watch=self.watches)
+                self._cycle += done
+            else:
+                reason, done = self.history.run(chunk, self.breakpoints, self.conditions, self.watches)
+            steps += done
+            if reason != "max_steps":
+                break
         self.running = False
-        return "stopped", self.cpu.get_state()
+        return reason, self.cpu.get_state()
+        
+    @property
+    def cycle(self) -> int:
+        """从起点（或上次reset）开始已执行的指令数"""
+        return self._cycle if self.history is None else self.history.cycle
+        
+    def back(self, count: int = 1) -> CPUState:
+        """后退count条指令（需要执行历史）"""
+        self._require_history().back(count)
+        return self.cpu.get_state()
+        
+    def reverse_continue(self) -> tuple[str, CPUState]:
+        """
+        反向运行到上一次到达断点的位置
+        
+        Returns:
+            (停止原因, CPU状态)
+            停止原因可能是: "breakpoint", "start"（没有更早的命中，回到起点）
+        """
+        reason, _ = self._require_history().reverse_continue(self.breakpoints, self.conditions)
+        return reason, self.cpu.get_state()
+        
+    def goto_cycle(self, cycle: int) -> tuple[str, CPUState]:
+        """
+        跳转到第cycle条指令执行后的状态（向后通过检查点重放，向前继续执行；需要执行历史）
+        
+        Returns:
+            (停止原因, CPU状态)
+            向前执行时可能提前停止: "halted", "terminal_loop"；否则为"cycle"
+        """
+        reason, _ = self._require_history().goto(cycle)
+        return reason, self.cpu.get_state()
         
     def stop(self):
-        """停止运行"""
+        """停止运行（可从其他线程调用，run_until_breakpoint在当前段结束后返回"stopped"）"""
         self.running = False
         
     def reset(self):
         """重置CPU和调试器状态"""
         self.cpu.reset()
+        self._cycle = 0
+        if self.history is not None:
+            self.history.clear()
         self.running = False
         
     def get_current_line(self) -> Optional[str]:
@@ -117,12 +251,15 @@ class Debugger:
         }
         
     def get_ram_range(self, start: int, count: int) -> List[int]:
-        """获取指定范围的RAM内容"""
-        result = []
-        for addr in range(start, min(start + count, len(self.cpu.ram))):
-            result.append(self.cpu.ram[addr])
-        return result
+        """获取指定范围的RAM内容（副本，之后的执行不会改变它）"""
+        return self.cpu.ram_view(start, count).tolist()
+        
+    def ram_range_view(self, start: int, count: int) -> Sequence[int]:
+        """获取指定范围的RAM零拷贝视图（随CPU执行实时变化，需要保留时请用get_ram_range）"""
+        return self.cpu.ram_view(start, count)
         
     def set_ram_value(self, address: int, value: int):
         """设置RAM值（用于调试时手动修改内存）"""
         self.cpu.set_ram(address, value)
+        if self.history is not None:
+            self.history.invalidate()
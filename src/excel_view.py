@@ -1,23 +1,224 @@
 """Excel动态视图模块 - 实时更新和可视化CPU状态、断点、执行位置（重构版）"""
 
 from __future__ import annotations
-from typing import List, Set, Optional
+from typing import Callable, Dict, Iterable, List, Set, Optional, Tuple
 from pathlib import Path
-from openpyxl import Workbook, load_workbook
+from xml.sax.saxutils import escape
+import threading
+import zipfile
+from openpyxl import Workbook
 from openpyxl.styles import PatternFill, Font
+from .cpu import MOD_A, MOD_D, MOD_M, MOD_PC
+from .views import BaseView, ViewState, atomic_write
 
 
-class ExcelView:
+# 列号（1起始）
+COL_ROM_ADDR = 1
+COL_ASM = 2
+COL_A = 3
+COL_D = 4
+COL_PC = 5
+COL_RAM_ADDR = 6
+COL_VALUE = 7
+
+HEADERS = ["ROM_ADDR", "ASM", "A", "D", "PC", "RAM_ADDR", "VALUE"]
+SHEET_TITLE = "HACK Debugger"
+
+# 第一行为表头，ROM/RAM地址idx对应第idx + DATA_ROW行
+DATA_ROW = 2
+
+
+# 只写模式直接生成的xlsx包（单个工作表，表头粗体+灰色背景，其余单元格无样式）
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{SHEET_TITLE}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/styles.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="3"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill>'
+        '<fill><patternFill patternType="solid"><fgColor rgb="00CCCCCC"/><bgColor rgb="00CCCCCC"/>'
+        '</patternFill></fill></fills>'
+        '<borders count="1"><border/></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="0" fontId="1" fillId="2" borderId="0" xfId="0" applyFont="1" applyFill="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+
+_COLUMNS = "ABCDEFG"
+
+
+def _xlsx_cell(ref: str, value, style: str = "") -> str:
+    """生成一个单元格的XML，空字符串不生成单元格"""
+    if value == "" or value is None:
+        return ""
+    if isinstance(value, int):
+        return f'<c r="{ref}"{style}><v>{value}</v></c>'
+    return f'<c r="{ref}"{style} t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+
+
+def write_view_xlsx(path: str, rows: Iterable[List]):
+    """
+    以流式XML直接生成只含一个工作表的xlsx文件
+    
+    逐行写入压缩包，不构建任何单元格对象，内存占用与行数无关。
+    
+    Args:
+        path: 输出文件路径
+        rows: 数据行（不含表头），每行对应HEADERS的各列
+    """
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as package:
+        for name, content in _XLSX_PARTS.items():
+            package.writestr(name, content)
+        with package.open("xl/worksheets/sheet1.xml", "w") as raw:
+            write = raw.write
+            write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                b'<sheetData>'
+            )
+            header = "".join(
+                _xlsx_cell(f"{column}1", title, ' s="1"') for column, title in zip(_COLUMNS, HEADERS)
+            )
+            chunk = [f'<row r="1">{header}</row>']
+            for number, row in enumerate(rows, start=DATA_ROW):
+                cells = "".join(
+                    _xlsx_cell(f"{column}{number}", value) for column, value in zip(_COLUMNS, row)
+                )
+                chunk.append(f'<row r="{number}">{cells}</row>')
+                if len(chunk) >= 1024:
+                    write("".join(chunk).encode("utf-8"))
+                    chunk.clear()
+            chunk.append("</sheetData></worksheet>")
+            write("".join(chunk).encode("utf-8"))
+
+
+class _BackgroundWriter:
+    """
+    后台写入线程
+    
+    只保留最新的快照：连续多次submit在写入线程空闲前会合并为一次渲染和保存。
+    """
+    
+    def __init__(self, view: "ExcelView"):
+        self._view = view
+        self._pending: Optional[ViewState] = None
+        self._busy = False
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="ExcelViewWriter", daemon=True)
+        self._thread.start()
+    
+    def submit(self, state: ViewState):
+        """提交快照（立即返回，不等待磁盘I/O）"""
+        with self._condition:
+            self._raise_error()
+            self._pending = state
+            self._condition.notify_all()
+    
+    def flush(self):
+        """等待所有已提交的快照写入磁盘"""
+        with self._condition:
+            while self._pending is not None or self._busy:
+                self._condition.wait()
+            self._raise_error()
+    
+    def close(self):
+        """写完剩余快照后结束线程"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        with self._condition:
+            self._raise_error()
+    
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError(f"Excel视图后台保存失败: {error}") from error
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._pending is None:
+                    return
+                state, self._pending = self._pending, None
+                self._busy = True
+            try:
+                self._view._render(state)
+                self._view._save()
+            except BaseException as e:
+                with self._condition:
+                    self._error = e
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+
+class ExcelView(BaseView):
     """Excel动态视图管理器"""
     
-    def __init__(self, workbook_path: Path, config: Optional[dict] = None):
+    def __init__(
+        self,
+        workbook_path: Path,
+        config: Optional[dict] = None,
+        background: Optional[bool] = None,
+    ):
         """
         初始化Excel视图
         
         Args:
             workbook_path: Excel工作簿路径
             config: 配置字典（颜色等）
+            background: 是否由后台线程渲染和保存（默认取配置中的excel.background_save）
         """
+        super().__init__()
         self.workbook_path = workbook_path
         self.wb: Optional[Workbook] = None
         self.ws = None
@@ -30,6 +231,7 @@ class ExcelView:
                 self.color_current = excel_cfg.color_current_instruction
                 self.color_breakpoint = excel_cfg.color_breakpoint
                 self.color_modified = excel_cfg.color_modified_value
+                default_background = excel_cfg.background_save
             except ImportError:
                 # 如果相对导入失败，使用绝对导入
                 from config import get_config
@@ -37,33 +239,63 @@ class ExcelView:
                 self.color_current = excel_cfg.color_current_instruction
                 self.color_breakpoint = excel_cfg.color_breakpoint
                 self.color_modified = excel_cfg.color_modified_value
+                default_background = excel_cfg.background_save
         else:
             self.color_current = config.get("color_current_instruction", "FFFF00")
             self.color_breakpoint = config.get("color_breakpoint", "FF6B6B")
             self.color_modified = config.get("color_modified_value", "90EE90")
+            default_background = config.get("background_save", True)
+        self.background = default_background if background is None else background
+        self._writer: Optional[_BackgroundWriter] = None
+        
+        # 预先创建的填充样式，update中复用
+        self._fill_none = PatternFill()
+        self._fill_current = self._solid(self.color_current)
+        self._fill_breakpoint = self._solid(self.color_breakpoint)
+        self._fill_modified = self._solid(self.color_modified)
         
-    def initialize(self, source_lines: List[str], ram_size: int = 64):
+        self._reset_rendered(0, 0)
+    
+    @staticmethod
+    def _solid(color: str) -> PatternFill:
+        return PatternFill(start_color=color, end_color=color, fill_type="solid")
+    
+    def _reset_rendered(self, rom_size: int, ram_rows: int):
+        """重置“上次渲染的内容”，与initialize写出的空白表格一致"""
+        self._rom_size = rom_size
+        self._ram_rows = ram_rows
+        self._rendered_pc_row: Optional[int] = None  # 显示寄存器的行
+        self._rendered_registers: Tuple[int, int, int] = (0, 0, 0)
+        self._rendered_asm: Dict[int, PatternFill] = {}  # 行 -> ASM单元格的高亮
+        self._rendered_modified: Set[Tuple[int, int]] = set()  # 高亮为“已修改”的(行, 列)
+        self._rendered_ram: List[int] = [0] * ram_rows
+        self.last_update_cells = 0  # 上一次update写入的单元格数
+    
+    def initialize(self, source_lines: List[str], ram_size: int = 64, write_only: bool = False):
         """
-        初始化Excel工作簿结构
+        初始化Excel工作簿结构（总是新建工作簿，不读取已有文件）
         
         Args:
             source_lines: 源代码行列表
             ram_size: 要显示的RAM行数
+            write_only: 直接流式生成xlsx文件，不保留内存中的工作簿
+                （适合只导出视图、之后不再update的场景，大程序时更快更省内存）
         """
-        try:
-            self.wb = load_workbook(self.workbook_path)
-            self.ws = self.wb.active
-            # 清空旧内容
-            self.ws.delete_rows(1, self.ws.max_row)
-        except FileNotFoundError:
-            self.wb = Workbook()
-            self.ws = self.wb.active
+        self.flush()
+        self.close()
+        super().initialize(source_lines, ram_size)
+        
+        if write_only:
+            self._atomic_write(lambda tmp_name: write_view_xlsx(tmp_name, self._data_rows(source_lines, ram_size)))
+            self._reset_rendered(0, 0)
+            return
             
-        self.ws.title = "HACK Debugger"
+        self.wb = Workbook()
+        self.ws = self.wb.active
+        self.ws.title = SHEET_TITLE
         
         # 设置表头
-        headers = ["ROM_ADDR", "ASM", "A", "D", "PC", "RAM_ADDR", "VALUE"]
-        self.ws.append(headers)
+        self.ws.append(HEADERS)
         
         # 设置表头样式
         for cell in self.ws[1]:
@@ -71,19 +303,30 @@ class ExcelView:
             cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
         
         # 初始化数据行
-        max_rows = max(len(source_lines), ram_size)
-        for idx in range(max_rows):
-            rom_addr = idx if idx < len(source_lines) else ""
-            asm = source_lines[idx] if idx < len(source_lines) else ""
-            ram_addr = idx if idx < ram_size else ""
-            self.ws.append([rom_addr, asm, "", "", "", ram_addr, 0])
-            
-        self._save()
+        for row in self._data_rows(source_lines, ram_size):
+            self.ws.append(row)
         
+        self._reset_rendered(len(source_lines), ram_size)
+        self._save()
+    
+    @staticmethod
+    def _data_rows(source_lines: List[str], ram_size: int):
+        """逐行生成数据区：ROM地址、汇编源码、寄存器（空）、RAM地址、RAM值"""
+        rom_size = len(source_lines)
+        for idx in range(max(rom_size, ram_size)):
+            rom_addr = idx if idx < rom_size else ""
+            asm = source_lines[idx] if idx < rom_size else ""
+            ram_addr = idx if idx < ram_size else ""
+            yield [rom_addr, asm, "", "", "", ram_addr, 0]
+    
     def update(self, cpu, debugger, ram_view_size: int = 64):
         """
         更新Excel视图，显示当前CPU状态
         
+        与上次渲染的内容比较，只写入发生变化的单元格
+        （当前PC行、断点/当前指令高亮、修改高亮和变化的RAM值）。
+        后台模式下只记录状态快照后立即返回，渲染和保存由写入线程完成。
+        
         Args:
             cpu: CPU实例
             debugger: 调试器实例
@@ -91,96 +334,108 @@ class ExcelView:
         """
         if not self.ws:
             return
-            
-        # 清除所有单元格的背景色
-        for row in self.ws.iter_rows(min_row=2):
-            for cell in row:
-                cell.fill = PatternFill()
-                
-        # 更新寄存器列（只在当前PC行显示）
-        current_pc = cpu.PC
-        
-        # 遍历所有数据行
-        for row_idx, row in enumerate(self.ws.iter_rows(min_row=2), start=0):
-            rom_addr_cell = row[0]
-            asm_cell = row[1]
-            a_cell = row[2]
-            d_cell = row[3]
-            pc_cell = row[4]
-            ram_addr_cell = row[5]
-            ram_value_cell = row[6]
-            
-            # 标记断点（先处理断点，优先级最高）
-            is_breakpoint = rom_addr_cell.value in debugger.breakpoints
-            is_current = rom_addr_cell.value == current_pc
-            
-            # 更新寄存器（只在当前PC对应的行显示）
-            if is_current:
-                a_cell.value = cpu.A
-                d_cell.value = cpu.D
-                pc_cell.value = cpu.PC
-                
-                # 如果寄存器被修改，高亮显示
-                if "A" in cpu.last_modified:
-                    a_cell.fill = PatternFill(
-                        start_color=self.color_modified,
-                        end_color=self.color_modified,
-                        fill_type="solid"
-                    )
-                if "D" in cpu.last_modified:
-                    d_cell.fill = PatternFill(
-                        start_color=self.color_modified,
-                        end_color=self.color_modified,
-                        fill_type="solid"
-                    )
-                if "PC" in cpu.last_modified:
-                    pc_cell.fill = PatternFill(
-                        start_color=self.color_modified,
-                        end_color=self.color_modified,
-                        fill_type="solid"
-                    )
-            else:
-                # 其他行清空寄存器显示
-                a_cell.value = ""
-                d_cell.value = ""
-                pc_cell.value = ""
-            
-            # 设置ASM单元格颜色（断点优先于当前指令）
-            if is_breakpoint:
-                asm_cell.fill = PatternFill(
-                    start_color=self.color_breakpoint,
-                    end_color=self.color_breakpoint,
-                    fill_type="solid"
-                )
-            elif is_current:
-                asm_cell.fill = PatternFill(
-                    start_color=self.color_current,
-                    end_color=self.color_current,
-                    fill_type="solid"
-                )
-                
-            # 更新RAM值
-            ram_addr = ram_addr_cell.value
-            if isinstance(ram_addr, int) and 0 <= ram_addr < len(cpu.ram):
-                ram_value_cell.value = cpu.ram[ram_addr]
-                
-                # 如果RAM被修改，高亮显示
-                if f"M[{ram_addr}]" in cpu.last_modified:
-                    ram_value_cell.fill = PatternFill(
-                        start_color=self.color_modified,
-                        end_color=self.color_modified,
-                        fill_type="solid"
-                    )
-                    
+        
+        state = ViewState.capture(cpu, debugger, self._ram_rows)
+        
+        if not self.background:
+            self.render(state)
+            return
+        if self._writer is None:
+            self._writer = _BackgroundWriter(self)
+        self._writer.submit(state)
+    
+    def render(self, state: ViewState):
+        """同步渲染快照并保存"""
+        if not self.ws:
+            return
+        self._render(state)
         self._save()
+    
+    def _render(self, state: ViewState):
+        """将快照与上次渲染的内容比较，写入变化的单元格"""
+        ws = self.ws
+        touched = 0
+        
+        # 寄存器只显示在当前PC对应的行
+        pc = state.PC
+        pc_row = pc + DATA_ROW if 0 <= pc < self._rom_size else None
+        registers = (state.A, state.D, state.PC)
+        if pc_row != self._rendered_pc_row:
+            if self._rendered_pc_row is not None:
+                for column in (COL_A, COL_D, COL_PC):
+                    ws.cell(row=self._rendered_pc_row, column=column).value = ""
+                touched += 3
+            if pc_row is not None:
+                for column, value in zip((COL_A, COL_D, COL_PC), registers):
+                    ws.cell(row=pc_row, column=column).value = value
+                touched += 3
+        elif pc_row is not None and registers != self._rendered_registers:
+            for column, value, old in zip((COL_A, COL_D, COL_PC), registers, self._rendered_registers):
+                if value != old:
+                    ws.cell(row=pc_row, column=column).value = value
+                    touched += 1
+        self._rendered_pc_row = pc_row
+        self._rendered_registers = registers
+        
+        # ASM列高亮：断点优先于当前指令
+        asm_fills: Dict[int, PatternFill] = {}
+        if pc_row is not None:
+            asm_fills[pc_row] = self._fill_current
+        for address in state.breakpoints:
+            if 0 <= address < self._rom_size:
+                asm_fills[address + DATA_ROW] = self._fill_breakpoint
+        for row in asm_fills.keys() | self._rendered_asm.keys():
+            fill = asm_fills.get(row, self._fill_none)
+            if fill is not self._rendered_asm.get(row, self._fill_none):
+                ws.cell(row=row, column=COL_ASM).fill = fill
+                touched += 1
+        self._rendered_asm = asm_fills
         
+        # 变化的RAM值
+        rendered_ram = self._rendered_ram
+        for address, value in enumerate(state.ram):
+            if value != rendered_ram[address]:
+                ws.cell(row=address + DATA_ROW, column=COL_VALUE).value = value
+                rendered_ram[address] = value
+                touched += 1
+        
+        # 修改高亮
+        modified: Set[Tuple[int, int]] = set()
+        if pc_row is not None:
+            for flag, column in ((MOD_A, COL_A), (MOD_D, COL_D), (MOD_PC, COL_PC)):
+                if state.modified & flag:
+                    modified.add((pc_row, column))
+        if state.modified & MOD_M and 0 <= state.modified_addr < len(state.ram):
+            modified.add((state.modified_addr + DATA_ROW, COL_VALUE))
+        for row, column in self._rendered_modified - modified:
+            ws.cell(row=row, column=column).fill = self._fill_none
+            touched += 1
+        for row, column in modified - self._rendered_modified:
+            ws.cell(row=row, column=column).fill = self._fill_modified
+            touched += 1
+        self._rendered_modified = modified
+        
+        self.last_update_cells = touched
+    
+    def flush(self):
+        """等待后台写入完成（同步模式下无操作）"""
+        if self._writer is not None:
+            self._writer.flush()
+    
     def _save(self):
         """保存工作簿"""
         if self.wb:
-            self.wb.save(self.workbook_path)
-            
+            self._atomic_write(self.wb.save)
+    
+    def _atomic_write(self, write: Callable[[str], None]):
+        """调用write写入同目录下的临时文件再原子替换，Excel不会读到写了一半的文件"""
+        atomic_write(self.workbook_path, write)
+    
     def close(self):
-        """关闭工作簿"""
+        """关闭工作簿（先写完所有未保存的更新）"""
+        if self._writer is not None:
+            writer, self._writer = self._writer, None
+            writer.close()
         if self.wb:
             self.wb.close()
             self.wb = None
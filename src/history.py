@@ -0,0 +1,266 @@
+"""执行历史 - 周期性检查点 + 单步撤销日志，支持反向执行
+
+检查点保存完整状态（寄存器 + RAM字节副本），每执行interval条指令保存一个。
+回到第N条指令时，从不晚于N的最近检查点恢复，再用批量run()重放到N，
+耗时只与检查点间隔有关，与回退的距离无关。
+
+调试器逐条单步时额外记录撤销日志（执行前的寄存器和将被覆盖的RAM单元），
+back可以直接撤销而不必重放。批量run()期间不记录撤销日志，以免拖慢主循环。
+
+检查点总大小超过内存预算时，隔一个删除一个（保留最早的），间隔随之加倍。
+执行之外修改了状态（如调试器的set命令）时需调用invalidate()。
+"""
+
+from __future__ import annotations
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from .cpu import HackCPU
+from .watch import Condition, WatchSet
+
+
+@dataclass
+class Checkpoint:
+    """某一周期的完整CPU状态"""
+    cycle: int
+    A: int
+    D: int
+    PC: int
+    halted: bool
+    halt_reason: Optional[str]
+    ram: bytes
+    
+    @classmethod
+    def capture(cls, cpu: HackCPU, cycle: int) -> "Checkpoint":
+        return cls(cycle, cpu.A, cpu.D, cpu.PC, cpu.halted, cpu.halt_reason, cpu.ram_snapshot())
+    
+    def restore(self, cpu: HackCPU):
+        cpu.restore_ram(self.ram)
+        cpu.A, cpu.D, cpu.PC = self.A, self.D, self.PC
+        cpu.halted, cpu.halt_reason = self.halted, self.halt_reason
+        cpu._clear_modified()
+
+
+class UndoEntry(NamedTuple):
+    """撤销一条指令所需的信息（执行前的值）"""
+    A: int
+    D: int
+    PC: int
+    halted: bool
+    halt_reason: Optional[str]
+    addr: int  # 该指令写入的RAM地址，未写入为-1
+    old_value: int  # 写入前的值
+
+
+class ExecutionHistory:
+    """CPU的执行历史"""
+    
+    def __init__(self, cpu: HackCPU, interval: int = 10000, budget_mb: float = 64):
+        """
+        Args:
+            cpu: CPU实例
+            interval: 检查点间隔（指令数），也是重放的最大长度
+            budget_mb: 检查点占用内存的上限（MB）
+        """
+        if interval <= 0:
+            raise ValueError(f"检查点间隔必须为正数: {interval}")
+        self.cpu = cpu
+        self.base_interval = interval
+        self.interval = interval
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.undo_limit = interval  # 更早的步骤由检查点重放覆盖
+        self.clear()
+    
+    def clear(self):
+        """清空历史（CPU复位后调用）"""
+        self.cycle = 0  # 从起点开始已执行的指令数
+        self.interval = self.base_interval
+        self.checkpoints: List[Checkpoint] = []
+        self._cycles: List[int] = []  # 检查点周期，与checkpoints一一对应，用于二分查找
+        self.undo_log: List[UndoEntry] = []  # 结束于当前周期的连续单步记录
+    
+    @property
+    def memory_bytes(self) -> int:
+        """检查点占用的内存（字节）"""
+        return sum(len(checkpoint.ram) for checkpoint in self.checkpoints)
+    
+    def _save_checkpoint(self):
+        """在当前周期保存检查点（已存在则跳过），超出预算时稀疏化"""
+        index = bisect_left(self._cycles, self.cycle)
+        if index < len(self._cycles) and self._cycles[index] == self.cycle:
+            return
+        self.checkpoints.insert(index, Checkpoint.capture(self.cpu, self.cycle))
+        self._cycles.insert(index, self.cycle)
+        if len(self.checkpoints) > 2 and self.memory_bytes > self.budget_bytes:
+            self.checkpoints = self.checkpoints[::2]
+            self._cycles = self._cycles[::2]
+            self.interval *= 2
+    
+    def start(self):
+        """首次执行前保存起点检查点（此前对CPU的初始化都包含在内）"""
+        if not self.checkpoints:
+            self._save_checkpoint()
+    
+    def invalidate(self):
+        """状态在执行之外被修改：丢弃当前周期及之后的检查点和撤销日志，重新保存当前状态"""
+        index = bisect_left(self._cycles, self.cycle)
+        del self.checkpoints[index:]
+        del self._cycles[index:]
+        self.undo_log.clear()
+        self._save_checkpoint()
+    
+    def before_step(self):
+        """逐条单步执行前调用：记录撤销信息"""
+        self.start()
+        cpu = self.cpu
+        addr = cpu.write_target()
+        self.undo_log.append(UndoEntry(
+            cpu.A, cpu.D, cpu.PC, cpu.halted, cpu.halt_reason,
+            addr, cpu.ram[addr] if addr >= 0 else 0
+        ))
+    
+    def after_step(self, executed: bool):
+        """逐条单步执行后调用"""
+        if not executed:
+            self.undo_log.pop()
+            return
+        self.cycle += 1
+        if len(self.undo_log) > self.undo_limit:
+            del self.undo_log[:len(self.undo_log) - self.undo_limit // 2]
+        if self.cycle % self.interval == 0:
+            self._save_checkpoint()
+    
+    def run(
+        self,
+        max_steps: int,
+        stop_at: Optional[Iterable[int]] = None,
+        conditions: Optional[Dict[int, Condition]] = None,
+        watch: Optional[WatchSet] = None,
+    ) -> Tuple[str, int]:
+        """
+        批量执行，按检查点间隔分段，在间隔的整数倍处保存检查点，参数含义与HackCPU.run()相同
+        
+        Returns:
+            (停止原因, 实际执行的指令数)，与HackCPU.run()相同
+        """
+        self.start()
+        stops = frozenset(stop_at or ())
+        total = 0
+        reason = "max_steps"
+        while total < max_steps:
+            chunk = min(max_steps - total, self.interval - self.cycle % self.interval)
+            reason, steps = self.cpu.run(chunk, stop_at=stops, conditions=conditions, watch=watch)
+            total += steps
+            self.cycle += steps
+            if self.cycle % self.interval == 0:
+                self._save_checkpoint()
+            if reason != "max_steps":
+                break
+        if total:
+            self.undo_log.clear()
+        return reason, total
+    
+    def undo(self, count: int = 1):
+        """用撤销日志后退count条指令"""
+        if count > len(self.undo_log):
+            raise ValueError(f"撤销日志只有{len(self.undo_log)}条")
+        cpu = self.cpu
+        ram = cpu.ram
+        for _ in range(count):
+            entry = self.undo_log.pop()
+            if entry.addr >= 0:
+                ram[entry.addr] = entry.old_value
+            cpu.A, cpu.D, cpu.PC = entry.A, entry.D, entry.PC
+            cpu.halted, cpu.halt_reason = entry.halted, entry.halt_reason
+        cpu._clear_modified()
+        self.cycle -= count
+    
+    def _replay(self, target: int):
+        """从不晚于target的最近检查点恢复并重放到target（target必须已经执行到过）"""
+        cpu = self.cpu
+        checkpoint = self.checkpoints[bisect_right(self._cycles, target) - 1]
+        # 重放的指令不重复记录轨迹和剖析计数
+        tracer, profiler, cpu.tracer, cpu.profiler = cpu.tracer, cpu.profiler, None, None
+        try:
+            checkpoint.restore(cpu)
+            remaining = target - checkpoint.cycle
+            if remaining:
+                # 用解释器重放：JIT换用不同的停止地址集合会使已编译的块作废
+                HackCPU.run(cpu, remaining - 1)
+                cpu.step()  # 最后一条单步执行，视图可以显示它修改了什么
+        finally:
+            cpu.tracer, cpu.profiler = tracer, profiler
+        # 撤销日志中target之前的部分仍然有效
+        kept = target - (self.cycle - len(self.undo_log))
+        if kept > 0:
+            del self.undo_log[kept:]
+        else:
+            self.undo_log.clear()
+        self.cycle = target
+    
+    def goto(self, target: int) -> Tuple[str, int]:
+        """
+        到达第target条指令执行后的状态：向后由撤销日志或检查点重放，向前继续执行
+        
+        Returns:
+            (原因, 到达的周期)，向前执行时原因与run()相同（可能提前停机），向后为"cycle"
+        """
+        if target < 0:
+            raise ValueError(f"无效的周期: {target}")
+        if target >= self.cycle:
+            reason, _ = self.run(target - self.cycle)
+            return ("cycle" if reason == "max_steps" else reason), self.cycle
+        if self.cycle - target <= len(self.undo_log):
+            self.undo(self.cycle - target)
+        else:
+            self._replay(target)
+        return "cycle", self.cycle
+    
+    def back(self, count: int = 1) -> int:
+        """后退count条指令（最多退回起点），返回到达的周期"""
+        self.goto(max(0, self.cycle - count))
+        return self.cycle
+    
+    def reverse_continue(
+        self,
+        stop_at: Iterable[int],
+        conditions: Optional[Dict[int, Condition]] = None,
+    ) -> Tuple[str, int]:
+        """
+        反向运行到最近一次到达停止地址（且满足条件）的位置（PC位于该地址、尚未执行）
+        
+        从离当前最近的检查点开始逐段向前扫描，记录每段中最后一次命中的周期。
+        
+        Returns:
+            (原因, 到达的周期)：命中为"breakpoint"，否则回到起点，原因为"start"
+        """
+        stops = frozenset(stop_at)
+        cpu = self.cpu
+        hit = None
+        end = self.cycle
+        index = bisect_left(self._cycles, end) - 1
+        tracer, profiler, cpu.tracer, cpu.profiler = cpu.tracer, cpu.profiler, None, None
+        try:
+            while hit is None and index >= 0 and stops:
+                checkpoint = self.checkpoints[index]
+                checkpoint.restore(cpu)
+                position = checkpoint.cycle
+                while position < end:
+                    reason, steps = HackCPU.run(cpu, end - position, stop_at=stops, conditions=conditions)
+                    position += steps
+                    if reason != "breakpoint":
+                        break
+                    hit = position
+                    if not cpu.step():
+                        break
+                    position += 1
+                end = checkpoint.cycle
+                index -= 1
+        finally:
+            cpu.tracer, cpu.profiler = tracer, profiler
+        if hit is None:
+            if self.checkpoints:
+                self._replay(0)
+            return "start", self.cycle
+        self._replay(hit)
+        return "breakpoint", self.cycle
@@ -0,0 +1,225 @@
+"""基本块JIT执行引擎 - 将ROM按基本块编译为Python函数后整块执行"""
+
+from __future__ import annotations
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+from .cpu import (
+    HackCPU,
+    Rom,
+    alu,
+    find_leaders,
+    KIND_A,
+    DEST_A,
+    DEST_D,
+    DEST_M,
+    JUMP_LT,
+    JUMP_EQ,
+    JUMP_GT,
+)
+from .watch import Condition, WatchSet
+
+
+# comp编号 -> (Python表达式模板, 是否需要截断为16位)
+# 模板中的 {x} 为D寄存器，{y} 为A寄存器或M[A]；表外的comp编号调用按位ALU
+COMP_EXPR: Dict[int, Tuple[str, bool]] = {
+    0b101010: ("0", False),
+    0b111111: ("1", False),
+    0b111010: ("-1", False),
+    0b001100: ("{x}", False),
+    0b110000: ("{y}", False),
+    0b001101: ("~{x}", False),
+    0b110001: ("~{y}", False),
+    0b001111: ("-{x}", True),
+    0b110011: ("-{y}", True),
+    0b011111: ("{x} + 1", True),
+    0b110111: ("{y} + 1", True),
+    0b001110: ("{x} - 1", True),
+    0b110010: ("{y} - 1", True),
+    0b000010: ("{x} + {y}", True),
+    0b010011: ("{x} - {y}", True),
+    0b000111: ("{y} - {x}", True),
+    0b000000: ("{x} & {y}", False),
+    0b010101: ("{x} | {y}", False),
+}
+
+# jump掩码 -> 跳转条件表达式（v为comp结果）
+JUMP_EXPR: Dict[int, str] = {
+    JUMP_GT: "v > 0",
+    JUMP_EQ: "v == 0",
+    JUMP_GT | JUMP_EQ: "v >= 0",
+    JUMP_LT: "v < 0",
+    JUMP_LT | JUMP_GT: "v != 0",
+    JUMP_LT | JUMP_EQ: "v <= 0",
+}
+
+# 编译后的块函数：(ram, A, D) -> (A, D, 下一个PC)
+BlockFunction = Callable[[List[int], int, int], Tuple[int, int, int]]
+
+
+class JitCPU(HackCPU):
+    """
+    基本块JIT引擎
+    
+    与HackCPU共享ram/A/D/PC状态，step()仍逐条解释执行，
+    run()则按基本块调用编译好的函数，每次分派执行整块指令。
+    """
+    
+    @HackCPU.rom.setter
+    def rom(self, rom: Rom):
+        """替换ROM，重新解码并丢弃已编译的块"""
+        HackCPU.rom.fset(self, rom)
+        self._leaders = find_leaders(self._decoded)
+        self._block_stops: FrozenSet[int] = frozenset()
+        self._blocks: Dict[int, Tuple[BlockFunction, int]] = {}
+    
+    def _compile_block(self, start: int) -> Tuple[BlockFunction, int]:
+        """
+        编译从start开始的基本块并缓存
+        
+        块在跳转指令处（含）或下一个块起点/停止地址之前结束。
+        非块起点的地址（例如动态计算的跳转目标）也可以按需编译。
+        
+        Returns:
+            (块函数, 块内指令数)
+        """
+        decoded = self._decoded
+        size = len(decoded)
+        ram_size = len(self.ram)
+        lines = ["def block(ram, A, D):"]
+        known_a = None  # 块内可静态确定的A值
+        pc = start
+        
+        while True:
+            kind, value, comp, a_bit, dest, jump = decoded[pc]
+            pc += 1
+            
+            if kind == KIND_A:
+                lines.append(f"    A = {value}")
+                known_a = value
+            else:
+                addr = f"{known_a % ram_size}" if known_a is not None else f"A % {ram_size}"
+                template, wrap = COMP_EXPR.get(comp, (f"alu({{x}}, {{y}}, {comp})", False))
+                expr = template.format(x="D", y=f"ram[{addr}]" if a_bit else "A")
+                if wrap:
+                    expr = f"(({expr}) + 32768 & 65535) - 32768"
+                
+                targets = []
+                if dest & DEST_A:
+                    targets.append("A")
+                    known_a = None
+                if dest & DEST_D:
+                    targets.append("D")
+                if dest & DEST_M:
+                    # 与解释器一致：M的地址取写入dest A之后的A
+                    targets.append(f"ram[A % {ram_size}]" if dest & DEST_A else f"ram[{addr}]")
+                
+                if len(targets) == 1 and not jump:
+                    lines.append(f"    {targets[0]} = {expr}")
+                elif targets or jump not in (0, 0b111):
+                    lines.append(f"    v = {expr}")
+                    lines.extend(f"    {target} = v" for target in targets)
+                
+                if jump:
+                    target = f"{known_a}" if known_a is not None else "A"
+                    if jump == 0b111:
+                        lines.append(f"    return A, D, {target}")
+                    else:
+                        lines.append(f"    if {JUMP_EXPR[jump]}:")
+                        lines.append(f"        return A, D, {target}")
+                        lines.append(f"    return A, D, {pc}")
+                    break
+            
+            if pc >= size or pc in self._leaders or pc in self._block_stops or pc in self.terminal_loops:
+                lines.append(f"    return A, D, {pc}")
+                break
+        
+        namespace: dict = {"alu": alu}
+        exec(compile("\n".join(lines), f"<hack-block-{start}>", "exec"), namespace)
+        entry = (namespace["block"], pc - start)
+        self._blocks[start] = entry
+        return entry
+    
+    def _invalidate_stops(self, changed: FrozenSet[int]):
+        """
+        停止地址增删后只丢弃受影响的块
+        
+        新增的停止地址落在块内部时块需要在此切分；删除的停止地址恰好在块末尾之后时
+        块可以延长。其余块的边界不变，继续使用。
+        """
+        self._blocks = {
+            start: entry for start, entry in self._blocks.items()
+            if not any(start < stop <= start + entry[1] for stop in changed)
+        }
+    
+    def run(
+        self,
+        max_steps: int = 100000,
+        stop_at: Optional[Iterable[int]] = None,
+        halt: Optional[Callable[[HackCPU], bool]] = None,
+        conditions: Optional[Dict[int, Condition]] = None,
+        watch: Optional[WatchSet] = None,
+    ) -> Tuple[str, int]:
+        """
+        按基本块运行，直到停机、到达停止地址或达到步数上限
+        
+        设置了tracer或profiler时回退到解释器的run()，由其记录轨迹或统计周期
+        
+        Args:
+            max_steps: 最大执行指令数
+            stop_at: 停止地址集合，块在这些地址处切分，只需在块入口检查
+            halt: 停止条件；需要逐条检查，因此回退到解释器的run()
+            conditions: 断点条件，在块入口（即断点处）计算
+            watch: 观察点；需要检查每次RAM访问，因此回退到解释器的run()
+        
+        Returns:
+            (停止原因, 实际执行的指令数)，含义与HackCPU.run()相同
+        """
+        if halt is not None or self.tracer is not None or self.profiler is not None or watch:
+            return super().run(max_steps, stop_at, halt, conditions, watch)
+        
+        self._clear_modified()
+        self.watch_hit = None
+        if self.halted:
+            return self.halt_reason or "halted", 0
+        
+        stops = frozenset(stop_at or ())
+        if stops != self._block_stops:
+            self._invalidate_stops(stops ^ self._block_stops)
+            self._block_stops = stops
+        
+        blocks = self._blocks
+        compile_block = self._compile_block
+        terminal_loops = self.terminal_loops
+        size = len(self._decoded)
+        ram = self.ram
+        A, D, pc = self.A, self.D, self.PC
+        steps = 0
+        reason = "max_steps"
+        
+        while steps < max_steps:
+            if pc in stops and (not conditions or pc not in conditions or conditions[pc](A, D, ram)):
+                reason = "breakpoint"
+                break
+            if pc < 0 or pc >= size:
+                reason = "halted"
+                break
+            if pc in terminal_loops:
+                reason = "terminal_loop"
+                break
+            entry = blocks.get(pc)
+            if entry is None:
+                entry = compile_block(pc)
+            block, length = entry
+            if steps + length > max_steps:
+                break
+            A, D, pc = block(ram, A, D)
+            steps += length
+        
+        self.A, self.D, self.PC = A, D, pc
+        if reason in ("halted", "terminal_loop"):
+            self._halt(reason)
+            
+        # 剩余步数不足一个完整块时用解释器补齐
+        if reason == "max_steps" and steps < max_steps:
+            reason, extra = super().run(max_steps - steps, stops, conditions=conditions)
+            steps += extra
+        return reason, steps
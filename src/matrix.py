@@ -0,0 +1,182 @@
+"""测试矩阵运行器 - 同一程序的多组输入/期望结果用进程池并行执行"""
+
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional, Union
+import json
+import os
+import pathlib
+import time
+from .assembler import PREDEFINED
+from .cache import assemble_cached
+from .cpu import HackCPU
+from .jit import JitCPU
+
+
+@dataclass
+class MatrixCase:
+    """一个测试用例：初始RAM和期望RAM"""
+    name: str
+    ram: Dict[int, int] = field(default_factory=dict)  # 初始RAM设置
+    expect: Dict[int, int] = field(default_factory=dict)  # 期望的RAM结果
+    max_steps: int = 100000
+    allow_max_steps: bool = False  # 达到步数上限仍可判为通过（程序本身不停机时使用）
+
+
+@dataclass
+class CaseResult:
+    """单个用例的运行结果"""
+    name: str
+    passed: bool
+    reason: str  # 停止原因（与HackCPU.run()一致）
+    cycles: int  # 执行的指令数
+    actual: Dict[int, int] = field(default_factory=dict)  # 期望地址上的实际值
+    error: Optional[str] = None
+
+
+# 程序正常结束的停止原因
+FINISHED_REASONS = ("halted", "terminal_loop")
+
+
+def _signed16(value: int) -> int:
+    """转换为16位有符号数，与cpu.set_ram/get_ram一致（65535 -> -1）"""
+    return ((value + 0x8000) & 0xFFFF) - 0x8000
+
+
+def parse_address(key: Union[int, str]) -> int:
+    """将JSON中的地址（数字或R0/SP/SCREEN等预定义符号）转换为整数"""
+    if isinstance(key, int):
+        return key
+    key = key.strip()
+    if key.lstrip("-").isdigit():
+        return int(key)
+    if key in PREDEFINED:
+        return PREDEFINED[key]
+    raise ValueError(f"无效的RAM地址: {key}")
+
+
+def load_cases(path: pathlib.Path) -> List[MatrixCase]:
+    """
+    从JSON文件加载测试用例
+
+    格式为用例列表，或 {"cases": [...]}，每个用例形如：
+        {"name": "even+even", "ram": {"R0": 4, "R1": 10}, "expect": {"R2": 28}, "max_steps": 10000}
+
+    值按16位有符号数处理。默认只有程序正常结束（停机或进入终止循环）才能通过，
+    不停机的程序需设置 "allow_max_steps": true。
+    """
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if isinstance(data, dict):
+        data = data.get("cases", [])
+
+    cases = []
+    for index, item in enumerate(data):
+        cases.append(MatrixCase(
+            name=str(item.get("name", f"case{index}")),
+            ram={parse_address(k): _signed16(int(v)) for k, v in item.get("ram", {}).items()},
+            expect={parse_address(k): _signed16(int(v)) for k, v in item.get("expect", {}).items()},
+            max_steps=int(item.get("max_steps", 100000)),
+            allow_max_steps=bool(item.get("allow_max_steps", False)),
+        ))
+    return cases
+
+
+def run_case(cpu: HackCPU, case: MatrixCase) -> CaseResult:
+    """在给定CPU上运行一个用例（CPU会先被重置）"""
+    try:
+        cpu.reset()
+        for address, value in case.ram.items():
+            cpu.set_ram(address, value)
+        reason, cycles = cpu.run(case.max_steps)
+        actual = {address: cpu.get_ram(address) for address in case.expect}
+        finished = reason in FINISHED_REASONS or (case.allow_max_steps and reason == "max_steps")
+        return CaseResult(
+            name=case.name,
+            passed=finished and actual == case.expect,
+            reason=reason,
+            cycles=cycles,
+            actual=actual,
+        )
+    except Exception as e:
+        return CaseResult(name=case.name, passed=False, reason="error", cycles=0, error=str(e))
+
+
+# 工作进程中的CPU（每个进程只接收一次ROM）
+_worker_cpu: Optional[HackCPU] = None
+
+
+def _init_worker(machine_code: List[str], engine: str):
+    """进程池初始化：在工作进程中创建CPU"""
+    global _worker_cpu
+    cpu_class = JitCPU if engine == "jit" else HackCPU
+    _worker_cpu = cpu_class(machine_code)
+
+
+def _run_in_worker(case: MatrixCase) -> CaseResult:
+    """在工作进程中运行一个用例"""
+    return run_case(_worker_cpu, case)
+
+
+def run_matrix(
+    machine_code: List[str],
+    cases: List[MatrixCase],
+    workers: Optional[int] = None,
+    engine: str = "interp",
+) -> List[CaseResult]:
+    """
+    运行测试矩阵
+
+    Args:
+        machine_code: 已汇编的机器码（只汇编一次）
+        cases: 测试用例列表
+        workers: 进程数，默认为CPU核数；1表示在当前进程中顺序执行
+        engine: 执行引擎，"interp" 或 "jit"
+
+    Returns:
+        与cases顺序一致的结果列表
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(cases)))
+
+    if workers == 1:
+        _init_worker(machine_code, engine)
+        return [_run_in_worker(case) for case in cases]
+
+    # 每个进程分到若干批用例，减少进程间通信次数
+    chunksize = max(1, len(cases) // (workers * 4))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(machine_code, engine),
+    ) as pool:
+        return list(pool.map(_run_in_worker, cases, chunksize=chunksize))
+
+
+def build_report(source: pathlib.Path, results: List[CaseResult], elapsed: float) -> Dict[str, Any]:
+    """汇总结果为JSON报告"""
+    passed = sum(1 for result in results if result.passed)
+    return {
+        "source": str(source),
+        "total": len(results),
+        "passed": passed,
+        "failed": len(results) - passed,
+        "total_cycles": sum(result.cycles for result in results),
+        "elapsed_seconds": round(elapsed, 6),
+        "cases": [asdict(result) for result in results],
+    }
+
+
+def run_matrix_file(
+    source: pathlib.Path,
+    cases_path: pathlib.Path,
+    workers: Optional[int] = None,
+    engine: str = "interp",
+) -> Dict[str, Any]:
+    """汇编source并运行cases_path中的用例，返回JSON报告"""
+    machine_code = assemble_cached(source).machine_code
+    cases = load_cases(cases_path)
+    start = time.perf_counter()
+    results = run_matrix(machine_code, cases, workers=workers, engine=engine)
+    return build_report(source, results, time.perf_counter() - start)
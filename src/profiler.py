@@ -0,0 +1,228 @@
+"""周期剖析 - 按ROM地址统计指令执行次数和跳转结果，按标签和循环汇总
+
+Profiler为每个ROM地址维护执行次数，为每条跳转指令维护跳转成立的次数
+（不成立次数 = 执行次数 - 成立次数）。计数器是预分配的array，
+执行循环中只增加一次下标自增；按代码段执行时每段只在段首计数一次，
+run()结束后再按段长度展开到段内每条指令。
+
+报告把计数与源码对应起来：
+    热点指令：执行次数最多的指令及其源码
+    标签：每个标签到下一个标签之间的地址范围内的周期总数
+    循环：以常量地址向后跳转（@LOOP ... 0;JMP）构成的范围，统计迭代次数和周期
+
+输出为文本，或机器可读的JSON和collapsed stacks（flamegraph.pl等工具的输入格式）。
+"""
+
+from __future__ import annotations
+from array import array
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+import json
+from .assembler import PREDEFINED, first_pass, iter_clean_lines
+from .cpu import DEST_A, KIND_A, KIND_C, Rom, StretchIndex, decode_rom
+
+
+START_LABEL = "(start)"  # 第一个标签之前的代码
+
+
+def find_labels(lines: Iterable[str]) -> Dict[str, int]:
+    """从汇编源码中收集标签（ROM地址），不含预定义符号和变量"""
+    return {name: address for name, address in first_pass(iter_clean_lines(lines)).items() if name not in PREDEFINED}
+
+
+@dataclass
+class InstructionStat:
+    """一条指令的统计"""
+    pc: int
+    source: str
+    label: str  # 所属标签
+    hits: int  # 执行次数
+    taken: Optional[int] = None  # 跳转成立次数，非跳转指令为None
+    
+    @property
+    def not_taken(self) -> Optional[int]:
+        return None if self.taken is None else self.hits - self.taken
+
+
+@dataclass
+class LabelStat:
+    """一个标签范围 [start, end) 的统计"""
+    name: str
+    start: int
+    end: int
+    cycles: int
+
+
+@dataclass
+class LoopStat:
+    """一个循环 [start, end] 的统计，end为向后跳转的指令"""
+    label: str
+    start: int
+    end: int
+    iterations: int  # 向后跳转成立的次数
+    cycles: int  # 范围内执行的指令总数（含内层循环）
+
+
+@dataclass
+class ProfileReport:
+    """剖析报告"""
+    total: int  # 总周期
+    instructions: List[InstructionStat] = field(default_factory=list)  # 执行过的指令，按地址排序
+    labels: List[LabelStat] = field(default_factory=list)  # 按周期降序
+    loops: List[LoopStat] = field(default_factory=list)  # 按周期降序
+    
+    def hottest(self, top: int = 10) -> List[InstructionStat]:
+        """执行次数最多的top条指令"""
+        return sorted(self.instructions, key=lambda stat: (-stat.hits, stat.pc))[:top]
+    
+    def _percent(self, cycles: int) -> float:
+        return cycles * 100 / self.total if self.total else 0.0
+    
+    def format_text(self, top: int = 10) -> str:
+        """格式化为文本报告"""
+        lines = [f"总周期: {self.total}", "", f"热点指令（前{top}条）:"]
+        lines.append(f"  {'PC':>6} {'次数':>10} {'占比':>7}  {'跳转/不跳转':>12}  源码")
+        for stat in self.hottest(top):
+            branch = f"{stat.taken}/{stat.not_taken}" if stat.taken is not None else ""
+            lines.append(
+                f"  {stat.pc:>6} {stat.hits:>12} {self._percent(stat.hits):>8.1f}%  {branch:>17}  "
+                f"{stat.source}  [{stat.label}]"
+            )
+        
+        lines += ["", "标签:"]
+        for label in self.labels[:top]:
+            lines.append(
+                f"  {label.name:<24} {label.start:>6}-{label.end - 1:<6} {label.cycles:>12} {self._percent(label.cycles):>7.1f}%"
+            )
+        
+        lines += ["", "循环:"]
+        if not self.loops:
+            lines.append("  （无）")
+        for loop in self.loops[:top]:
+            lines.append(
+                f"  {loop.label:<24} {loop.start:>6}-{loop.end:<6} 迭代 {loop.iterations:>10}  "
+                f"周期 {loop.cycles:>12} {self._percent(loop.cycles):>7.1f}%"
+            )
+        return "\n".join(lines)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        instructions = []
+        for stat in self.instructions:
+            entry = asdict(stat)
+            if stat.taken is not None:
+                entry["not_taken"] = stat.not_taken
+            instructions.append(entry)
+        return {
+            "total": self.total,
+            "instructions": instructions,
+            "labels": [asdict(label) for label in self.labels],
+            "loops": [asdict(loop) for loop in self.loops],
+        }
+    
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+    
+    def collapsed(self) -> str:
+        """collapsed stacks格式：每行 "标签;PC 源码 次数"（源码中的;替换为空格）"""
+        lines = []
+        for stat in self.instructions:
+            frame = f"{stat.pc} {stat.source}".replace(";", " ")
+            lines.append(f"{stat.label};{frame} {stat.hits}")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+
+class Profiler:
+    """
+    按ROM地址统计执行周期
+    
+    用法：cpu.profiler = Profiler(cpu.rom)，之后step()和run()都会计数
+    （JitCPU设置了profiler时回退到解释器）。
+    """
+    
+    def __init__(self, rom: Rom):
+        self.decoded = decode_rom(rom)
+        size = len(self.decoded)
+        self.hits = array("q", bytes(8 * size))  # 每个地址的执行次数
+        self.taken = array("q", bytes(8 * size))  # 每个地址跳转成立的次数
+    
+    def count(self, pc: int, taken: bool):
+        """单步执行计数"""
+        self.hits[pc] += 1
+        if taken:
+            self.taken[pc] += 1
+    
+    def add_stretches(self, entries: Mapping[int, int], index: StretchIndex):
+        """按代码段执行结束后，把段首的进入次数（段首地址 -> 次数）展开到段内每条指令"""
+        hits = self.hits
+        lengths = index.lengths
+        for start, count in entries.items():
+            for pc in range(start, start + lengths[start]):
+                hits[pc] += count
+    
+    def reset(self):
+        size = len(self.hits)
+        self.hits = array("q", bytes(8 * size))
+        self.taken = array("q", bytes(8 * size))
+    
+    @property
+    def total(self) -> int:
+        """总周期"""
+        return sum(self.hits)
+    
+    def _loops(self) -> List[Tuple[int, int]]:
+        """找出向后跳转构成的循环 (起始地址, 跳转指令地址)：跳转目标由紧邻的@常量给出"""
+        decoded = self.decoded
+        loops = []
+        for pc in range(1, len(decoded)):
+            kind, _, _, _, dest, jump = decoded[pc]
+            previous = decoded[pc - 1]
+            if kind == KIND_C and jump and previous[0] == KIND_A and previous[1] <= pc and not dest & DEST_A:
+                loops.append((previous[1], pc))
+        return loops
+    
+    def report(self, source_lines: Sequence[str], labels: Optional[Mapping[str, int]] = None) -> ProfileReport:
+        """
+        生成报告
+        
+        Args:
+            source_lines: 每个ROM地址对应的源码（AssemblyResult.source_lines）
+            labels: 标签 -> ROM地址（find_labels的结果），None表示不按标签汇总
+        """
+        hits, taken = self.hits, self.taken
+        size = len(hits)
+        # 同一地址的多个标签用/连接
+        names: Dict[int, str] = {}
+        for name, address in sorted((labels or {}).items(), key=lambda item: item[1]):
+            if 0 <= address < size:
+                names[address] = f"{names[address]}/{name}" if address in names else name
+        starts = sorted(names)
+        if not starts or starts[0] != 0:
+            names[0] = START_LABEL
+            starts.insert(0, 0)
+        
+        owner = [START_LABEL] * size
+        label_stats = []
+        for i, start in enumerate(starts):
+            end = starts[i + 1] if i + 1 < len(starts) else size
+            owner[start:end] = [names[start]] * (end - start)
+            label_stats.append(LabelStat(names[start], start, end, sum(hits[start:end])))
+        
+        instructions = []
+        for pc in range(size):
+            if hits[pc]:
+                jump = self.decoded[pc][0] == KIND_C and self.decoded[pc][5]
+                source = source_lines[pc] if pc < len(source_lines) else ""
+                instructions.append(InstructionStat(pc, source, owner[pc], hits[pc], taken[pc] if jump else None))
+        
+        loops = []
+        for start, end in self._loops():
+            cycles = sum(hits[start:end + 1])
+            if cycles:
+                loops.append(LoopStat(names.get(start, owner[start]), start, end, taken[end], cycles))
+        
+        return ProfileReport(
+            total=sum(hits),
+            instructions=instructions,
+            labels=sorted((stat for stat in label_stats if stat.cycles), key=lambda stat: -stat.cycles),
+            loops=sorted(loops, key=lambda loop: -loop.cycles),
+        )
@@ -0,0 +1,236 @@
+"""执行轨迹记录 - 每条指令一条定长记录，写入预分配的array缓冲区
+
+记录内容为 (PC, A, D, 写入地址, 写入值)：PC为执行前的指令地址，A/D为执行后的值，
+没有写RAM时写入地址为-1、写入值为0。
+
+两种模式：
+    环形缓冲：只保留最近capacity条记录，内存固定
+    溢写磁盘：缓冲区写满时整块编码追加到文件，长度不限
+
+文件格式（.htrace）：
+    文件头：魔数 b"HTRACE" + 版本(u8) + 保留(u8)
+    若干数据块：记录数(u32) + 5列，每列为 字节数(u32) + 数据
+    每列为块内相邻记录之差（块首与0相比）的zigzag变长整数编码，
+    各块相互独立。单步执行时各字段变化很小，通常每个字段只占1字节。
+"""
+
+from __future__ import annotations
+from array import array
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Sequence, Union
+import struct
+
+
+TRACE_MAGIC = b"HTRACE"
+TRACE_VERSION = 1
+TRACE_HEADER = struct.Struct("<6sBx")
+CHUNK_HEADER = struct.Struct("<I")
+
+# 列名和对应的array类型码
+TRACE_FIELDS = ("pc", "A", "D", "addr", "value")
+_TYPECODES = ("i", "h", "h", "i", "h")
+
+
+class TraceRecord(NamedTuple):
+    """一条轨迹记录"""
+    pc: int  # 执行的指令地址
+    A: int  # 执行后的A
+    D: int  # 执行后的D
+    addr: int  # 写入的RAM地址，未写入为-1
+    value: int  # 写入的值
+
+
+def _encode_column(values: Sequence[int]) -> bytes:
+    """差分 + zigzag + 变长整数编码"""
+    previous = 0
+    zigzag = []
+    for value in values:
+        delta = value - previous
+        previous = value
+        zigzag.append((delta << 1) ^ (delta >> 63))
+    if not zigzag or max(zigzag) < 0x80:
+        return bytes(zigzag)  # 常见情况：全部为单字节
+    out = bytearray()
+    for z in zigzag:
+        while z >= 0x80:
+            out.append((z & 0x7F) | 0x80)
+            z >>= 7
+        out.append(z)
+    return bytes(out)
+
+
+def _decode_column(data: bytes, count: int, typecode: str) -> array:
+    """_encode_column的逆运算"""
+    if len(data) == count:
+        zigzag: Sequence[int] = data  # 全部为单字节
+    else:
+        zigzag = []
+        z = shift = 0
+        for byte in data:
+            z |= (byte & 0x7F) << shift
+            if byte & 0x80:
+                shift += 7
+            else:
+                zigzag.append(z)
+                z = shift = 0
+    if len(zigzag) != count:
+        raise ValueError(f"轨迹数据块损坏：期望{count}条记录，实际{len(zigzag)}条")
+    values = array(typecode, bytes(array(typecode).itemsize * count))
+    previous = 0
+    for index, z in enumerate(zigzag):
+        previous += (z >> 1) ^ -(z & 1)
+        values[index] = previous
+    return values
+
+
+def write_chunk(f: BinaryIO, columns: Sequence[Sequence[int]]):
+    """将一组列（长度相同）编码为一个数据块写入f"""
+    f.write(CHUNK_HEADER.pack(len(columns[0])))
+    for column in columns:
+        data = _encode_column(column)
+        f.write(CHUNK_HEADER.pack(len(data)))
+        f.write(data)
+
+
+class TraceRecorder:
+    """执行轨迹记录器，赋值给 cpu.tracer 后生效"""
+    
+    def __init__(self, capacity: int = 65536, spill_path: Union[str, Path, None] = None):
+        """
+        Args:
+            capacity: 缓冲区记录数（环形模式下即保留的记录数）
+            spill_path: 溢写文件路径；为None时使用环形缓冲模式
+        """
+        if capacity < 1:
+            raise ValueError(f"轨迹缓冲区大小必须为正数: {capacity}")
+        self.capacity = capacity
+        self.spill_path = Path(spill_path) if spill_path is not None else None
+        # 预分配的列缓冲区，CPU直接写入
+        self.pc = array("i", bytes(4 * capacity))
+        self.A = array("h", bytes(2 * capacity))
+        self.D = array("h", bytes(2 * capacity))
+        self.addr = array("i", bytes(4 * capacity))
+        self.value = array("h", bytes(2 * capacity))
+        self.pos = 0  # 下一条记录的写入位置
+        self.wrapped = False  # 环形模式下是否已覆盖过旧记录
+        self.total = 0  # 已记录的总条数（不含当前缓冲区）
+        self._file: Optional[BinaryIO] = None
+        if self.spill_path is not None:
+            self._file = open(self.spill_path, "wb")
+            self._file.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION))
+    
+    @property
+    def spilling(self) -> bool:
+        return self.spill_path is not None
+    
+    def __len__(self) -> int:
+        """已记录的总条数（环形模式下包括已被覆盖的记录）"""
+        return self.total + self.pos
+    
+    def record(self, pc: int, A: int, D: int, addr: int, value: int):
+        """追加一条记录"""
+        pos = self.pos
+        self.pc[pos] = pc
+        self.A[pos] = A
+        self.D[pos] = D
+        self.addr[pos] = addr
+        self.value[pos] = value
+        pos += 1
+        if pos == self.capacity:
+            self.buffer_full()
+            pos = 0
+        self.pos = pos
+    
+    def buffer_full(self):
+        """缓冲区写满：溢写模式下编码写入文件，环形模式下从头覆盖（调用后写入位置为0）"""
+        self.total += self.capacity
+        self.pos = 0
+        if self._file is not None:
+            write_chunk(self._file, (self.pc, self.A, self.D, self.addr, self.value))
+        else:
+            self.wrapped = True
+    
+    def _columns(self) -> List[Sequence[int]]:
+        """缓冲区中的记录（按时间顺序）"""
+        columns = (self.pc, self.A, self.D, self.addr, self.value)
+        pos = self.pos
+        if self._file is None and self.wrapped:
+            return [column[pos:] + column[:pos] for column in columns]
+        return [column[:pos] for column in columns]
+    
+    def records(self) -> List[TraceRecord]:
+        """缓冲区中的记录（环形模式下为最近的记录；溢写模式下为尚未写入文件的部分）"""
+        return [TraceRecord(*fields) for fields in zip(*self._columns())]
+    
+    def save(self, path: Union[str, Path]):
+        """将缓冲区中的记录保存为轨迹文件（环形模式）"""
+        with open(path, "wb") as f:
+            f.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION))
+            columns = self._columns()
+            if columns[0]:
+                write_chunk(f, columns)
+    
+    def close(self):
+        """溢写模式下写入剩余记录并关闭文件"""
+        if self._file is not None:
+            if self.pos:
+                write_chunk(self._file, self._columns())
+                self.total += self.pos
+                self.pos = 0
+            self._file.close()
+            self._file = None
+    
+    def __enter__(self) -> "TraceRecorder":
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TraceReader:
+    """轨迹文件读取器"""
+    
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            header = f.read(TRACE_HEADER.size)
+        if len(header) < TRACE_HEADER.size or header[:len(TRACE_MAGIC)] != TRACE_MAGIC:
+            raise ValueError(f"不是轨迹文件: {self.path}")
+        _, version = TRACE_HEADER.unpack(header)
+        if version != TRACE_VERSION:
+            raise ValueError(f"不支持的轨迹格式版本: {version}")
+    
+    def chunks(self) -> Iterator[Dict[str, array]]:
+        """逐块读取，每块为 列名 -> array"""
+        with open(self.path, "rb") as f:
+            f.seek(TRACE_HEADER.size)
+            while True:
+                header = f.read(CHUNK_HEADER.size)
+                if not header:
+                    return
+                (count,) = CHUNK_HEADER.unpack(header)
+                chunk = {}
+                for name, typecode in zip(TRACE_FIELDS, _TYPECODES):
+                    (length,) = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+                    chunk[name] = _decode_column(f.read(length), count, typecode)
+                yield chunk
+    
+    def __iter__(self) -> Iterator[TraceRecord]:
+        for chunk in self.chunks():
+            for fields in zip(*(chunk[name] for name in TRACE_FIELDS)):
+                yield TraceRecord(*fields)
+    
+    def __len__(self) -> int:
+        """记录总数（只读取块头）"""
+        total = 0
+        with open(self.path, "rb") as f:
+            f.seek(TRACE_HEADER.size)
+            while True:
+                header = f.read(CHUNK_HEADER.size)
+                if not header:
+                    return total
+                (count,) = CHUNK_HEADER.unpack(header)
+                total += count
+                for _ in TRACE_FIELDS:
+                    (length,) = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+                    f.seek(length, 1)
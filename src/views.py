@@ -0,0 +1,309 @@
+"""调试视图 - 统一的视图接口和轻量级后端（终端、JSON Lines、HTML）
+
+所有视图遵循与ExcelView相同的约定：
+    initialize(source_lines, ram_size) -> 若干次 update(cpu, debugger) -> close()
+"""
+
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from html import escape as html_escape
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, List, Optional, TextIO, Tuple, Union
+import json
+import os
+import sys
+import tempfile
+from .cpu import MOD_A, MOD_D, MOD_M, MOD_PC, modified_names
+
+
+# 可选的视图类型（--view）
+VIEW_EXCEL = "excel"
+VIEW_TERMINAL = "terminal"
+VIEW_JSONL = "jsonl"
+VIEW_HTML = "html"
+VIEW_KINDS = (VIEW_EXCEL, VIEW_TERMINAL, VIEW_JSONL, VIEW_HTML)
+
+
+@dataclass(frozen=True)
+class ViewState:
+    """一次update时CPU和调试器状态的快照（渲染只依赖快照，不再访问CPU）"""
+    A: int
+    D: int
+    PC: int
+    modified: int  # MOD_*标志
+    modified_addr: int
+    breakpoints: FrozenSet[int]
+    ram: Tuple[int, ...]  # 显示范围内的RAM值
+    
+    @classmethod
+    def capture(cls, cpu, debugger, ram_rows: int) -> "ViewState":
+        """从CPU和调试器生成快照，ram_rows为显示的RAM字数"""
+        ram_rows = min(ram_rows, len(cpu.ram))
+        return cls(
+            A=cpu.A,
+            D=cpu.D,
+            PC=cpu.PC,
+            modified=cpu.modified,
+            modified_addr=cpu.modified_addr,
+            breakpoints=frozenset(debugger.breakpoints),
+            ram=tuple(int(value) for value in cpu.ram_view(0, ram_rows)),
+        )
+
+
+def atomic_write(path: Union[str, Path], write: Callable[[str], None]):
+    """调用write写入同目录下的临时文件再原子替换，读者不会看到写了一半的文件"""
+    path = Path(path)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.stem}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_name)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+class BaseView(ABC):
+    """调试视图基类（子类必须实现render）"""
+    
+    def __init__(self):
+        self.source_lines: List[str] = []
+        self.ram_size = 0
+    
+    def initialize(self, source_lines: List[str], ram_size: int = 64):
+        """
+        准备视图
+        
+        Args:
+            source_lines: 源代码行列表（与ROM地址一一对应）
+            ram_size: 要显示的RAM字数
+        """
+        self.source_lines = source_lines
+        self.ram_size = ram_size
+    
+    def update(self, cpu, debugger, ram_view_size: int = 64):
+        """显示当前CPU状态"""
+        self.render(ViewState.capture(cpu, debugger, self.ram_size))
+    
+    @abstractmethod
+    def render(self, state: ViewState):
+        """根据快照输出视图"""
+    
+    def flush(self):
+        """等待未完成的输出（默认无操作）"""
+    
+    def close(self):
+        """释放资源（默认无操作）"""
+
+
+class TerminalView(BaseView):
+    """终端视图：每次更新输出当前指令附近的源码、寄存器和RAM（支持ANSI颜色）"""
+    
+    RESET = "\033[0m"
+    CURRENT = "\033[30;43m"  # 黄底
+    BREAKPOINT = "\033[31m"  # 红字
+    MODIFIED = "\033[1;32m"  # 绿色粗体
+    
+    def __init__(self, stream: Optional[TextIO] = None, context: int = 3, color: Optional[bool] = None):
+        """
+        Args:
+            stream: 输出流，默认为标准输出
+            context: 当前指令上下各显示的行数
+            color: 是否使用ANSI颜色，默认在终端中启用
+        """
+        super().__init__()
+        self.stream = stream or sys.stdout
+        self.context = context
+        if color is None:
+            color = hasattr(self.stream, "isatty") and self.stream.isatty()
+        self.color = color
+    
+    def _paint(self, text: str, style: str) -> str:
+        return f"{style}{text}{self.RESET}" if self.color and style else text
+    
+    def render(self, state: ViewState):
+        lines = []
+        changed = modified_names(state.modified, state.modified_addr)
+        registers = []
+        for name, value, flag in (("A", state.A, MOD_A), ("D", state.D, MOD_D), ("PC", state.PC, MOD_PC)):
+            text = f"{name}={value}"
+            registers.append(self._paint(text, self.MODIFIED) if state.modified & flag else text)
+        lines.append("── " + "  ".join(registers) + (f"  (修改: {', '.join(sorted(changed))})" if changed else ""))
+        
+        start = max(0, state.PC - self.context)
+        stop = min(len(self.source_lines), state.PC + self.context + 1)
+        for address in range(start, stop):
+            marker = ">" if address == state.PC else " "
+            mark_bp = "*" if address in state.breakpoints else " "
+            text = f"{mark_bp}{marker}{address:6d}  {self.source_lines[address]}"
+            if address == state.PC:
+                text = self._paint(text, self.CURRENT)
+            elif address in state.breakpoints:
+                text = self._paint(text, self.BREAKPOINT)
+            lines.append(text)
+        if not 0 <= state.PC < len(self.source_lines):
+            lines.append(f"  >{state.PC:6d}  (超出程序范围)")
+        
+        for row_start in range(0, len(state.ram), 8):
+            cells = []
+            for address in range(row_start, min(row_start + 8, len(state.ram))):
+                text = f"{state.ram[address]:7d}"
+                if state.modified & MOD_M and address == state.modified_addr:
+                    text = self._paint(text, self.MODIFIED)
+                cells.append(text)
+            lines.append(f"  RAM[{row_start:5d}] " + "".join(cells))
+        
+        self.stream.write("\n".join(lines) + "\n")
+        self.stream.flush()
+
+
+class JsonLinesView(BaseView):
+    """
+    JSON Lines视图：每次更新输出一行JSON状态，便于远程会话或其他工具消费
+    
+    第一行为 {"event": "init", ...}，之后每行为 {"event": "state", ...}，
+    其中ram只包含与上一行相比变化的地址（第一次为全部显示范围）。
+    """
+    
+    def __init__(self, path: Union[str, Path, None] = None):
+        """
+        Args:
+            path: 输出文件路径，None或"-"表示标准输出
+        """
+        super().__init__()
+        self.path = path
+        self._stream: Optional[TextIO] = None
+        self._ram: Optional[Tuple[int, ...]] = None
+        self._step = 0
+    
+    def _write(self, record: Dict):
+        self._stream.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._stream.flush()
+    
+    def initialize(self, source_lines: List[str], ram_size: int = 64):
+        super().initialize(source_lines, ram_size)
+        self.close()
+        if self.path is None or str(self.path) == "-":
+            self._stream = sys.stdout
+        else:
+            self._stream = open(self.path, "w", encoding="utf-8")
+        self._ram = None
+        self._step = 0
+        self._write({"event": "init", "source": source_lines, "ram_size": ram_size})
+    
+    def render(self, state: ViewState):
+        if self._stream is None:
+            return
+        if self._ram is None or len(self._ram) != len(state.ram):
+            ram = {str(address): value for address, value in enumerate(state.ram)}
+        else:
+            ram = {
+                str(address): value
+                for address, (value, old) in enumerate(zip(state.ram, self._ram))
+                if value != old
+            }
+        self._ram = state.ram
+        self._write({
+            "event": "state",
+            "update": self._step,
+            "A": state.A,
+            "D": state.D,
+            "PC": state.PC,
+            "modified": sorted(modified_names(state.modified, state.modified_addr)),
+            "breakpoints": sorted(state.breakpoints),
+            "ram": ram,
+        })
+        self._step += 1
+    
+    def close(self):
+        if self._stream is not None and self._stream is not sys.stdout:
+            self._stream.close()
+        self._stream = None
+
+
+class HtmlView(BaseView):
+    """HTML视图：每次更新原子地重写一个静态HTML快照，可用浏览器打开或通过HTTP共享"""
+    
+    def __init__(self, path: Union[str, Path], config: Optional[dict] = None):
+        """
+        Args:
+            path: 输出的.html文件路径
+            config: 颜色配置（键与config.json的excel部分相同），默认读取全局配置
+        """
+        super().__init__()
+        self.path = Path(path)
+        if config is None:
+            from .config import get_config
+            excel_cfg = get_config().excel
+            config = {
+                "color_current_instruction": excel_cfg.color_current_instruction,
+                "color_breakpoint": excel_cfg.color_breakpoint,
+                "color_modified_value": excel_cfg.color_modified_value,
+            }
+        self.color_current = config.get("color_current_instruction", "FFFF00")
+        self.color_breakpoint = config.get("color_breakpoint", "FF6B6B")
+        self.color_modified = config.get("color_modified_value", "90EE90")
+        self._rows: List[str] = []
+    
+    def initialize(self, source_lines: List[str], ram_size: int = 64):
+        super().initialize(source_lines, ram_size)
+        # 源码只转义一次
+        self._rows = [html_escape(line) for line in source_lines]
+    
+    def render(self, state: ViewState):
+        parts = [
+            "<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>HACK Debugger</title><style>",
+            "body{font-family:monospace}table{border-collapse:collapse;float:left;margin-right:2em}",
+            "td,th{padding:0 .6em;text-align:right}td.asm{text-align:left}",
+            f".cur{{background:#{self.color_current}}}.bp{{background:#{self.color_breakpoint}}}",
+            f".mod{{background:#{self.color_modified}}}",
+            "</style></head><body>",
+        ]
+        registers = []
+        for name, value, flag in (("A", state.A, MOD_A), ("D", state.D, MOD_D), ("PC", state.PC, MOD_PC)):
+            css = ' class="mod"' if state.modified & flag else ""
+            registers.append(f"<td{css}>{name}={value}</td>")
+        parts.append(f"<table><tr>{''.join(registers)}</tr></table><br style=\"clear:both\">")
+        
+        parts.append("<table><tr><th>ROM_ADDR</th><th>ASM</th></tr>")
+        for address, line in enumerate(self._rows):
+            if address in state.breakpoints:
+                css = ' class="bp"'
+            elif address == state.PC:
+                css = ' class="cur"'
+            else:
+                css = ""
+            anchor = ' id="pc"' if address == state.PC else ""
+            parts.append(f"<tr{css}{anchor}><td>{address}</td><td class=\"asm\">{line}</td></tr>")
+        parts.append("</table>")
+        
+        parts.append("<table><tr><th>RAM_ADDR</th><th>VALUE</th></tr>")
+        for address, value in enumerate(state.ram):
+            css = ' class="mod"' if state.modified & MOD_M and address == state.modified_addr else ""
+            parts.append(f"<tr><td>{address}</td><td{css}>{value}</td></tr>")
+        parts.append("</table></body></html>\n")
+        
+        content = "".join(parts)
+        atomic_write(self.path, lambda tmp_name: Path(tmp_name).write_text(content, encoding="utf-8"))
+
+
+def create_view(kind: str, path: Union[str, Path, None] = None, **kwargs) -> BaseView:
+    """
+    按类型创建视图
+    
+    Args:
+        kind: VIEW_KINDS之一
+        path: 输出文件（excel/html必需，jsonl可省略表示标准输出，terminal忽略）
+        **kwargs: 传给视图构造函数的其他参数
+    """
+    if kind == VIEW_EXCEL:
+        from .excel_view import ExcelView  # openpyxl只在需要时导入
+        return ExcelView(path, **kwargs)
+    if kind == VIEW_TERMINAL:
+        return TerminalView(**kwargs)
+    if kind == VIEW_JSONL:
+        return JsonLinesView(path, **kwargs)
+    if kind == VIEW_HTML:
+        return HtmlView(path, **kwargs)
+    raise ValueError(f"未知的视图类型: {kind}（可选: {', '.join(VIEW_KINDS)}）")
@@ -0,0 +1,231 @@
+"""数据观察点和断点条件
+
+观察点监视RAM地址或地址范围的读、写或值变化。WatchSet为RAM的每个字维护一个
+字节的掩码，执行循环中只需一次下标访问就能判断是否命中，命中后才在Python中
+逐个匹配观察点和条件。
+
+条件是受限的Python表达式，例如 "D<0"、"M==5 and A>=16"、"RAM[SP] != 0"。
+可以使用A、D、M（即RAM[A]）、RAM[地址]、整数、符号（标签、变量、R0/SP等），
+以及算术、位运算、比较和and/or/not。表达式在设置时用ast编译为函数，
+执行循环中直接调用，不会重复解析。
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Sequence
+import ast
+import re
+from .assembler import PREDEFINED
+
+
+WATCH_READ = 0b001  # 指令读取M
+WATCH_WRITE = 0b010  # 指令写入M
+WATCH_CHANGE = 0b100  # 写入且值发生变化
+WATCH_KINDS: Dict[str, int] = {
+    "read": WATCH_READ,
+    "write": WATCH_WRITE,
+    "change": WATCH_CHANGE,
+    "access": WATCH_READ | WATCH_WRITE,
+}
+
+Condition = Callable[[int, int, Sequence[int]], bool]  # (A, D, ram) -> 是否满足
+
+_SPECIAL_SYMBOL = re.compile(r"[A-Za-z_.$:][\w.$:]*[.$:][\w.$:]*")
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd, ast.Invert,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.FloorDiv, ast.Mod, ast.BitAnd, ast.BitOr, ast.BitXor,
+    ast.LShift, ast.RShift, ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+    ast.Name, ast.Load, ast.Constant, ast.Subscript,
+)
+
+
+class _ConditionCompiler(ast.NodeTransformer):
+    """把条件表达式改写为 lambda A, D, ram: ... 的函数体"""
+    
+    def __init__(self, symbols: Mapping[str, int]):
+        self.symbols = symbols
+    
+    def generic_visit(self, node: ast.AST) -> ast.AST:
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError(f"条件中不支持: {type(node).__name__}")
+        return super().generic_visit(node)
+    
+    def visit_Constant(self, node: ast.Constant) -> ast.AST:
+        if not isinstance(node.value, int):
+            raise ValueError(f"条件中只能使用整数: {node.value!r}")
+        return node
+    
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        if node.id in ("A", "D"):
+            return node
+        if node.id == "M":
+            return self._ram(ast.Name("A", ast.Load()))
+        if node.id in self.symbols:
+            return ast.Constant(self.symbols[node.id])
+        raise ValueError(f"条件中的未知符号: {node.id}")
+    
+    def visit_Subscript(self, node: ast.Subscript) -> ast.AST:
+        if not (isinstance(node.value, ast.Name) and node.value.id in ("RAM", "M")):
+            raise ValueError("条件中只能对RAM或M取下标")
+        return self._ram(self.visit(node.slice))
+    
+    @staticmethod
+    def _ram(address: ast.expr) -> ast.expr:
+        # 与CPU一致，地址按RAM大小取模
+        size = ast.Call(ast.Name("len", ast.Load()), [ast.Name("ram", ast.Load())], [])
+        index = ast.BinOp(address, ast.Mod(), size)
+        return ast.Subscript(ast.Name("ram", ast.Load()), index, ast.Load())
+
+
+def compile_condition(expr: str, symbols: Optional[Mapping[str, int]] = None) -> Condition:
+    """
+    编译条件表达式
+
+    Args:
+        expr: 条件表达式
+        symbols: 符号表（汇编结果的symbols），预定义符号总是可用
+
+    Returns:
+        函数 (A, D, ram) -> bool
+
+    Raises:
+        ValueError: 语法错误或使用了不支持的语法/未知符号
+    """
+    table = dict(PREDEFINED)
+    table.update(symbols or {})
+    # 含 . $ : 的HACK符号不是合法的Python标识符，先替换为数值
+    source = _SPECIAL_SYMBOL.sub(lambda m: str(table.get(m.group(0), m.group(0))), expr.strip())
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"条件语法错误: {expr}") from e
+    body = _ConditionCompiler(table).visit(tree).body
+    args = ast.arguments(
+        posonlyargs=[], args=[ast.arg("A"), ast.arg("D"), ast.arg("ram")],
+        kwonlyargs=[], kw_defaults=[], defaults=[],
+    )
+    function = ast.Expression(ast.Lambda(args, body))
+    ast.fix_missing_locations(function)
+    return eval(compile(function, f"<condition {expr}>", "eval"), {"__builtins__": {}, "len": len})
+
+
+@dataclass
+class Watchpoint:
+    """RAM观察点，监视 [start, end] 范围"""
+    number: int
+    start: int
+    end: int
+    kind: int  # WATCH_* 的组合
+    condition: Optional[Condition] = None
+    expr: Optional[str] = None  # 条件原文
+    
+    def describe(self) -> str:
+        where = f"RAM[{self.start}]" if self.start == self.end else f"RAM[{self.start}-{self.end}]"
+        kinds = "/".join(name for name, flag in WATCH_KINDS.items() if flag & self.kind and name != "access")
+        text = f"#{self.number} {where} {kinds}"
+        return f"{text} if {self.expr}" if self.expr else text
+
+
+@dataclass
+class WatchHit:
+    """触发的观察点"""
+    watch: Watchpoint
+    pc: int  # 触发的指令地址
+    addr: int  # 访问的RAM地址
+    kind: int  # WATCH_READ / WATCH_WRITE / WATCH_CHANGE
+    old: int  # 访问前的值
+    new: int  # 访问后的值
+    
+    def describe(self) -> str:
+        if self.kind == WATCH_READ:
+            return f"观察点{self.watch.describe()}：PC={self.pc} 读取 RAM[{self.addr}]={self.new}"
+        return f"观察点{self.watch.describe()}：PC={self.pc} 写入 RAM[{self.addr}] {self.old} -> {self.new}"
+
+
+class WatchSet:
+    """一组观察点及其地址掩码"""
+    
+    def __init__(self, ram_size: int):
+        self.ram_size = ram_size
+        self.mask = bytearray(ram_size)  # 每个地址上所有观察点类型的并集
+        self._watches: List[Watchpoint] = []
+        self._next_number = 1
+    
+    def add(
+        self,
+        start: int,
+        end: Optional[int] = None,
+        kind: int = WATCH_WRITE,
+        condition: Optional[str] = None,
+        symbols: Optional[Mapping[str, int]] = None,
+    ) -> Watchpoint:
+        """
+        添加观察点
+        
+        Args:
+            start, end: 地址范围（含两端），end默认等于start
+            kind: WATCH_*的组合
+            condition: 条件表达式，触发时满足才停止
+            symbols: 条件使用的符号表
+        """
+        end = start if end is None else end
+        if not 0 <= start <= end < self.ram_size:
+            raise ValueError(f"无效的观察范围: {start}-{end}")
+        if not kind or kind & ~(WATCH_READ | WATCH_WRITE | WATCH_CHANGE):
+            raise ValueError(f"无效的观察类型: {kind}")
+        compiled = compile_condition(condition, symbols) if condition else None
+        watch = Watchpoint(self._next_number, start, end, kind, compiled, condition)
+        self._next_number += 1
+        self._watches.append(watch)
+        self._mark(watch)
+        return watch
+    
+    def _mark(self, watch: Watchpoint):
+        mask = self.mask
+        for addr in range(watch.start, watch.end + 1):
+            mask[addr] |= watch.kind
+    
+    def remove(self, number: int) -> bool:
+        """按编号删除观察点"""
+        remaining = [watch for watch in self._watches if watch.number != number]
+        if len(remaining) == len(self._watches):
+            return False
+        self._watches = remaining
+        self.mask = bytearray(self.ram_size)
+        for watch in remaining:
+            self._mark(watch)
+        return True
+    
+    def clear(self):
+        self._watches.clear()
+        self.mask = bytearray(self.ram_size)
+    
+    def __iter__(self) -> Iterator[Watchpoint]:
+        return iter(self._watches)
+    
+    def __len__(self) -> int:
+        return len(self._watches)
+    
+    def match(self, pc: int, addr: int, kind: int, old: int, new: int, A: int, D: int, ram: Sequence[int]) -> Optional[WatchHit]:
+        """
+        在掩码命中后查找触发的观察点
+        
+        Args:
+            kind: WATCH_READ或WATCH_WRITE（写入时同时检查WATCH_CHANGE）
+            A, D, ram: 指令执行后的状态，用于计算条件
+        """
+        for watch in self._watches:
+            if not watch.start <= addr <= watch.end:
+                continue
+            if kind == WATCH_WRITE and not watch.kind & WATCH_WRITE:
+                if not (watch.kind & WATCH_CHANGE and old != new):
+                    continue
+                fired = WATCH_CHANGE
+            elif watch.kind & kind:
+                fired = kind
+            else:
+                continue
+            if watch.condition is None or watch.condition(A, D, ram):
+                return WatchHit(watch, pc, addr, fired, old, new)
+        return None
@@ -12,7 +12,11 @@ from test_utils import (
     create_test_debugger,
     run_until_ram_equals
 )
-from src import HackCPU, Debugger, ExcelView, get_config
+from src import HackCPU, Debugger, get_config, MatrixCase, load_cases, run_matrix, assemble_text
+from src.cpu import (
+    decode_instruction, KIND_A, KIND_C, DEST_D, ALU_TABLE, alu,
+    TRACK_OFF, TRACK_BITMASK, TRACK_FULL, MOD_A, MOD_M, RAM_ARRAY, RAM_NUMPY
+)
 
 
 class TestSuite:
@@ -120,6 +124,8 @@ class TestSuite:
     
     def test_excel_view(self):
         """测试Excel视图生成"""
+        from src import ExcelView
+        
         debugger, cpu, source_lines = create_test_debugger("register")
         debugger.add_breakpoint(3)
         
@@ -147,6 +153,7 @@ class TestSuite:
     def test_register_tracking(self):
         """测试寄存器修改跟踪"""
         cpu, source_lines = create_test_cpu("register")
+        cpu.set_tracking(TRACK_FULL)
         
         # Step 1: @5
         cpu.step()
@@ -171,6 +178,897 @@ class TestSuite:
         print("  Register tracking works correctly")
         print(f"  A=5, D=5, RAM[0]=5")
     
+    def test_rom_predecode(self):
+        """测试ROM预解码"""
+        # D=M -> 111 1 110000 010 000
+        assert decode_instruction("1111110000010000") == (KIND_C, 0, 0b110000, 1, DEST_D, 0), \
+            "D=M should decode to comp=110000, a=1, dest=D"
+        assert decode_instruction("0000000000010110") == (KIND_A, 22, 0, 0, 0, 0), \
+            "@22 should decode to A value 22"
+        
+        # 替换ROM后应重新解码
+        cpu, _ = create_test_cpu("add")
+        machine_code, _ = load_test_program("register")
+        cpu.rom = machine_code
+        cpu.step()
+        assert cpu.A == 5, f"After ROM replacement first step should be @5, got A={cpu.A}"
+        
+        print("  Decoded instruction form: OK")
+        print("  ROM replacement re-decodes: OK")
+    
+    def test_jit_engine(self):
+        """测试JIT引擎与解释器结果一致"""
+        for x, y, expected in [(4, 10, 28), (1, 4, 10), (-3, 5, 5)]:
+            interp, _ = create_test_cpu("TEST")
+            jit, _ = create_test_cpu("TEST", engine="jit")
+            for cpu in (interp, jit):
+                cpu.set_ram(0, x)
+                cpu.set_ram(1, y)
+            
+            interp_steps = 0
+            while interp_steps < 5000 and interp.step():
+                interp_steps += 1
+            reason, steps = jit.run(max_steps=5000)
+            
+            assert (reason, steps) == (interp.halt_reason, interp_steps), \
+                f"JIT stopped with {reason}/{steps}, interpreter with {interp.halt_reason}/{interp_steps}"
+            assert (jit.A, jit.D, jit.PC) == (interp.A, interp.D, interp.PC), \
+                f"Registers differ: JIT {(jit.A, jit.D, jit.PC)} vs interp {(interp.A, interp.D, interp.PC)}"
+            assert jit.ram == interp.ram, "RAM differs between JIT and interpreter"
+            assert jit.get_ram(2) == expected, f"X={x}, Y={y}: expected R2={expected}, got {jit.get_ram(2)}"
+        
+        
+        # 增删断点只丢弃包含该地址的块，执行结果仍与解释器一致
+        interp, _ = create_test_cpu("TEST")
+        jit, _ = create_test_cpu("TEST", engine="jit")
+        for cpu in (interp, jit):
+            cpu.set_ram(0, 1)
+            cpu.set_ram(1, 30000)
+        jit.run(max_steps=2000)
+        interp.run(max_steps=2000)
+        before = dict(jit._blocks)
+        start, (_, length) = next((start, entry) for start, entry in sorted(before.items()) if entry[1] >= 3)
+        stop = start + 1
+        for stops in ({stop}, set()):
+            for cpu in (interp, jit):
+                cpu.run(max_steps=3000, stop_at=stops)
+                cpu.step()
+            assert (jit.A, jit.D, jit.PC) == (interp.A, interp.D, interp.PC) and jit.ram == interp.ram, stops
+            if stops:
+                kept = {key: entry for key, entry in before.items() if not key < stop <= key + entry[1]}
+                assert start not in jit._blocks or jit._blocks[start] is not before[start]
+                assert all(jit._blocks.get(key) is entry for key, entry in kept.items()), "Unrelated blocks should survive"
+        
+        print(f"  JIT matches interpreter on TEST.asm; breakpoint at {stop} kept {len(kept)}/{len(before)} blocks")
+    
+    def test_alu(self):
+        """测试ALU函数表与按位ALU一致，并支持非标准comp编码"""
+        samples = [-32768, -32767, -1, 0, 1, 2, 255, 32767]
+        for comp in range(64):
+            for x in samples:
+                for y in samples:
+                    assert ALU_TABLE[comp](x, y) == alu(x, y, comp), \
+                        f"comp={comp:06b}, x={x}, y={y}: table and bitwise ALU disagree"
+        
+        # 非标准comp 000001 = !(D&A)，旧实现会返回0
+        cpu = HackCPU(["0000000000001100", "1110000001010000"])  # @12; D=!(D&A)
+        cpu.step()
+        cpu.step()
+        assert cpu.D == -1, f"!(0&12) should be -1, got {cpu.D}"
+        
+        print("  ALU table matches bit-level ALU for all 64 comp codes")
+    
+    def test_bulk_run(self):
+        """测试HackCPU.run批量执行接口"""
+        for engine in ("interp", "jit"):
+            # 步数上限
+            cpu, _ = create_test_cpu("counter", engine)
+            reason, steps = cpu.run(max_steps=20)
+            assert (reason, steps) == ("max_steps", 20), f"[{engine}] expected max_steps/20, got {reason}/{steps}"
+            
+            # 停止地址：LOOP标签位于地址4
+            cpu, _ = create_test_cpu("counter", engine)
+            reason, steps = cpu.run(max_steps=1000, stop_at={4})
+            assert (reason, steps, cpu.PC) == ("breakpoint", 4, 4), \
+                f"[{engine}] expected breakpoint at PC=4 after 4 steps, got {reason}/{steps}/PC={cpu.PC}"
+            
+            # 停止条件
+            cpu, _ = create_test_cpu("counter", engine)
+            assert run_until_ram_equals(cpu, 16, 5), f"[{engine}] i should reach 5"
+            reason, steps = cpu.run(max_steps=1000, halt=lambda c: c.get_ram(16) == 0)
+            assert reason == "condition" and cpu.get_ram(16) == 0, f"[{engine}] expected condition stop, got {reason}"
+        
+        print("  max_steps / stop_at / halt predicate: OK")
+    
+    def test_tracking_modes(self):
+        """测试修改跟踪模式"""
+        # 默认不跟踪
+        cpu, _ = create_test_cpu("register")
+        cpu.step()
+        assert cpu.tracking == TRACK_OFF, "Tracking should be off by default"
+        assert cpu.modified == 0 and not cpu.last_modified, "Nothing should be tracked when off"
+        
+        # 位标志模式：@5; D=A; @R0; M=D
+        cpu, _ = create_test_cpu("register")
+        cpu.set_tracking(TRACK_BITMASK)
+        cpu.step()
+        assert cpu.modified == MOD_A, f"@5 should flag A, got {cpu.modified:04b}"
+        cpu.step()
+        cpu.step()
+        cpu.step()
+        assert cpu.modified == MOD_M and cpu.modified_addr == 0, \
+            f"M=D should flag M[0], got {cpu.modified:04b} @ {cpu.modified_addr}"
+        assert cpu.last_modified == {"M[0]"}, f"Compat view should be {{'M[0]'}}, got {cpu.last_modified}"
+        
+        # 调试器自动开启位标志跟踪
+        debugger, cpu, _ = create_test_debugger("register")
+        assert cpu.tracking == TRACK_BITMASK, "Debugger should enable bitmask tracking"
+        
+        print("  off / bitmask / full tracking: OK")
+    
+    def test_ram_backends(self):
+        """测试16位RAM后端与零拷贝视图"""
+        for backend in (RAM_ARRAY, RAM_NUMPY):
+            machine_code, _ = load_test_program("add")
+            cpu = HackCPU(machine_code, ram_backend=backend)
+            cpu.set_ram(0, 30000)
+            cpu.set_ram(1, 10000)
+            cpu.run(max_steps=7)
+            assert cpu.get_ram(2) == -25536, f"[{backend}] 30000+10000 should wrap to -25536, got {cpu.get_ram(2)}"
+            
+            # 视图不复制数据
+            view = cpu.ram_view(0, 3)
+            screen = cpu.screen_view()
+            cpu.set_ram(16384, 7)
+            assert list(view) == [30000, 10000, -25536], f"[{backend}] unexpected view {list(view)}"
+            assert screen[0] == 7 and len(screen) == 8192, f"[{backend}] screen view should alias RAM"
+            
+            # 调试器的get_ram_range返回副本，ram_range_view返回视图
+            debugger = Debugger(cpu, [])
+            copy, live = debugger.get_ram_range(0, 3), debugger.ram_range_view(0, 3)
+            cpu.set_ram(0, 1)
+            assert copy == [30000, 10000, -25536] and type(copy[0]) is int, f"[{backend}] copy changed: {copy}"
+            assert live[0] == 1, f"[{backend}] view should alias RAM"
+            
+            # 重置为原地清零
+            cells = cpu.ram
+            cpu.reset()
+            assert cpu.ram is cells and view[0] == 0 and screen[0] == 0, f"[{backend}] reset should zero in place"
+        
+        print("  array / numpy backends and zero-copy views: OK")
+    
+    def test_terminal_loop(self):
+        """测试终止循环识别"""
+        for engine in ("interp", "jit"):
+            cpu, source_lines = create_test_cpu("counter", engine)
+            assert cpu.terminal_loops == {12}, f"[{engine}] (END) should be detected at 12, got {cpu.terminal_loops}"
+            
+            reason, steps = cpu.run(max_steps=100000)
+            assert reason == "terminal_loop", f"[{engine}] expected terminal_loop, got {reason}"
+            assert steps < 100, f"[{engine}] should stop right after the countdown, took {steps} steps"
+            assert cpu.halted and cpu.PC == 12 and not cpu.step(), f"[{engine}] CPU should stay halted at END"
+        
+        # 关闭识别后保持原有的空转行为
+        machine_code, _ = load_test_program("counter")
+        cpu = HackCPU(machine_code, detect_terminal_loops=False)
+        assert cpu.run(max_steps=1000) == ("max_steps", 1000), "Without detection the END loop should spin"
+        
+        print("  (END) @END 0;JMP detected, stop reason 'terminal_loop'")
+    
+    def test_batch_sweep(self):
+        """测试NumPy批量锁步模拟与逐个运行结果一致"""
+        try:
+            from src.batch import sweep
+        except ImportError:
+            print("  numpy not installed, skipped")
+            return
+        
+        machine_code, _ = load_test_program("TEST")
+        xs = [x for x in range(-3, 4) for _ in range(-3, 4)]
+        ys = [y for _ in range(-3, 4) for y in range(-3, 4)]
+        result = sweep(machine_code, {0: xs, 1: ys}, max_steps=5000, ram_size=256)
+        
+        for i, (x, y) in enumerate(zip(xs, ys)):
+            cpu = HackCPU(machine_code, ram_size=256)
+            cpu.set_ram(0, x)
+            cpu.set_ram(1, y)
+            reason, steps = cpu.run(max_steps=5000)
+            assert (result.reasons[i], result.cycles[i]) == (reason, steps), \
+                f"X={x}, Y={y}: batch {result.reasons[i]}/{result.cycles[i]} vs single {reason}/{steps}"
+            assert result.ram[i].tolist() == list(cpu.ram), f"X={x}, Y={y}: RAM differs"
+        
+        print(f"  {len(xs)} lanes match individual runs")
+    
+    def test_run_matrix(self):
+        """测试并行测试矩阵"""
+        machine_code, _ = load_test_program("TEST")
+        cases_path = Path(__file__).parent / "test_programs" / "TEST_cases.json"
+        cases = load_cases(cases_path)
+        cases.append(MatrixCase(name="wrong", ram={0: 4, 1: 10}, expect={2: 0}, max_steps=10000))
+        
+        results = run_matrix(machine_code, cases, workers=2)
+        
+        assert [r.name for r in results] == [c.name for c in cases], "Results should keep case order"
+        assert all(r.passed for r in results[:-1]), f"Sample cases should pass: {results[:-1]}"
+        assert not results[-1].passed and results[-1].actual == {2: 28}, f"Wrong case should fail: {results[-1]}"
+        assert all(r.reason == "terminal_loop" and r.cycles > 0 for r in results), "All cases should reach STOP"
+        
+        # 未结束的程序不能通过，除非允许达到步数上限；期望值按16位有符号数比较
+        import json, tempfile
+        loop_code = assemble_text("(LOOP)\n@R1\nM=M-1\n@LOOP\n0;JMP").machine_code
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "cases.json"
+            path.write_text(json.dumps([
+                {"name": "unfinished", "expect": {"R1": 65535}, "max_steps": 2},
+                {"name": "allowed", "expect": {"R1": 65535}, "max_steps": 2, "allow_max_steps": True},
+            ]))
+            loop_cases = load_cases(path)
+        assert loop_cases[0].expect == {1: -1}, loop_cases[0]
+        unfinished, allowed = run_matrix(loop_code, loop_cases, workers=1)
+        assert unfinished.reason == "max_steps" and unfinished.actual == {1: -1} and not unfinished.passed, unfinished
+        assert allowed.passed, allowed
+        
+        print(f"  {len(results)} cases across 2 workers, report order preserved")
+    
+    def test_streaming_assembler(self):
+        """测试流式汇编（不可seek的输入流）"""
+        import io
+        from src import assemble_file, assemble_stream
+        
+        class Pipe(io.StringIO):
+            def seekable(self):
+                return False
+        
+        for name in ["add", "counter", "TEST"]:
+            path = Path(__file__).parent / "test_programs" / f"{name}.asm"
+            expected, _ = assemble_file(path)
+            out = io.StringIO()
+            count = assemble_stream(Pipe(path.read_text(encoding="utf-8")), out)
+            assert count == len(expected), f"{name}: expected {len(expected)} instructions, got {count}"
+            assert out.getvalue().splitlines() == expected, f"{name}: streaming output differs"
+        
+        print("  Streaming output matches assemble_file for piped input")
+    
+    def test_c_instruction_cache(self):
+        """测试C指令编码缓存"""
+        from src import assemble_file, CInstructionCache
+        from src.assembler import parse_c_instruction
+        
+        cache = CInstructionCache(maxsize=2)
+        assert cache.encode("D=M") == parse_c_instruction("D=M")
+        assert cache.encode("D=M") == parse_c_instruction("D=M")
+        assert cache.encode("D = M") == parse_c_instruction("D=M"), "Whitespace should be normalised"
+        assert cache.encode("D=M ") == parse_c_instruction("D=M")
+        # 空白不同的写法共用一个条目
+        assert (cache.hits, cache.misses) == (3, 1), f"Unexpected counters: {cache.hits}/{cache.misses}"
+        assert len(cache) == 1
+        cache.encode("0;JMP")
+        assert len(cache) == 2, "Cache should stay bounded"
+        try:
+            cache.encode("D=X")
+            assert False, "Invalid instruction should raise"
+        except ValueError:
+            pass
+        
+        # 两个文件共用一个缓存
+        shared = CInstructionCache()
+        programs = Path(__file__).parent / "test_programs"
+        for name in ["add", "counter"]:
+            machine_code, _ = assemble_file(programs / f"{name}.asm", cache=shared)
+            expected, _ = assemble_file(programs / f"{name}.asm", cache=CInstructionCache())
+            assert machine_code == expected, f"{name}: cached encoding differs"
+        assert shared.hits > 0, "Shared cache should be reused across files"
+        
+        print(f"  Shared cache: {shared.hits} hits, {shared.misses} misses")
+    
+    def test_packed_rom(self):
+        """测试打包二进制ROM（.hackb）"""
+        import tempfile
+        from src import save_hack_file, load_hack_file
+        
+        machine_code, _ = load_test_program("TEST")
+        with tempfile.TemporaryDirectory() as tmp:
+            text_path = Path(tmp) / "TEST.hack"
+            packed_path = Path(tmp) / "TEST.hackb"
+            save_hack_file(machine_code, text_path)
+            save_hack_file(machine_code, packed_path)
+            assert packed_path.stat().st_size == 12 + 2 * len(machine_code), "Unexpected packed size"
+            assert load_hack_file(text_path) == machine_code, "Text .hack should round-trip"
+            
+            words = load_hack_file(packed_path)
+            assert list(words) == [int(w, 2) for w in machine_code], "Packed words should round-trip"
+            
+            results = []
+            for rom in (machine_code, words):
+                cpu = HackCPU(rom)
+                cpu.set_ram(0, 7)
+                cpu.set_ram(1, -3)
+                reason, steps = cpu.run(100000)
+                results.append((reason, steps, cpu.get_ram(2)))
+            assert results[0] == results[1], f"Packed ROM should run identically: {results}"
+            del words, rom, cpu  # 释放内存映射
+        
+        print(f"  {len(machine_code)} words, result {results[1]}")
+    
+    def test_assembly_cache(self):
+        """测试磁盘汇编缓存"""
+        import tempfile
+        from src import AssemblyCache, assemble_file
+        
+        programs = Path(__file__).parent / "test_programs"
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = AssemblyCache(Path(tmp) / "cache")
+            first = cache.assemble(programs / "TEST.asm")
+            second = cache.assemble(programs / "TEST.asm")
+            assert (cache.hits, cache.misses) == (1, 1), f"Second load should hit: {cache.hits}/{cache.misses}"
+            assert second == first, "Cached result should match"
+            assert (second.machine_code, second.source_lines) == assemble_file(programs / "TEST.asm")
+            assert "EE.G.LOOP" in second.symbols and "R0" not in second.symbols, "Only user symbols are stored"
+            
+            # 内容变化则重新汇编
+            edited = Path(tmp) / "TEST.asm"
+            edited.write_text((programs / "TEST.asm").read_text(encoding="utf-8") + "\n@0\n", encoding="utf-8")
+            assert len(cache.assemble(edited).machine_code) == len(first.machine_code) + 1
+            assert cache.misses == 2, "Edited source should miss"
+            
+            # 损坏的条目视为未命中
+            entry = cache._path(cache.key(edited.read_text(encoding="utf-8")))
+            entry.write_text("{", encoding="utf-8")
+            assert cache.assemble(edited).machine_code == first.machine_code + ["0000000000000000"]
+            
+            # 超出大小上限时淘汰旧条目
+            cache.max_bytes = entry.stat().st_size
+            cache.evict()
+            assert len(list(cache.directory.glob("*.json"))) == 1, "Eviction should respect max_bytes"
+            
+            # 缓存键包含assembler.py源码的哈希，修改汇编器即使未递增版本号也会失效
+            from src import cache as cache_module
+            text = edited.read_text(encoding="utf-8")
+            key = cache.key(text)
+            original = cache_module.assembler_fingerprint
+            cache_module.assembler_fingerprint = lambda: original() + "-edited"
+            try:
+                assert cache.key(text) != key, "Assembler changes should invalidate the cache"
+            finally:
+                cache_module.assembler_fingerprint = original
+            
+            # 单遍汇编拒绝重复标签，不能命中两遍汇编的缓存结果
+            duplicate = Path(tmp) / "duplicate.asm"
+            duplicate.write_text("(X)\n@X\n(X)\n0;JMP\n", encoding="utf-8")
+            cache.assemble(duplicate)
+            try:
+                cache.assemble(duplicate, single=True)
+                assert False, "Single-pass should reject duplicate labels even after a two-pass build"
+            except ValueError:
+                pass
+            assert cache.misses == 5, "Two-pass and single-pass results are cached separately"
+
+        # 缓存目录相对于配置文件，而不是当前工作目录
+        directory = cache_module.get_assembly_cache().directory
+        assert directory.is_absolute() and directory.parent == Path(__file__).parent.parent.resolve(), directory
+        
+        print(f"  {len(first.symbols)} user symbols cached, eviction bounded")
+    
+    def test_batch_build(self):
+        """测试多文件并行汇编"""
+        import shutil
+        import tempfile
+        from src import assemble_file, expand_sources, build_many
+        
+        programs = Path(__file__).parent / "test_programs"
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp) / "src"
+            for sub in ["a", "b"]:
+                (root / sub).mkdir(parents=True)
+                shutil.copy(programs / "add.asm", root / sub / "prog.asm")
+            shutil.copy(programs / "TEST.asm", root / "a" / "TEST.asm")
+            (root / "b" / "bad.asm").write_text("D=X\n", encoding="utf-8")
+            
+            sources = expand_sources([str(root), str(root / "a" / "*.asm")])
+            assert len(sources) == 4, f"Directory and glob should expand without duplicates: {sources}"
+            
+            out = Path(tmp) / "out"
+            results = build_many(sources, output_dir=out, workers=2, use_cache=False)
+            assert [r.source for r in results] == sources, "Results should keep source order"
+            failed = [r for r in results if not r.ok]
+            assert len(failed) == 1 and failed[0].source.name == "bad.asm", f"Only bad.asm should fail: {failed}"
+            
+            # 不同目录中的同名文件不会互相覆盖
+            for sub in ["a", "b"]:
+                assert (out / sub / "prog.hack").exists(), f"Missing output for {sub}/prog.asm"
+            expected, _ = assemble_file(programs / "TEST.asm")
+            assert (out / "a" / "TEST.hack").read_text(encoding="utf-8").split() == expected
+            
+            stopped = build_many(sorted(sources), output_dir=out, workers=1, fail_fast=True, use_cache=False)
+            assert not stopped[-1].ok and len(stopped) < len(sources), "fail_fast should stop at the first error"
+        
+        print(f"  {len(results)} files, {sum(r.instructions for r in results)} instructions, 1 error reported")
+    
+    def test_single_pass(self):
+        """测试单遍汇编（前向引用回填）"""
+        from src import assemble_text
+        
+        programs = Path(__file__).parent / "test_programs"
+        for path in sorted(programs.glob("*.asm")):
+            text = path.read_text(encoding="utf-8")
+            assert assemble_text(text, single=True) == assemble_text(text), f"{path.name}: single-pass differs"
+        
+        # 先作为前向引用、后定义为标签的符号不分配变量地址
+        text = "@x\n@LOOP\n(LOOP)\n@y\n@x\n@END\n(END)\n@z\n0;JMP\n"
+        result = assemble_text(text, single=True)
+        assert result == assemble_text(text), "Mixed labels/variables should match two-pass"
+        assert result.symbols == {"LOOP": 2, "END": 5, "x": 16, "y": 17, "z": 18}, f"Unexpected symbols: {result.symbols}"
+        
+        try:
+            assemble_text("(A1)\n@A1\n(A1)\n", single=True)
+            assert False, "Duplicate label should be rejected"
+        except ValueError:
+            pass
+        
+        print(f"  Matches two-pass on {len(list(programs.glob('*.asm')))} programs")
+    
+    def test_excel_incremental(self):
+        """测试Excel视图的增量更新"""
+        import tempfile
+        from src import ExcelView
+        
+        debugger, cpu, source_lines = create_test_debugger("TEST")
+        cpu.set_ram(0, 7)
+        cpu.set_ram(1, -3)
+        debugger.add_breakpoint(10)
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            view = ExcelView(Path(tmp) / "view.xlsx")
+            view.initialize(source_lines, ram_size=16)
+            view._save = lambda: None  # 只检查单元格，不写文件
+            view.update(cpu, debugger)
+            view.flush()
+            
+            debugger.step()
+            view.update(cpu, debugger)
+            view.flush()
+            assert view.last_update_cells < 20, f"Single step touched {view.last_update_cells} cells"
+            
+            ws = view.ws
+            rows_with_pc = [row[0].row for row in ws.iter_rows(min_row=2) if row[4].value not in ("", None)]
+            assert rows_with_pc == [cpu.PC + 2], f"Registers should only be on the PC row: {rows_with_pc}"
+            assert ws.cell(row=cpu.PC + 2, column=2).fill.fill_type == "solid", "Current line should be highlighted"
+            assert ws.cell(row=12, column=2).fill.fill_type == "solid", "Breakpoint should stay highlighted"
+            assert ws.cell(row=2, column=2).fill.fill_type is None, "Previous PC highlight should be cleared"
+            
+            debugger.run_until_breakpoint(1000)
+            view.update(cpu, debugger)
+            view.flush()
+            values = [ws.cell(row=address + 2, column=7).value for address in range(16)]
+            assert values == [cpu.get_ram(address) for address in range(16)], "RAM column should match"
+            view.update(cpu, debugger)
+            view.flush()
+            assert view.last_update_cells == 0, "Unchanged state should touch no cells"
+            view.close()
+        
+        print("  Single step and no-op updates touch only changed cells")
+    
+    def test_excel_background_save(self):
+        """测试Excel视图的后台合并保存"""
+        import tempfile
+        import time
+        from openpyxl import load_workbook
+        from src import ExcelView
+        
+        debugger, cpu, source_lines = create_test_debugger("TEST")
+        cpu.set_ram(0, 7)
+        cpu.set_ram(1, -3)
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "view.xlsx"
+            view = ExcelView(path, background=True)
+            view.initialize(source_lines, ram_size=16)
+            
+            saves = []
+            save = view._save
+            def slow_save():
+                time.sleep(0.02)
+                save()
+                saves.append(1)
+            view._save = slow_save
+            
+            start = time.perf_counter()
+            for _ in range(50):
+                debugger.step()
+                view.update(cpu, debugger)
+            elapsed = time.perf_counter() - start
+            view.close()
+            
+            assert elapsed < 0.02 * 50, f"update() should not wait for saves ({elapsed:.3f}s)"
+            assert 0 < len(saves) < 50, f"Bursts should coalesce into fewer saves: {len(saves)}"
+            
+            ws = load_workbook(path).active
+            assert ws.cell(row=cpu.PC + 2, column=5).value == cpu.PC, "Final state should be flushed on close"
+            values = [ws.cell(row=address + 2, column=7).value for address in range(16)]
+            assert values == [cpu.get_ram(address) for address in range(16)], "Final RAM should be saved"
+            assert [p.name for p in Path(tmp).iterdir()] == ["view.xlsx"], "No temporary files should remain"
+        
+        print(f"  50 updates coalesced into {len(saves)} saves")
+    
+    def test_excel_write_only(self):
+        """测试只写模式的流式Excel生成"""
+        import tempfile
+        from openpyxl import load_workbook
+        from src import ExcelView
+        
+        _, source_lines = load_test_program("TEST")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "view.xlsx"
+            # 已有的大文件不会被读取，新文件中不残留旧行
+            view = ExcelView(path, background=False)
+            view.initialize(source_lines * 2, ram_size=16)
+            view.close()
+            
+            view = ExcelView(path, background=False)
+            view.initialize(source_lines, ram_size=16, write_only=True)
+            view.close()
+            
+            ws = load_workbook(path).active
+            assert ws.title == "HACK Debugger" and ws.max_row == len(source_lines) + 1, f"Unexpected sheet: {ws.max_row} rows"
+            header = [cell.value for cell in ws[1]]
+            assert header == ["ROM_ADDR", "ASM", "A", "D", "PC", "RAM_ADDR", "VALUE"], header
+            assert ws["A1"].font.b and ws["A1"].fill.fill_type == "solid", "Header should be styled"
+            rows = [[cell.value for cell in row] for row in ws.iter_rows(min_row=2)]
+            assert [row[1] for row in rows] == source_lines, "ASM column should match source"
+            assert rows[0] == [0, source_lines[0], None, None, None, 0, 0], rows[0]
+            assert rows[16][5] is None, "RAM rows should stop at ram_size"
+        
+        print(f"  Streamed {len(source_lines)} rows without loading the old workbook")
+    
+    def test_views(self):
+        """测试轻量级视图后端（终端、JSON Lines、HTML）"""
+        import io
+        import json
+        import tempfile
+        from src import create_view, TerminalView, VIEW_KINDS
+        from src.views import BaseView
+        
+        # 未实现render的视图在创建时就报错
+        class IncompleteView(BaseView):
+            pass
+        try:
+            IncompleteView()
+            assert False, "A view without render() should not be instantiable"
+        except TypeError:
+            pass
+        
+        debugger, cpu, source_lines = create_test_debugger("add")
+        cpu.set_ram(0, 2)
+        cpu.set_ram(1, 3)
+        debugger.add_breakpoint(5)
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            stream = io.StringIO()
+            views = [
+                TerminalView(stream=stream, color=False),
+                create_view("jsonl", Path(tmp) / "state.jsonl"),
+                create_view("html", Path(tmp) / "state.html"),
+            ]
+            for view in views:
+                view.initialize(source_lines, ram_size=8)
+                view.update(cpu, debugger)
+            debugger.run_until_breakpoint(100)
+            debugger.step()
+            for view in views:
+                view.update(cpu, debugger)
+                view.close()
+            
+            assert "A=2  D=5  PC=6" in stream.getvalue(), "Terminal view should show registers"
+            assert "*      5  M=D" in stream.getvalue(), "Terminal view should mark breakpoints"
+            
+            records = [json.loads(line) for line in (Path(tmp) / "state.jsonl").read_text(encoding="utf-8").splitlines()]
+            assert [r["event"] for r in records] == ["init", "state", "state"], records
+            assert records[1]["ram"]["0"] == 2 and len(records[1]["ram"]) == 8, "First state should carry full RAM"
+            assert records[2]["ram"] == {"2": 5} and records[2]["modified"] == ["M[2]"], records[2]
+            
+            html = (Path(tmp) / "state.html").read_text(encoding="utf-8")
+            assert '<tr class="bp"><td>5</td>' in html and '<td class="mod">5</td>' in html, "HTML should highlight state"
+        
+        assert set(VIEW_KINDS) == {"excel", "terminal", "jsonl", "html"}
+        print(f"  {len(views)} lightweight views rendered the same session")
+    
+    def test_trace(self):
+        """测试执行轨迹记录（环形缓冲、溢写磁盘、文件读写）"""
+        import tempfile
+        from src import JitCPU, TraceRecorder, TraceReader
+        
+        machine_code, _ = load_test_program("TEST")
+        
+        def make_cpu(cls=HackCPU):
+            cpu = cls(machine_code, detect_terminal_loops=False)
+            cpu.set_ram(0, 1)
+            cpu.set_ram(1, 30000)
+            return cpu
+        
+        # 逐条step()的记录作为参照
+        cpu = make_cpu()
+        cpu.tracer = TraceRecorder(capacity=4096)
+        for _ in range(3000):
+            cpu.step()
+        reference = cpu.tracer.records()
+        assert len(reference) == 3000
+        assert reference[0].pc == 0 and reference[0].addr == -1, reference[0]
+        assert any(record.addr >= 0 for record in reference), "Trace should record RAM writes"
+        
+        # 环形缓冲：run()分两次执行，只保留最近的记录
+        cpu = make_cpu()
+        cpu.tracer = TraceRecorder(capacity=500)
+        cpu.run(max_steps=2000)
+        cpu.run(max_steps=1000)
+        assert len(cpu.tracer) == 3000 and cpu.tracer.records() == reference[-500:], "Ring buffer should keep the newest records"
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            # 溢写磁盘：JIT引擎回退到逐条记录，结果相同
+            path = Path(tmp) / "run.htrace"
+            cpu = make_cpu(JitCPU)
+            with TraceRecorder(capacity=333, spill_path=path) as recorder:
+                cpu.tracer = recorder
+                cpu.run(max_steps=3000)
+            reader = TraceReader(path)
+            assert len(reader) == 3000 and list(reader) == reference, "Spilled trace should round-trip"
+            size = path.stat().st_size
+            
+            ring_path = Path(tmp) / "ring.htrace"
+            cpu.tracer = TraceRecorder(capacity=500)
+            cpu.reset()
+            cpu.run(max_steps=100)
+            cpu.tracer.save(ring_path)
+            assert len(TraceReader(ring_path)) == 100
+        
+        print(f"  3000 records: {size} bytes ({size / 3000:.2f} bytes/record)")
+    
+    def test_debugger_without_history(self):
+        """测试默认不记录执行历史，以及stop()中止运行"""
+        import threading
+        
+        debugger, cpu, _ = create_test_debugger("counter")
+        assert debugger.history is None, "History should be opt-in"
+        for _ in range(5):
+            debugger.step()
+        assert debugger.cycle == 5
+        try:
+            debugger.back()
+            assert False, "back without history should raise"
+        except RuntimeError:
+            pass
+        debugger.run_until_breakpoint()
+        assert debugger.cycle == 88, debugger.cycle
+        
+        # 死循环中从另一个线程调用stop()
+        machine_code = assemble_text("(LOOP)\n@i\nM=M+1\n@LOOP\n0;JMP").machine_code
+        debugger = Debugger(HackCPU(machine_code), [])
+        outcome = []
+        worker = threading.Thread(target=lambda: outcome.append(debugger.run_until_breakpoint(10 ** 12)))
+        worker.start()
+        while not debugger.running and worker.is_alive():
+            pass
+        debugger.stop()
+        worker.join(timeout=10)
+        assert not worker.is_alive() and outcome[0][0] == "stopped", outcome
+        print(f"  stop() ended an infinite run after {debugger.cycle} cycles")
+    
+    def test_time_travel(self):
+        """测试反向执行（检查点、撤销日志、反向继续）"""
+        from src import ExecutionHistory
+        
+        machine_code, source_lines = load_test_program("TEST")
+        cpu = HackCPU(machine_code, detect_terminal_loops=False)
+        cpu.set_ram(0, 1)
+        cpu.set_ram(1, 30000)
+        # 预算只够约8个检查点，迫使历史稀疏化
+        history = ExecutionHistory(cpu, interval=1000, budget_mb=8 * len(cpu.ram_snapshot()) / 1024 / 1024)
+        debugger = Debugger(cpu, source_lines, history=history)
+        
+        def snapshot():
+            return cpu.A, cpu.D, cpu.PC, cpu.ram_snapshot()
+        
+        states = [snapshot()]
+        for _ in range(200):
+            debugger.step()
+            states.append(snapshot())
+        
+        debugger.back()
+        assert debugger.cycle == 199 and snapshot() == states[199], "back should undo one step"
+        debugger.back(150)
+        assert snapshot() == states[49], "back should undo many steps"
+        debugger.goto_cycle(200)
+        assert snapshot() == states[200], "goto should move forward again"
+        
+        reason, _ = debugger.run_until_breakpoint(max_steps=50000)
+        assert reason == "max_steps" and debugger.cycle == 50200
+        assert len(history.checkpoints) <= 8 and history.interval > 1000, "History should stay within budget"
+        end = snapshot()
+        
+        debugger.goto_cycle(150)
+        assert snapshot() == states[150], "goto should replay from a checkpoint"
+        debugger.goto_cycle(50200)
+        assert snapshot() == end
+        
+        # 反向继续：停在上一次到达断点的周期，PC位于断点
+        loop = cpu.PC
+        debugger.step()
+        debugger.add_breakpoint(loop)
+        reason, state = debugger.reverse_continue()
+        assert reason == "breakpoint" and debugger.cycle == 50200 and state.PC == loop, (reason, debugger.cycle)
+        reason, state = debugger.reverse_continue()
+        assert reason == "breakpoint" and debugger.cycle < 50200 and state.PC == loop
+        
+        # 手动修改RAM后，之后的历史作废，回退仍然正确
+        debugger.goto_cycle(100)
+        debugger.set_ram_value(100, 7)
+        debugger.step()
+        debugger.back()
+        assert cpu.get_ram(100) == 7 and debugger.cycle == 100
+        debugger.back(50)
+        assert snapshot() == states[50], "History before the manual write should be intact"
+        
+        interval = history.interval
+        debugger.reset()
+        assert debugger.cycle == 0 and not history.checkpoints
+        
+        # AM=/AMD=：M写在新的A处，撤销日志必须记录这个地址
+        for dest in ("AM", "AMD"):
+            cpu = HackCPU(assemble_text(f"@5\n{dest}=M+1\n@0\n0;JMP").machine_code)
+            cpu.set_ram(5, 9)
+            debugger = Debugger(cpu, [], history=Debugger.create_history(cpu))
+            debugger.step()
+            debugger.step()
+            assert cpu.get_ram(10) == 10 and cpu.A == 10
+            debugger.back()
+            assert cpu.get_ram(10) == 0 and cpu.get_ram(5) == 9 and cpu.A == 5, f"back should undo {dest}="
+        
+        # JIT引擎上反向继续不改动已编译块的停止地址集合
+        from src import JitCPU
+        cpu = JitCPU(machine_code, detect_terminal_loops=False)
+        cpu.set_ram(0, 1)
+        cpu.set_ram(1, 30000)
+        debugger = Debugger(cpu, source_lines, history=ExecutionHistory(cpu, interval=1000))
+        debugger.run_until_breakpoint(max_steps=5000)
+        blocks = dict(cpu._blocks)
+        debugger.add_breakpoint(loop)
+        reason, state = debugger.reverse_continue()
+        assert reason == "breakpoint" and state.PC == loop
+        assert cpu._block_stops == frozenset() and cpu._blocks == blocks, "Reverse execution should not recompile JIT blocks"
+        print(f"  Checkpoint interval grew to {interval} to stay within budget")
+    
+    def test_watchpoints(self):
+        """测试观察点和条件断点"""
+        from src import (
+            JitCPU, WatchSet, compile_condition, assemble_cached,
+            WATCH_READ, WATCH_WRITE, WATCH_CHANGE
+        )
+        
+        result = assemble_cached(Path(__file__).parent / "test_programs" / "counter.asm")
+        
+        for cpu_class in (HackCPU, JitCPU):
+            name = cpu_class.__name__
+            
+            # 条件断点：LOOP处 i==3 时停止
+            cpu = cpu_class(result.machine_code)
+            debugger = Debugger(cpu, result.source_lines, symbols=result.symbols)
+            loop = debugger.resolve_address("LOOP")
+            debugger.add_breakpoint(loop, "RAM[i] == 3")
+            reason, state = debugger.run_until_breakpoint()
+            assert (reason, state.PC, cpu.get_ram(16)) == ("breakpoint", 4, 3), f"[{name}] {reason} PC={state.PC}"
+            
+            # 写观察点报告触发的指令和新旧值
+            debugger.clear_breakpoints()
+            watch = debugger.add_watch(16)
+            reason, _ = debugger.run_until_breakpoint()
+            hit = debugger.watch_hit
+            assert reason == "watchpoint" and hit.watch is watch, f"[{name}] {reason}"
+            assert (hit.pc, hit.addr, hit.kind, hit.old, hit.new) == (9, 16, WATCH_WRITE, 3, 2), hit
+            
+            # 读观察点 + 条件：读到0时停止
+            debugger.remove_watch(watch.number)
+            debugger.add_watch(16, kind=WATCH_READ, condition="D == 0")
+            reason, state = debugger.run_until_breakpoint()
+            assert reason == "watchpoint" and debugger.watch_hit.pc == 5 and state.D == 0, f"[{name}] {reason}"
+            
+            reason, _ = debugger.run_until_breakpoint()
+            assert reason == "terminal_loop", f"[{name}] {reason}"
+        
+        # 范围观察点：R0已经是5，写入相同的值不触发change，第一次变化是R1
+        machine_code, _ = load_test_program("register")
+        cpu = HackCPU(machine_code)
+        cpu.set_ram(0, 5)
+        watches = WatchSet(len(cpu.ram))
+        watches.add(0, 15, WATCH_CHANGE)
+        reason, _ = cpu.run(max_steps=1000, watch=watches)
+        hit = cpu.watch_hit
+        assert reason == "watchpoint" and (hit.pc, hit.addr, hit.kind, hit.old, hit.new) == (7, 1, WATCH_CHANGE, 0, 3), hit
+        
+        # 条件编译
+        condition = compile_condition("D<0 and M == RAM[SP] + 1", {"SP": 0})
+        assert condition(5, -1, [4, 0, 0, 0, 0, 5]) and not condition(5, 1, [4, 0, 0, 0, 0, 5])
+        for bad in ("__import__('os')", "A.real", "unknown > 0", "D <"):
+            try:
+                compile_condition(bad)
+            except ValueError:
+                continue
+            raise AssertionError(f"Condition should be rejected: {bad}")
+        
+        print("  Conditional breakpoints, read/write/change watches: OK")
+    
+    def test_stretch_index(self):
+        """测试按断点划分的直线代码段"""
+        from src.cpu import StretchIndex
+        
+        debugger, cpu, _ = create_test_debugger("counter")
+        # LOOP(4): @i D=M @END D;JEQ | @i M=M-1 @LOOP 0;JMP | END(12)为终止循环
+        index = StretchIndex(cpu._decoded, frozenset())
+        assert index.lengths[:13] == [8, 7, 6, 5, 4, 3, 2, 1, 4, 3, 2, 1, 0], index.lengths
+        
+        # 添加断点后立即重建索引，段在断点之前结束
+        debugger.add_breakpoint(6)
+        index = cpu.prepare_stops({6})
+        assert index.lengths[:8] == [6, 5, 4, 3, 2, 1, 2, 1], index.lengths
+        assert frozenset({6}) in cpu._stretches, "add_breakpoint should build the index eagerly"
+        debugger.clear_breakpoints()
+        assert frozenset() in cpu._stretches
+        
+        # 与逐条检查的执行结果一致（halt回调强制走逐条循环）
+        machine_code, _ = load_test_program("TEST")
+        stops = {30, 86, 214}
+        fast = HackCPU(machine_code)
+        slow = HackCPU(machine_code)
+        for cpu in (fast, slow):
+            cpu.set_ram(0, 1)
+            cpu.set_ram(1, 30000)
+        for budget in (1, 5, 1000, 77, 20000):
+            expected = slow.run(budget, stops, halt=lambda c: False)
+            assert fast.run(budget, stops) == expected, budget
+            assert (fast.A, fast.D, fast.PC, fast.ram_snapshot()) == (slow.A, slow.D, slow.PC, slow.ram_snapshot())
+            if expected[0] == "breakpoint":
+                fast.step()
+                slow.step()
+        
+        print(f"  {len(fast.prepare_stops(stops).blocks)} stretches executed, results match per-instruction loop")
+    
+    def test_profiler(self):
+        """测试周期剖析：逐条、按代码段和JIT回退的计数一致，并按标签和循环汇总"""
+        import json
+        from src import JitCPU, Profiler, find_labels
+        
+        machine_code, source_lines = load_test_program("counter")
+        asm_file = Path(__file__).parent / "test_programs" / "counter.asm"
+        labels = find_labels(asm_file.read_text(encoding="utf-8").splitlines())
+        assert labels == {"LOOP": 4, "END": 12}, labels
+        
+        # LOOP(4-7)进入11次，循环体(8-11)执行10次；END为终止循环，不计数
+        profilers = []
+        for cpu_class, use_run in ((HackCPU, False), (HackCPU, True), (JitCPU, True)):
+            cpu = cpu_class(machine_code)
+            cpu.profiler = Profiler(machine_code)
+            if use_run:
+                cpu.run(10000)
+            else:
+                while cpu.step():
+                    pass
+            profilers.append(cpu.profiler)
+        hits = list(profilers[0].hits)
+        assert hits[:12] == [1] * 4 + [11] * 4 + [10] * 4, hits
+        assert all(list(p.hits) == hits and list(p.taken) == list(profilers[0].taken) for p in profilers)
+        
+        report = profilers[1].report(source_lines, labels)
+        assert report.total == 88
+        jeq = next(stat for stat in report.instructions if stat.pc == 7)
+        assert (jeq.taken, jeq.not_taken) == (1, 10), jeq
+        assert [(label.name, label.cycles) for label in report.labels] == [("LOOP", 84), ("(start)", 4)]
+        loop = report.loops[0]
+        assert (loop.label, loop.start, loop.end, loop.iterations, loop.cycles) == ("LOOP", 4, 11, 10, 84), loop
+        
+        data = json.loads(report.to_json())
+        assert data["total"] == 88 and data["loops"][0]["iterations"] == 10
+        assert "LOOP;7 D JEQ 11" in report.collapsed().splitlines()
+        assert "LOOP" in report.format_text(3)
+        print(f"  {report.total} cycles, loop LOOP: {loop.iterations} iterations, counts match across engines")
+    
     def test_config_loading(self):
         """测试配置加载"""
         config = get_config()
@@ -196,6 +1094,31 @@ class TestSuite:
             ("Debugger Breakpoints", self.test_debugger_breakpoints),
             ("Excel View", self.test_excel_view),
             ("Register Tracking", self.test_register_tracking),
+            ("ROM Predecode", self.test_rom_predecode),
+            ("JIT Engine", self.test_jit_engine),
+            ("ALU", self.test_alu),
+            ("Bulk Run", self.test_bulk_run),
+            ("Tracking Modes", self.test_tracking_modes),
+            ("RAM Backends", self.test_ram_backends),
+            ("Terminal Loop", self.test_terminal_loop),
+            ("Batch Sweep", self.test_batch_sweep),
+            ("Run Matrix", self.test_run_matrix),
+            ("Streaming Assembler", self.test_streaming_assembler),
+            ("C Instruction Cache", self.test_c_instruction_cache),
+            ("Packed ROM", self.test_packed_rom),
+            ("Assembly Cache", self.test_assembly_cache),
+            ("Batch Build", self.test_batch_build),
+            ("Single Pass", self.test_single_pass),
+            ("Excel Incremental", self.test_excel_incremental),
+            ("Excel Background Save", self.test_excel_background_save),
+            ("Excel Write-Only", self.test_excel_write_only),
+            ("Views", self.test_views),
+            ("Trace", self.test_trace),
+            ("Debugger Without History", self.test_debugger_without_history),
+            ("Time Travel", self.test_time_travel),
+            ("Watchpoints", self.test_watchpoints),
+            ("Stretch Index", self.test_stretch_index),
+            ("Profiler", self.test_profiler),
             ("Config Loading", self.test_config_loading),
         ]
         
@@ -7,7 +7,7 @@ import sys
 # 添加src目录到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src import assemble_file, HackCPU, Debugger, ExcelView
+from src import assemble_cached, HackCPU, JitCPU, Debugger, WatchSet
 
 
 def load_test_program(program_name: str) -> Tuple[List[str], List[str]]:
@@ -26,35 +26,39 @@ def load_test_program(program_name: str) -> Tuple[List[str], List[str]]:
     if not asm_file.exists():
         raise FileNotFoundError(f"测试程序不存在: {asm_file}")
     
-    return assemble_file(asm_file)
+    result = assemble_cached(asm_file)
+    return result.machine_code, result.source_lines
 
 
-def create_test_cpu(program_name: str) -> Tuple[HackCPU, List[str]]:
+def create_test_cpu(program_name: str, engine: str = "interp") -> Tuple[HackCPU, List[str]]:
     """
     创建加载了测试程序的CPU
     
     Args:
         program_name: 程序名称
+        engine: 执行引擎，"interp" 或 "jit"
         
     Returns:
         (CPU实例, 源码列表)
     """
     machine_code, source_lines = load_test_program(program_name)
-    cpu = HackCPU(machine_code)
+    cpu_class = JitCPU if engine == "jit" else HackCPU
+    cpu = cpu_class(machine_code)
     return cpu, source_lines
 
 
-def create_test_debugger(program_name: str) -> Tuple[Debugger, HackCPU, List[str]]:
+def create_test_debugger(program_name: str, engine: str = "interp") -> Tuple[Debugger, HackCPU, List[str]]:
     """
     创建加载了测试程序的调试器
     
     Args:
         program_name: 程序名称
+        engine: 执行引擎，"interp" 或 "jit"
         
     Returns:
         (调试器实例, CPU实例, 源码列表)
     """
-    cpu, source_lines = create_test_cpu(program_name)
+    cpu, source_lines = create_test_cpu(program_name, engine)
     debugger = Debugger(cpu, source_lines)
     return debugger, cpu, source_lines
 
@@ -72,9 +76,10 @@ def run_until_ram_equals(cpu: HackCPU, address: int, expected_value: int, max_st
     Returns:
         是否成功达到期望值
     """
-    for _ in range(max_steps):
-        if cpu.get_ram(address) == expected_value:
-            return True
-        if not cpu.step():
-            break
+    if cpu.get_ram(address) == expected_value:
+        return True
+    # 条件观察点：只在写入该地址时计算条件，而不是每条指令后回调
+    watch = WatchSet(len(cpu.ram))
+    watch.add(address, condition=f"RAM[{address}] == {expected_value}")
+    cpu.run(max_steps, watch=watch)
     return cpu.get_ram(address) == expected_value